@@ -0,0 +1,138 @@
+from crystal import ServiceAction
+
+# Feedback control of current_capacity. The resolver labels services but
+# never says how far to move a capacity, so every cycle an Actuator compares
+# each (service, schema)'s demand (its incoming flow before backpressure)
+# with its current capacity and takes the reading sdx.determine_service_actions
+# gives the labels:
+#
+#   SPEEDUP    demand above `target` of capacity: the schema needs more
+#   SLOWDOWN   demand below `low` of capacity (crystal's underutilized
+#              threshold): it can give some back
+#   NO_ACTION  in between, the dead band that keeps a settled capacity still
+#
+# A controller turns that into the next capacity, always clamped to the
+# schema's (min, max) bounds in schema_capacities:
+#
+#   SingleShot  jump straight to max or min (the bang-bang baseline)
+#   AIMD        add `step` of the (min, max) span on SPEEDUP, scale by
+#               `factor` on SLOWDOWN
+#   PID         steer capacity to demand / target; each move is capped at
+#               `max_step` of the span (damping) and the integral is frozen
+#               while the move is capped or the output sits on a bound
+#               (anti-windup). It ignores the action and the dead band and
+#               corrects every cycle; only the no-shrink rule below applies
+#
+# No schema of a service shrinks while another is over its current capacity:
+# Service.compute_reallocation is covering that overload from the spare.
+#
+# Controllers keep per-(service, schema) state, so one instance can serve a
+# single service or be shared as the default for all of them.
+
+
+class SingleShot:
+    def update(self, key, action, demand, capacity, bounds, target):
+        low, high = bounds
+        if action == ServiceAction.SPEEDUP:
+            return high
+        if action == ServiceAction.SLOWDOWN:
+            return low
+        return capacity
+
+
+class AIMD:
+    def __init__(self, step=0.1, factor=0.85):
+        self.step = step
+        self.factor = factor
+
+    def update(self, key, action, demand, capacity, bounds, target):
+        low, high = bounds
+        if action == ServiceAction.SPEEDUP:
+            return capacity + self.step * (high - low)
+        if action == ServiceAction.SLOWDOWN:
+            return capacity * self.factor
+        return capacity
+
+
+class PID:
+    def __init__(self, kp=0.6, ki=0.2, kd=0.1, max_step=0.25):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.max_step = max_step
+        self.integral = {}
+        self.previous = {}
+
+    def update(self, key, action, demand, capacity, bounds, target):
+        low, high = bounds
+        error = demand / target - capacity
+        derivative = error - self.previous.get(key, error)
+        self.previous[key] = error
+        integral = self.integral.get(key, 0.0) + error
+        change = self.kp * error + self.ki * integral + self.kd * derivative
+        limit = self.max_step * (high - low)
+        if -limit <= change <= limit and low <= capacity + change <= high:
+            self.integral[key] = integral
+        return capacity + max(-limit, min(limit, change))
+
+
+CONTROLLERS = {"single-shot": SingleShot, "aimd": AIMD, "pid": PID}
+
+
+class Actuator:
+    def __init__(self, pipeline, controller=None, target=0.8, low=0.5):
+        self.pipeline = pipeline
+        self.default = controller
+        self.controllers = {}
+        self.target = target
+        self.low = low
+        self.actions = {}
+
+    def set_controller(self, service_name, controller):
+        """Per-service override of the default controller (None: leave it alone)."""
+        self.controllers[service_name] = controller
+
+    def run_cycle(self, service_flows, time_budget=None, work_budget=None):
+        complete = self.pipeline.run_cycle(service_flows, time_budget, work_budget)
+        self.actuate(service_flows)
+        return complete
+
+    def decide(self, demand, capacity):
+        if demand > self.target * capacity:
+            return ServiceAction.SPEEDUP
+        if demand < self.low * capacity:
+            return ServiceAction.SLOWDOWN
+        return ServiceAction.NO_ACTION
+
+    def actuate(self, service_flows):
+        """Move current capacities for the demand in `service_flows`."""
+        pipeline = self.pipeline
+        self.actions = {}
+        for service_name, flows in service_flows.items():
+            controller = self.controllers.get(service_name, self.default)
+            if controller is None:
+                continue
+            service = pipeline.services[service_name]
+            actions = self.actions[service_name] = {}
+            lending = any(
+                demand > service.current_capacity[pipeline.schemas[schema_name]]
+                for schema_name, (demand, _) in flows.items()
+            )
+            for schema_name, (demand, _) in flows.items():
+                schema = pipeline.schemas[schema_name]
+                capacity = service.current_capacity[schema]
+                bounds = service.schema_capacities[schema]
+                action = self.decide(demand, capacity)
+                if lending and action == ServiceAction.SLOWDOWN:
+                    action = ServiceAction.NO_ACTION
+                actions[schema_name] = action
+                updated = controller.update(
+                    (service_name, schema_name), action, demand, capacity, bounds, self.target
+                )
+                if lending:
+                    updated = max(updated, capacity)
+                updated = max(bounds[0], min(bounds[1], updated))
+                if updated != capacity:
+                    service.current_capacity[schema] = updated
+                    # A warm-start anchor was solved against the old capacity.
+                    pipeline.warm_anchor = None
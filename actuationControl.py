@@ -0,0 +1,94 @@
+from actuation import AIMD, PID, Actuator, SingleShot
+from crystal import Pipeline, ServiceAction
+from simulate import simulate
+
+BOUNDS = (10, 200)
+
+
+def single_service(in_flow=60):
+    return Pipeline(
+        {"A": {"S1": (in_flow, in_flow)}},
+        {"A": {"S1": BOUNDS}},
+        {},
+        {"S1": 1},
+        verbose=False,
+    )
+
+
+def utilizations(controller, profile):
+    pipeline = single_service()
+    actuator = Actuator(pipeline, controller, target=0.9, low=0.7)
+    schema = pipeline.schemas["S1"]
+    seen = []
+    for demand in profile:
+        actuator.run_cycle({"A": {"S1": (demand, demand)}})
+        seen.append(demand / pipeline.services["A"].current_capacity[schema])
+    return seen
+
+
+def settled_after(seen, low=0.7, high=1.0):
+    """Cycles until utilization stays within [low, high]; None if it never does."""
+    for cycle in range(len(seen)):
+        if all(low <= u <= high for u in seen[cycle:]):
+            return cycle + 1
+    return None
+
+
+def test_controllers_settle_where_fixed_and_single_shot_capacity_do_not():
+    profile = [60] * 20 + [150] * 20
+    for controller in (AIMD(), PID()):
+        seen = utilizations(controller, profile)
+        assert settled_after(seen[:20]) <= 10
+        assert settled_after(seen[20:]) <= 10
+    # Bang-bang flips between min and max for as long as demand sits between
+    # them; a fixed capacity stays underutilized.
+    single_shot = utilizations(SingleShot(), profile)
+    assert settled_after(single_shot[:20]) is None
+    assert set(single_shot[:20]) == {60 / BOUNDS[0], 60 / BOUNDS[1]}
+    assert settled_after(utilizations(None, profile)[:20]) is None
+
+
+def test_capacity_tracks_a_demand_step_within_bounds():
+    pipeline = single_service()
+    actuator = Actuator(pipeline, PID(), target=0.9, low=0.7)
+    schema = pipeline.schemas["S1"]
+    for demand in [60] * 20 + [300] * 20:
+        actuator.run_cycle({"A": {"S1": (demand, demand)}})
+        assert BOUNDS[0] <= pipeline.services["A"].current_capacity[schema] <= BOUNDS[1]
+    assert pipeline.services["A"].current_capacity[schema] == BOUNDS[1]
+
+
+def test_simulated_queues_settle_at_high_utilization_without_drops():
+    results = {}
+    for label, controller in [("fixed", None), ("single-shot", SingleShot()), ("aimd", AIMD()), ("pid", PID())]:
+        pipeline = single_service()
+        actuator = Actuator(pipeline, controller, target=0.9, low=0.7)
+        stats = simulate(pipeline, 2000, resolve_every=10, actuator=actuator)["schemas"]["S1"]
+        capacity = pipeline.services["A"].current_capacity[pipeline.schemas["S1"]]
+        assert stats["dropped"] == 0
+        results[label] = (stats, stats["throughput"] / capacity)
+    assert results["fixed"][1] < 0.5
+    assert results["single-shot"][0]["converged_at"] is None
+    assert results["single-shot"][0]["swing"] > 0
+    for label in ("aimd", "pid"):
+        stats, utilization = results[label]
+        assert utilization >= 0.7
+        assert stats["converged_at"] is not None
+        assert stats["swing"] == 0
+
+
+def test_spare_capacity_lent_to_an_overloaded_schema_is_kept():
+    pipeline = Pipeline(
+        {"A": {"S1": (120, 120), "S2": (10, 10)}},
+        {"A": {"S1": (10, 100), "S2": (10, 100)}},
+        {},
+        {"S1": 2, "S2": 1},
+        verbose=False,
+    )
+    actuator = Actuator(pipeline, PID())
+    for _ in range(5):
+        actuator.run_cycle({"A": {"S1": (120, 120), "S2": (10, 10)}})
+    service = pipeline.services["A"]
+    assert service.current_capacity[pipeline.schemas["S1"]] == 100
+    assert service.current_capacity[pipeline.schemas["S2"]] == 100
+    assert actuator.actions["A"]["S2"] == ServiceAction.NO_ACTION
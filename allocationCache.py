@@ -0,0 +1,62 @@
+from crystal import AllocationCache, Pipeline
+from loader import read_definition
+from memory import memory_report
+from testSupport import BUNGEE, SCENARIOS, state
+
+
+def test_cached_cycles_match_uncached_ones():
+    cache = AllocationCache()
+    for path in SCENARIOS:
+        definition = read_definition(path)
+        cached = Pipeline(*definition, verbose=False, allocation_cache=cache)
+        plain = Pipeline(*definition, verbose=False)
+        for _ in range(3):
+            cached.run_cycle(definition[0])
+            plain.run_cycle(definition[0])
+            assert state(cached) == state(plain)
+    stats = cache.stats()
+    assert stats["hits"] > stats["misses"] > 0
+    assert stats["size"] == stats["misses"]
+
+
+def test_services_with_the_same_shape_share_entries():
+    definition = read_definition(BUNGEE)
+    cache = AllocationCache()
+    pipeline = Pipeline(*definition, verbose=False, allocation_cache=cache)
+    pipeline.run_cycle(definition[0])
+    services = pipeline.services.values()
+    shapes = {
+        (tuple(s.incoming_flow.values()), tuple(s.current_capacity.values())) for s in services
+    }
+    assert len(shapes) < len(services)
+    assert cache.stats()["size"] < cache.hits + cache.misses
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AllocationCache(maxsize=2)
+    for name in ["a", "b"]:
+        cache.put(name, (1,))
+    assert cache.get("a") == (1,)
+    cache.put("c", (2,))
+    assert cache.get("b") is None
+    assert cache.get("a") == (1,)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_quantized_keys_round_to_the_quantum():
+    cache = AllocationCache(quantum=5)
+    assert cache.key("reallocate", {1: 101, 2: 49}, {1: 200, 2: 51}) == cache.key(
+        "reallocate", {1: 99, 2: 51}, {1: 201, 2: 49}
+    )
+    assert AllocationCache().key("reallocate", {1: 101}, {1: 200}) != AllocationCache().key(
+        "reallocate", {1: 99}, {1: 200}
+    )
+
+
+def test_memory_report_counts_the_cache():
+    definition = read_definition(SCENARIOS[0])
+    pipeline = Pipeline(*definition, verbose=False)
+    assert memory_report(pipeline)["caches"] == 0
+    pipeline.set_allocation_cache(AllocationCache())
+    pipeline.run_cycle(definition[0])
+    assert memory_report(pipeline)["caches"] > 0
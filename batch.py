@@ -0,0 +1,366 @@
+from kernels import ACTIONS, STATUSES, KernelBackend, array, to_list
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Evaluates many flow scenarios against one compiled topology without building
+# a Pipeline per scenario. A batch is a scenarios x slots table (slots as in
+# topology.py: every (service, schema) pair, service by service, so a row is
+# the services x schemas state of one scenario, flattened).
+#
+# With NumPy installed the whole table is resolved at once: the kernels in
+# kernels.py, step for step, with every scalar turned into a column over the
+# scenarios. Where scenarios take different branches (a service overloaded in
+# some of them, a wave that dies out upstream in others) the step runs on a
+# row mask, and resolution stops once no row is still changing. Within a
+# service the order stays sequential over schemas, exactly as in
+# reallocate_capacity_across_schemas, and np.trunc stands in for int().
+# Without NumPy each row is resolved by KernelState.resolve in turn.
+#
+# Every scenario starts from the state of the pipeline the evaluator was built
+# from, so results match calling run_cycle on a copy of that pipeline.
+BACKEND = "numpy" if np is not None else "rows"
+
+
+def column_sum(columns):
+    # Left to right, as the kernels add; np.sum would pair terms up.
+    total = columns[0] * 0
+    for column in columns:
+        total = total + column
+    return total
+
+
+def lesser(a, b):
+    # `a if a <= b else b`, elementwise.
+    return np.where(a <= b, a, b)
+
+
+def shortfall(a, b):
+    # `a - b if a > b else 0`, elementwise.
+    return np.where(a > b, a - b, 0.0)
+
+
+def reallocate_rows(incoming, current, allocated, low, high, rows):
+    """kernels.reallocate for slots low..high of every scenario in `rows`."""
+    n = high - low
+    if n == 0:
+        return
+    inc = incoming[:, low:high]
+    cur = current[:, low:high]
+    alloc = lesser(inc, cur)
+    remaining = column_sum([cur[:, j] for j in range(n)])
+    for j in range(n):
+        remaining = remaining - alloc[:, j]
+
+    unfulfilled = shortfall(inc, alloc)
+    total_unfulfilled = column_sum([unfulfilled[:, j] for j in range(n)])
+    spread = (remaining > 0) & (total_unfulfilled > 0)
+    if spread.any():
+        for j in range(n):
+            extra = np.trunc(remaining * (unfulfilled[:, j] / total_unfulfilled))
+            extra = np.where(spread, extra, 0.0)
+            alloc[:, j] = alloc[:, j] + extra
+            remaining = remaining - extra
+
+    total_incoming = column_sum([inc[:, j] for j in range(n)])
+    short = ~(total_incoming <= column_sum([alloc[:, j] for j in range(n)]))
+    if short.any():
+        # Stable, largest incoming first, like the kernel's insertion sort.
+        order = np.argsort(-inc, axis=1, kind="stable")
+        scenarios = np.arange(len(order))
+        excess = shortfall(alloc, inc)
+        total_excess = column_sum([excess[:, j] for j in range(n)])
+        for k in range(n):
+            j = order[:, k]
+            a, b = alloc[scenarios, j], inc[scenarios, j]
+            moved = np.where(short & (b > a), lesser(b - a, total_excess), 0.0)
+            alloc[scenarios, j] = a + moved
+            total_excess = total_excess - moved
+        left = short & (total_excess > 0)
+        if left.any():
+            deficits = shortfall(inc, alloc)
+            total_deficit = column_sum([deficits[:, j] for j in range(n)])
+            divisor = np.where(total_deficit > 0, total_deficit, 1.0)
+            for k in range(n):
+                j = order[:, k]
+                a, b = alloc[scenarios, j], inc[scenarios, j]
+                share = np.where(total_deficit > 0, (b - a) / divisor, 0.0)
+                additional = np.trunc(total_excess * share)
+                grant = lesser(additional, cur[scenarios, j] - a)
+                alloc[scenarios, j] = np.where(left & (b > a), a + grant, a)
+
+    allocated[:, low:high] = np.where(rows[:, None], alloc, allocated[:, low:high])
+
+
+def apply_backpressure_rows(i, reduction_percentage, rows, incoming, visited, reduction):
+    """kernels.apply_backpressure on slot i of every scenario in `rows`."""
+    applied = rows & ~(visited[:, i] & ~(reduction_percentage > reduction[:, i]))
+    original = incoming[:, i]
+    new_flow = original * (1 - reduction_percentage)
+    new_flow = np.where(new_flow < 0, 0.0, new_flow)
+    positive = applied & (original > 0)
+    actual = np.where(positive, (original - new_flow) / np.where(positive, original, 1.0), 0.0)
+    visited[:, i] = visited[:, i] | applied
+    reduction[:, i] = np.where(applied, reduction_percentage, reduction[:, i])
+    incoming[:, i] = np.where(applied, new_flow, original)
+    return actual
+
+
+def backpressure_rows(
+    start, reduction_percentage, rows, incoming, visited, reduction, up_offsets, up_slots
+):
+    """kernels.backpressure for every scenario in `rows`.
+
+    One walk serves all of them: a frame is entered while the wave is still
+    reducing something in at least one scenario, and carries the mask of
+    those scenarios.
+    """
+    actual = apply_backpressure_rows(
+        start, reduction_percentage, rows, incoming, visited, reduction
+    )
+    live = actual > 0
+    if not live.any():
+        return
+    stack = [[start, actual, live, up_offsets[start]]]
+    while stack:
+        frame = stack[-1]
+        i, actual, live, k = frame
+        if k == up_offsets[i + 1]:
+            stack.pop()
+            continue
+        frame[3] = k + 1
+        upstream = up_slots[k]
+        if upstream < 0:
+            raise KeyError("an upstream service does not support the schema being throttled")
+        reduced = apply_backpressure_rows(upstream, actual, live, incoming, visited, reduction)
+        reducing = reduced > 0
+        if reducing.any():
+            if len(stack) > incoming.shape[1]:
+                raise RecursionError("backpressure walk deeper than the slot count")
+            stack.append([upstream, reduced, reducing, up_offsets[upstream]])
+
+
+def resolve_rows(state, incoming, current, allocated, visited, reduction):
+    """kernels.resolve over a scenarios x slots table.
+
+    Returns (statuses, actions, iterations, first overload mask and
+    percentages), all with one row per scenario.
+    """
+    offsets = to_list(state.offsets)
+    up_offsets = to_list(state.up_offsets)
+    up_slots = to_list(state.up_slots)
+    scenarios, slots = incoming.shape
+    services = len(offsets) - 1
+    iterations = np.zeros(scenarios, dtype=np.int64)
+    first_over = np.zeros((scenarios, slots), dtype=bool)
+    first_pct = np.zeros((scenarios, slots))
+    active = np.full(scenarios, 2 * services > 0)
+    first = True
+    with np.errstate(divide="ignore", invalid="ignore"):
+        while active.any():
+            iterations += active
+            over = np.zeros((scenarios, slots), dtype=bool)
+            pct = np.zeros((scenarios, slots))
+            for k in range(services):
+                low, high = offsets[k], offsets[k + 1]
+                for i in range(low, high):
+                    rows = active & (incoming[:, i] > allocated[:, i])
+                    if rows.any():
+                        reallocate_rows(incoming, current, allocated, low, high, rows)
+                        over[:, i] = rows
+                        pct[:, i] = np.where(
+                            rows, (incoming[:, i] - allocated[:, i]) / incoming[:, i], 0.0
+                        )
+            if first:
+                first_over, first_pct, first = over, pct, False
+            active &= over.any(axis=1)
+            if not active.any():
+                break
+            visited[active] = False
+            reduction[active] = 0.0
+            for i in range(slots):
+                rows = over[:, i] & active
+                if rows.any():
+                    backpressure_rows(
+                        i, pct[:, i], rows, incoming, visited, reduction, up_offsets, up_slots
+                    )
+            active &= iterations < 2 * services
+
+        everyone = np.ones(scenarios, dtype=bool)
+        statuses = np.zeros((scenarios, services), dtype=np.int64)
+        actions = np.zeros((scenarios, services), dtype=np.int64)
+        for k in range(services):
+            low, high = offsets[k], offsets[k + 1]
+            reallocate_rows(incoming, current, allocated, low, high, everyone)
+            inc = incoming[:, low:high]
+            over = (inc > allocated[:, low:high]).any(axis=1)
+            under = (inc < 0.5 * allocated[:, low:high]).all(axis=1)
+            actions[:, k] = np.where(over, 2, np.where(under, 1, 0))
+            # assess_service_status: the status is judged against current capacity.
+            over = (inc > current[:, low:high]).any(axis=1)
+            under = (inc < 0.5 * current[:, low:high]).all(axis=1)
+            statuses[:, k] = np.where(over, 1, np.where(under, 2, 0))
+    return statuses, actions, iterations, first_over, first_pct
+
+
+class TableRows:
+    """Rows of a scenarios x n array, turned into lists when read."""
+
+    def __init__(self, table, labels=None):
+        self.table = table
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, scenario):
+        row = self.table[scenario].tolist()
+        if self.labels is None:
+            return row
+        return [self.labels[code] for code in row]
+
+
+class FirstOverloads:
+    """Per scenario, the (slot, percentage) pairs of the first overload scan."""
+
+    def __init__(self, over, percentages):
+        self.over = over
+        self.percentages = percentages
+
+    def __len__(self):
+        return len(self.over)
+
+    def __getitem__(self, scenario):
+        slots = np.flatnonzero(self.over[scenario])
+        return list(zip(slots.tolist(), self.percentages[scenario, slots].tolist()))
+
+
+class BatchResult:
+    def __init__(self, topology):
+        self.topology = topology
+        self.incoming = []
+        self.allocated = []
+        self.statuses = []
+        self.actions = []
+        self.overloads = []
+        self.iterations = []
+
+    def __len__(self):
+        return len(self.incoming)
+
+    def admitted(self, scenario):
+        return [
+            min(incoming, allocated)
+            for incoming, allocated in zip(self.incoming[scenario], self.allocated[scenario])
+        ]
+
+    def overload_map(self, scenario):
+        """The first calculate_overloads result, keyed like crystal's."""
+        topology = self.topology
+        overloaded = {}
+        for slot, percentage in self.overloads[scenario]:
+            service = topology.services[topology.slot_service[slot]]
+            schema = topology.schemas[topology.slot_schema[slot]]
+            overloaded.setdefault(service, {})[schema] = percentage
+        return overloaded
+
+
+class BatchEvaluator:
+    def __init__(self, pipeline):
+        backend = KernelBackend(pipeline)
+        self.state = backend.state
+        self.topology = self.state.topology
+        self.incoming = to_list(backend.pack("incoming_flow", "float64"))
+        self.outgoing = to_list(backend.pack("outgoing_flow", "float64"))
+        self.current = to_list(backend.pack("current_capacity", "float64"))
+        self.allocated = to_list(backend.pack("allocated_capacity", "float64"))
+        self.visited = to_list(backend.pack("visited", "bool_"))
+        self.reduction = to_list(backend.pack("reduction_factors", "float64"))
+
+    def rows(self, scenarios):
+        """Turn run_cycle-style service_flows dicts into incoming/outgoing rows."""
+        slots = self.topology.slots
+        incoming_rows = []
+        outgoing_rows = []
+        for service_flows in scenarios:
+            incoming = list(self.incoming)
+            outgoing = list(self.outgoing)
+            for service_name, flows in service_flows.items():
+                for schema_name, (in_flow, out_flow) in flows.items():
+                    slot = slots[(service_name, schema_name)]
+                    incoming[slot] = in_flow
+                    outgoing[slot] = out_flow
+            incoming_rows.append(incoming)
+            outgoing_rows.append(outgoing)
+        return incoming_rows, outgoing_rows
+
+    def table(self, scenarios):
+        """The incoming rows of `scenarios` as one scenarios x slots array."""
+        slots = self.topology.slots
+        rows = []
+        columns = []
+        values = []
+        for s, service_flows in enumerate(scenarios):
+            for service_name, flows in service_flows.items():
+                for schema_name, (in_flow, _) in flows.items():
+                    rows.append(s)
+                    columns.append(slots[(service_name, schema_name)])
+                    values.append(in_flow)
+        table = np.tile(np.array(self.incoming, dtype=np.float64), (len(scenarios), 1))
+        table[rows, columns] = values
+        return table
+
+    def evaluate(self, scenarios):
+        if np is not None:
+            return self.evaluate_rows(self.table(scenarios))
+        return self.evaluate_rows(self.rows(scenarios)[0])
+
+    def evaluate_rows(self, incoming_rows, current_rows=None):
+        """Resolve every row; current_rows optionally overrides capacities."""
+        result = BatchResult(self.topology)
+        if np is not None and len(incoming_rows):
+            self.resolve_table(result, incoming_rows, current_rows)
+            return result
+        for s, incoming in enumerate(incoming_rows):
+            current = current_rows[s] if current_rows is not None else self.current
+            self.resolve(result, incoming, current)
+        return result
+
+    def resolve_table(self, result, incoming_rows, current_rows):
+        scenarios = len(incoming_rows)
+        incoming = np.array(incoming_rows, dtype=np.float64).reshape(scenarios, -1)
+        if current_rows is not None:
+            current = np.array(current_rows, dtype=np.float64).reshape(scenarios, -1)
+        else:
+            current = np.tile(np.array(self.current, dtype=np.float64), (scenarios, 1))
+        allocated = np.tile(np.array(self.allocated, dtype=np.float64), (scenarios, 1))
+        visited = np.tile(np.array(self.visited, dtype=bool), (scenarios, 1))
+        reduction = np.tile(np.array(self.reduction, dtype=np.float64), (scenarios, 1))
+        statuses, actions, iterations, first_over, first_pct = resolve_rows(
+            self.state, incoming, current, allocated, visited, reduction
+        )
+        result.incoming = TableRows(incoming)
+        result.allocated = TableRows(allocated)
+        result.statuses = TableRows(statuses, STATUSES)
+        result.actions = TableRows(actions, ACTIONS)
+        result.overloads = FirstOverloads(first_over, first_pct)
+        result.iterations = iterations.tolist()
+
+    def resolve(self, result, incoming, current):
+        incoming = array(incoming, "float64")
+        allocated = array(self.allocated, "float64")
+        iterations, first = self.state.resolve(
+            incoming,
+            array(current, "float64"),
+            allocated,
+            array(self.visited, "bool_"),
+            array(self.reduction, "float64"),
+        )
+        result.incoming.append(to_list(incoming))
+        result.allocated.append(to_list(allocated))
+        result.statuses.append([STATUSES[code] for code in to_list(self.state.statuses)])
+        result.actions.append([ACTIONS[code] for code in to_list(self.state.actions)])
+        result.overloads.append(first)
+        result.iterations.append(iterations)
@@ -0,0 +1,96 @@
+import glob
+import os
+import random
+
+import pytest
+
+from batch import BatchEvaluator
+from crystal import Pipeline
+from loader import read_definition
+from sweep import perturb
+
+SCENARIOS = sorted(
+    glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios", "*.jsonl"))
+)
+
+
+def run_cycle(definition, flows):
+    pipeline = Pipeline(*definition, verbose=False)
+    first = []
+    calculate_overloads = pipeline.calculate_overloads
+
+    def first_overloads():
+        overloaded = calculate_overloads()
+        if not first:
+            first.append(overloaded)
+        return overloaded
+
+    pipeline.calculate_overloads = first_overloads
+    pipeline.run_cycle(flows)
+    return pipeline, first[0]
+
+
+@pytest.mark.parametrize("path", SCENARIOS, ids=os.path.basename)
+def test_batch_matches_run_cycle(path):
+    definition = read_definition(path)
+    rng = random.Random(path)
+    scenarios = [definition[0]] + [
+        perturb(definition, rng, 0.5, 0.0)[0] for _ in range(20)
+    ]
+    result = BatchEvaluator(Pipeline(*definition, verbose=False)).evaluate(scenarios)
+    topology = result.topology
+    assert len(result) == len(scenarios)
+    for s, flows in enumerate(scenarios):
+        pipeline, overloaded = run_cycle(definition, flows)
+        incoming = []
+        allocated = []
+        for k, name in enumerate(topology.services):
+            service = pipeline.services[name]
+            incoming.extend(service.incoming_flow.values())
+            allocated.extend(service.allocated_capacity.values())
+            assert result.statuses[s][k] == service.status
+            assert result.actions[s][k] == service.action
+        assert result.incoming[s] == incoming
+        assert result.allocated[s] == allocated
+        assert result.admitted(s) == [min(a, b) for a, b in zip(incoming, allocated)]
+        assert result.overload_map(s) == {
+            service: {schema.name: pct for schema, pct in schemas.items()}
+            for service, schemas in overloaded.items()
+        }
+
+
+def test_scenarios_start_from_the_pipeline_state():
+    definition = read_definition(SCENARIOS[0])
+    pipeline = Pipeline(*definition, verbose=False)
+    pipeline.run_cycle(definition[0])
+    evaluator = BatchEvaluator(pipeline)
+    service = next(iter(definition[0]))
+    result = evaluator.evaluate([{}, {service: definition[0][service]}])
+    pipeline.run_cycle({service: definition[0][service]})
+    state = []
+    for name in result.topology.services:
+        state.extend(pipeline.services[name].allocated_capacity.values())
+    assert result.allocated[1] == state
+
+
+def test_numpy_resolves_the_batch_as_one_table():
+    pytest.importorskip("numpy")
+    import batch
+
+    assert batch.BACKEND == "numpy"
+    definition = read_definition(SCENARIOS[0])
+    rng = random.Random(0)
+    scenarios = [perturb(definition, rng, 0.5, 0.0)[0] for _ in range(30)]
+    evaluator = BatchEvaluator(Pipeline(*definition, verbose=False))
+    table = evaluator.evaluate(scenarios)
+    rows = batch.BatchResult(evaluator.topology)
+    for incoming in evaluator.rows(scenarios)[0]:
+        evaluator.resolve(rows, incoming, evaluator.current)
+    assert len(table) == len(rows) == 30
+    for s in range(30):
+        assert table.incoming[s] == rows.incoming[s]
+        assert table.allocated[s] == rows.allocated[s]
+        assert table.statuses[s] == rows.statuses[s]
+        assert table.actions[s] == rows.actions[s]
+        assert table.overloads[s] == rows.overloads[s]
+    assert table.iterations == rows.iterations
@@ -0,0 +1,574 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from actuation import CONTROLLERS, Actuator
+from batch import BACKEND as BATCH_BACKEND, BatchEvaluator
+from coarsen import CoarseResolver
+from coarsenGraph import replicated_definition
+from collector import MetricsCollector
+from crystal import AllocationCache, Pipeline
+from forecast import Forecaster
+from instrument import Instrumentation
+from kernels import BACKEND, KernelBackend
+from loader import dump_jsonl, load, read_definition
+from memory import MemoryDebugger, format_report as format_memory, memory_report
+from metricsCollection import FakeCloudWatch, build_pipeline, metric_value
+from replay import read_ticks, replay, scaled_ticks, write_ticks
+from sdx import Schema, share_capacity
+from simulate import format_report as format_simulation, simulate
+from snapshot import SnapshotView, load_snapshot, save_snapshot
+from strategies import compare, format_report as format_strategies
+from sweep import format_report as format_sweep, perturb, sweep
+from tenants import SharedTopology
+from tracelog import TraceRecorder, replay_trace
+
+
+def synthetic_definition(services, schemas, fan_out=3, layer_size=100):
+    """Layered topology: every service feeds `fan_out` services of the next layer."""
+    schema_names = [f"S{j + 1}" for j in range(schemas)]
+    names = [f"Svc{i}" for i in range(services)]
+    service_flows = {}
+    schema_capacities = {}
+    graph = {}
+    for i, name in enumerate(names):
+        service_flows[name] = {
+            schema: (50 + (i * 7 + j * 13) % 100, 50) for j, schema in enumerate(schema_names)
+        }
+        schema_capacities[name] = {schema: (10, 120) for schema in schema_names}
+        next_layer = (i // layer_size + 1) * layer_size
+        graph[name] = [
+            names[next_layer + (i + k) % layer_size]
+            for k in range(fan_out)
+            if next_layer + (i + k) % layer_size < services
+        ]
+    schema_priorities = {schema: schemas - j for j, schema in enumerate(schema_names)}
+    return service_flows, schema_capacities, graph, schema_priorities
+
+
+def bench_metrics_collector(services=2000, cycles=5, max_workers=8):
+    pipeline = build_pipeline(services)
+    client = FakeCloudWatch(metric_value, page_size=250)
+    collector = MetricsCollector(pipeline, client=client, max_workers=max_workers)
+    now = datetime(2024, 10, 1, 12, 0, 0, tzinfo=timezone.utc)
+    started = time.perf_counter()
+    for cycle in range(cycles):
+        collector.collect(now + timedelta(seconds=collector.period * cycle))
+    elapsed = time.perf_counter() - started
+    collector.close()
+    fetched = len(collector.series) * cycles
+    print(
+        f"metrics collector: {fetched} series in {elapsed:.3f}s "
+        f"({fetched / elapsed:,.0f} metrics/s, {client.calls} API calls)"
+    )
+
+
+def bench_snapshot_restore(services=100_000, schemas=7):
+    definition = synthetic_definition(services, schemas)
+    started = time.perf_counter()
+    pipeline = Pipeline(*definition)
+    cold = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "pipeline.snap")
+        started = time.perf_counter()
+        save_snapshot(pipeline, path)
+        saved = time.perf_counter() - started
+        size = os.path.getsize(path)
+
+        started = time.perf_counter()
+        SnapshotView(path).close()
+        mapped = time.perf_counter() - started
+
+        started = time.perf_counter()
+        restored = load_snapshot(path)
+        restore = time.perf_counter() - started
+
+        # Services are built from the mapping on first use; the first full
+        # pass pays for the rest.
+        name = next(reversed(pipeline.services))
+        started = time.perf_counter()
+        restored.services[name]
+        lookup = time.perf_counter() - started
+        started = time.perf_counter()
+        len(restored.services)
+        len(restored.graph)
+        built = time.perf_counter() - started
+
+    print(
+        f"snapshot: {services} services x {schemas} schemas, cold build {cold:.3f}s, "
+        f"save {saved:.3f}s ({size / 2**20:.1f} MiB), map {mapped * 1000:.2f}ms, "
+        f"restore {restore:.3f}s, one service {lookup * 1000:.2f}ms, "
+        f"all services {built:.3f}s"
+    )
+
+
+def bench_scenario_loader(services=100_000, schemas=8):
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl = os.path.join(directory, "topology.jsonl")
+        dump_jsonl(*synthetic_definition(services, schemas), jsonl)
+        size = os.path.getsize(jsonl)
+
+        started = time.perf_counter()
+        pipeline = load(jsonl)
+        streamed = time.perf_counter() - started
+
+        columnar = os.path.join(directory, "topology.snap")
+        save_snapshot(pipeline, columnar)
+        del pipeline
+        started = time.perf_counter()
+        load(columnar)
+        mapped = time.perf_counter() - started
+
+    print(
+        f"loader: {services} services x {schemas} schemas, jsonl "
+        f"({size / 2**20:.1f} MiB) {streamed:.3f}s, columnar {mapped:.3f}s"
+    )
+
+
+SEVEN_SCHEMAS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scenarios", "hothSingle.jsonl"
+)
+
+
+def bench_batch_replay(ticks=10_000):
+    service_flows = read_definition(SEVEN_SCHEMAS)[0]
+    profile = [0.6 + 0.8 * ((tick * 37) % 100) / 100 for tick in range(ticks)]
+    with tempfile.TemporaryDirectory() as directory:
+        series = os.path.join(directory, "series.csv")
+        write_ticks(series, scaled_ticks(service_flows, profile))
+        pipeline = load(SEVEN_SCHEMAS, verbose=False)
+        with open(os.path.join(directory, "results.jsonl"), "w") as output:
+            summary = replay(pipeline, read_ticks(series), output)
+    rate = summary["ticks"] / summary["seconds"] * 60
+    print(
+        f"replay: {summary['ticks']} ticks on sevenSchemas in {summary['seconds']:.2f}s "
+        f"({rate:,.0f} ticks/minute)"
+    )
+
+
+def bench_trace_overhead(cycles=2048):
+    # A plain and a recorded pipeline take turns running short stretches of
+    # the same ticks and the overhead is the median of the paired time ratios,
+    # which holds up on a busy machine better than two whole runs do. The
+    # recorder is flushed after every stretch and the flush counts towards
+    # the recorded time: serialization has to happen on some cycle's thread.
+    def run(pipeline, ticks):
+        started = time.perf_counter()
+        for flows in ticks:
+            pipeline.run_cycle(flows)
+        return time.perf_counter() - started
+
+    cases = [
+        ("sevenSchemas", read_definition(SEVEN_SCHEMAS), cycles, 64),
+        ("600x3 synthetic", synthetic_definition(600, 3), cycles // 16, 1),
+    ]
+    for label, definition, count, stretch in cases:
+        profile = [0.6 + 0.8 * ((tick * 37) % 100) / 100 for tick in range(count)]
+        ticks = [flows for _, flows in scaled_ticks(definition[0], profile)]
+        plain = Pipeline(*definition, verbose=False)
+        ratios = []
+        plain_seconds = traced_seconds = flush_seconds = 0.0
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cycles.trace")
+            pipeline = Pipeline(*definition, verbose=False)
+            recorder = TraceRecorder.open(path, pipeline)
+            for start in range(0, count, stretch):
+                untraced = run(plain, ticks[start : start + stretch])
+                traced = run(pipeline, ticks[start : start + stretch])
+                started = time.perf_counter()
+                recorder.flush()
+                flushed = time.perf_counter() - started
+                flush_seconds += flushed
+                traced += flushed
+                ratios.append(traced / untraced)
+                plain_seconds += untraced
+                traced_seconds += traced
+            recorder.close()
+            size = os.path.getsize(path)
+            started = time.perf_counter()
+            replayed, mismatches = replay_trace(path)
+            replay_seconds = time.perf_counter() - started
+        overhead = (statistics.median(ratios) - 1) * 100
+        print(
+            f"trace: {count} cycles on {label}, {plain_seconds / count * 1e6:.0f}us plain, "
+            f"{traced_seconds / count * 1e6:.0f}us recorded, median overhead "
+            f"{overhead:+.1f}% ({'within' if overhead < 5 else 'over'} the 5% target), "
+            f"including {flush_seconds / count * 1e6:.0f}us/cycle in flush(), "
+            f"{size / count:.0f} bytes/cycle; replayed in {replay_seconds:.2f}s, "
+            f"{len(mismatches)} mismatches"
+        )
+
+
+def bench_instrumentation(cycles=300, rounds=6):
+    service_flows = read_definition(SEVEN_SCHEMAS)[0]
+    profile = [0.6 + 0.8 * ((tick * 37) % 100) / 100 for tick in range(cycles)]
+    ticks = [flows for _, flows in scaled_ticks(service_flows, profile)]
+
+    def run(pipeline):
+        started = time.perf_counter()
+        for flows in ticks:
+            pipeline.run_cycle(flows)
+        return (time.perf_counter() - started) / cycles * 1e6
+
+    plain = load(SEVEN_SCHEMAS, verbose=False)
+    enabled = load(SEVEN_SCHEMAS, verbose=False)
+    Instrumentation(enabled)
+    closed = load(SEVEN_SCHEMAS, verbose=False)
+    Instrumentation(closed).close()
+    # Interleaved, best of several rounds: this box is too noisy for one pass.
+    best = {"plain": [], "instrumented": [], "after close": []}
+    for _ in range(rounds):
+        for timings, pipeline in zip(best.values(), [plain, enabled, closed]):
+            timings.append(run(pipeline))
+    print(
+        f"instrument: {cycles} cycles on sevenSchemas, "
+        + ", ".join(f"{min(timings):.0f}us {label}" for label, timings in best.items())
+    )
+
+
+# Bytes budgets for memory_report on the 7-schema synthetic topology.
+TOPOLOGY_BYTES_PER_SERVICE = 1000
+FLOW_STATE_BYTES_PER_SLOT = 360
+
+
+def bench_memory(services=20_000, schemas=7):
+    pipeline = Pipeline(*synthetic_definition(services, schemas), verbose=False)
+    started = time.perf_counter()
+    report = memory_report(pipeline)
+    seconds = time.perf_counter() - started
+    print(f"memory: {services} services x {schemas} schemas, report in {seconds:.2f}s")
+    print(format_memory(report))
+    assert report["topology_per_service"] <= TOPOLOGY_BYTES_PER_SERVICE, report
+    assert report["flow_state_per_slot"] <= FLOW_STATE_BYTES_PER_SLOT, report
+
+    pipeline = load(SEVEN_SCHEMAS, verbose=False)
+    debugger = MemoryDebugger(pipeline)
+    service_flows = read_definition(SEVEN_SCHEMAS)[0]
+    for _, flows in scaled_ticks(service_flows, [0.8, 1.0, 1.2, 1.4, 1.0]):
+        pipeline.run_cycle(flows)
+    debugger.close()
+    print(
+        f"memory: sevenSchemas cycle peak {debugger.peak():,} bytes, retained "
+        f"{sum(cycle['retained'] for cycle in debugger.cycles):,} bytes over "
+        f"{len(debugger.cycles)} cycles"
+    )
+
+
+def bench_simulation(ticks=1_000_000):
+    report = simulate(load(SEVEN_SCHEMAS, verbose=False), ticks, resolve_every=10)
+    print(f"simulate: sevenSchemas, {ticks / report['seconds']:,.0f} ticks/s")
+    print(format_simulation(report))
+
+
+def bench_sweep(samples=5000, workers=None):
+    definition = read_definition(SEVEN_SCHEMAS)
+    started = time.perf_counter()
+    report = sweep(definition, samples, workers=workers)
+    seconds = time.perf_counter() - started
+    print(
+        f"sweep: {samples} samples on sevenSchemas with {workers or os.cpu_count()} "
+        f"workers in {seconds:.2f}s ({samples / seconds:,.0f} samples/s)"
+    )
+    print(format_sweep(report, top=5))
+
+
+def bench_batch(scenarios=2000):
+    definition = read_definition(SEVEN_SCHEMAS)
+    rng = random.Random(0)
+    batch = [perturb(definition, rng, 0.3, 0.0)[0] for _ in range(scenarios)]
+
+    started = time.perf_counter()
+    for flows in batch:
+        Pipeline(*definition, verbose=False).run_cycle(flows)
+    pipelines = time.perf_counter() - started
+
+    started = time.perf_counter()
+    evaluator = BatchEvaluator(Pipeline(*definition, verbose=False))
+    result = evaluator.evaluate(batch)
+    batched = time.perf_counter() - started
+    overloaded = sum(1 for first in result.overloads if any(pct > 0 for _, pct in first))
+    print(
+        f"batch: {scenarios} sevenSchemas scenarios, Pipeline per scenario {pipelines:.2f}s, "
+        f"batched ({BATCH_BACKEND}) {batched:.2f}s ({pipelines / batched:.1f}x); "
+        f"{overloaded} scenarios overloaded"
+    )
+
+
+def bench_budget(services=3000, schemas=3, time_budget=0.15):
+    # Big enough that unbounded resolution takes several times the budget, so
+    # the budgeted cycle stops early and reports itself incomplete. The first
+    # calculate_overloads pass alone is ~50ms here; the budget is only
+    # checked between waves, and the final reallocation pass comes after it.
+    definition = synthetic_definition(services, schemas)
+    flows = {
+        name: {schema: (in_flow * 2, out_flow) for schema, (in_flow, out_flow) in slots.items()}
+        for name, slots in definition[0].items()
+    }
+    for label, budget in [("unbounded", None), (f"{time_budget * 1000:.0f}ms budget", time_budget)]:
+        pipeline = Pipeline(*definition, verbose=False)
+        started = time.perf_counter()
+        complete = pipeline.run_cycle(flows, time_budget=budget)
+        elapsed = time.perf_counter() - started
+        overloaded = sum(
+            service.status.value == "OVERLOADED" for service in pipeline.services.values()
+        )
+        print(
+            f"budget: {services}x{schemas} doubled flows, {label}: {elapsed:.3f}s, "
+            f"complete={complete}, {pipeline.resolution_waves} waves, "
+            f"{overloaded} services overloaded"
+        )
+
+
+def bench_warm_start(cycles=2000, services=400):
+    layered = synthetic_definition(services, 3)
+    doubled = {
+        name: {schema: (in_flow * 2, out_flow) for schema, (in_flow, out_flow) in slots.items()}
+        for name, slots in layered[0].items()
+    }
+    cases = [
+        ("sevenSchemas", read_definition(SEVEN_SCHEMAS), None, cycles),
+        (f"{services}x3 doubled", layered, doubled, cycles // 100),
+    ]
+    for label, definition, flows, count in cases:
+        flows = flows or definition[0]
+        for warm_start in [False, True]:
+            pipeline = Pipeline(*definition, verbose=False, warm_start=warm_start)
+            iterations = 0
+            started = time.perf_counter()
+            for _ in range(count):
+                pipeline.run_cycle(flows)
+                iterations += pipeline.resolution_iterations
+            elapsed = time.perf_counter() - started
+            print(
+                f"warm start {'on' if warm_start else 'off'}: {count} steady {label} cycles "
+                f"in {elapsed:.2f}s, {iterations / count:.2f} iterations/cycle, "
+                f"{pipeline.iterations_saved} iterations saved"
+            )
+
+
+def bench_allocation_cache(cycles=2000, rounds=3):
+    definition = read_definition(SEVEN_SCHEMAS)
+    best = {}
+    for _ in range(rounds):
+        for label in ["uncached", "cached"]:
+            cache = AllocationCache() if label == "cached" else None
+            pipeline = Pipeline(*definition, verbose=False, allocation_cache=cache)
+            started = time.perf_counter()
+            for _ in range(cycles):
+                pipeline.run_cycle(definition[0])
+            elapsed = time.perf_counter() - started
+            best[label] = min(best.get(label, elapsed), elapsed)
+    stats = cache.stats()
+    print(
+        f"allocation cache: {cycles} steady sevenSchemas cycles, uncached {best['uncached']:.3f}s, "
+        f"cached {best['cached']:.3f}s; hit rate {stats['hit_rate']:.1%} "
+        f"({stats['hits']:,} hits, {stats['misses']:,} misses, {stats['size']} entries)"
+    )
+
+
+def bench_coarsening(clusters=50, replicas=36, cycles=3):
+    definition = replicated_definition(clusters, replicas)
+    full = Pipeline(*definition, verbose=False)
+    started = time.perf_counter()
+    for _ in range(cycles):
+        full.run_cycle(definition[0])
+    full_seconds = (time.perf_counter() - started) / cycles
+
+    started = time.perf_counter()
+    resolver = CoarseResolver(Pipeline(*definition, verbose=False))
+    build_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(cycles):
+        resolver.run_cycle(definition[0])
+    coarse_seconds = (time.perf_counter() - started) / cycles
+
+    def admitted(pipeline):
+        return sum(
+            min(flow, service.allocated_capacity[schema])
+            for service in pipeline.services.values()
+            for schema, flow in service.incoming_flow.items()
+        )
+
+    exact = admitted(full)
+    print(
+        f"coarsening: {len(full.services):,} services -> {len(resolver.names)} nodes; "
+        f"full cycle {full_seconds:.3f}s, coarse cycle {coarse_seconds:.4f}s "
+        f"({full_seconds / coarse_seconds:,.0f}x, build {build_seconds:.3f}s); "
+        f"admitted {admitted(resolver.pipeline) / exact - 1:+.2%} vs full"
+    )
+
+
+def bench_kernels(services=10_000, schemas=3, cycles=2):
+    definition = synthetic_definition(services, schemas)
+    pipeline = Pipeline(*definition, verbose=False)
+    started = time.perf_counter()
+    for _ in range(cycles):
+        pipeline.run_cycle(definition[0])
+    plain = (time.perf_counter() - started) / cycles
+
+    started = time.perf_counter()
+    backend = KernelBackend(Pipeline(*definition, verbose=False))
+    build = time.perf_counter() - started
+    # The first cycle compiles the kernels (or loads them from numba's cache).
+    started = time.perf_counter()
+    backend.run_cycle(definition[0])
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(cycles):
+        backend.run_cycle(definition[0])
+    kernel = (time.perf_counter() - started) / cycles
+    print(
+        f"kernels ({BACKEND}): {services}x{schemas} synthetic, Pipeline cycle {plain:.3f}s, "
+        f"kernel cycle {kernel:.3f}s ({plain / kernel:.1f}x, build {build:.3f}s, "
+        f"first cycle {first:.3f}s)"
+    )
+
+
+def bench_strategies(scenarios=200):
+    definition = read_definition(SEVEN_SCHEMAS)
+    rng = random.Random(0)
+    batch = [perturb(definition, rng, 0.3, 0.0)[0] for _ in range(scenarios)]
+    print("strategies: sevenSchemas, flows perturbed by 30%")
+    print(format_strategies(compare(definition, batch)))
+
+
+def bench_apportionment(calls=20_000):
+    schemas = [Schema(f"S{i}", 8 - i) for i in range(1, 8)]
+    rng = random.Random(0)
+    for exponent in range(2, 8):
+        capacity = 10**exponent
+        flows = [
+            dict(zip(schemas, (rng.uniform(0, capacity / 5) for _ in schemas)))
+            for _ in range(100)
+        ]
+        started = time.perf_counter()
+        for call in range(calls):
+            share_capacity(capacity, flows[call % 100], schemas)
+        elapsed = time.perf_counter() - started
+        print(
+            f"apportionment: capacity 10^{exponent}, 7 schemas, "
+            f"{elapsed / calls * 1e6:.1f}us per reallocation"
+        )
+
+
+def bench_mutation(sizes=(1_000, 10_000, 100_000), rounds=1000):
+    for services in sizes:
+        definition = synthetic_definition(services, 3)
+        pipeline = Pipeline(*definition, verbose=False)
+        started = time.perf_counter()
+        pipeline.index_upstreams()
+        index_seconds = time.perf_counter() - started
+
+        rng = random.Random(0)
+        names = list(pipeline.services)
+        flows = {schema: (60, 50) for schema in definition[3]}
+        capacities = {schema: (10, 120) for schema in definition[3]}
+        started = time.perf_counter()
+        for i in range(rounds):
+            name = f"Added{i}"
+            upstream, downstream = rng.sample(names, 2)
+            pipeline.add_service(name, flows, capacities, [downstream])
+            pipeline.add_edge(upstream, name)
+            pipeline.set_capacity(name, "S1", 10, 200)
+            pipeline.remove_edge(upstream, name)
+            pipeline.remove_service(name)
+        per_op = (time.perf_counter() - started) / (rounds * 5)
+        print(
+            f"mutation: {services:,} services, {per_op * 1e6:.1f}us per change "
+            f"(upstream index built once in {index_seconds * 1000:.1f}ms)"
+        )
+
+
+def bench_tenants(services=2000, schemas=3, tenants=200):
+    definition = synthetic_definition(services, schemas)
+
+    def build(make):
+        tracemalloc.start()
+        started = time.perf_counter()
+        pipelines = [make() for _ in range(tenants)]
+        seconds = time.perf_counter() - started
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        for pipeline in pipelines[:2]:
+            pipeline.run_cycle(definition[0])
+        return seconds, size
+
+    separate = build(lambda: Pipeline(*definition, verbose=False))
+    topology = SharedTopology(*definition)
+    shared = build(topology.tenant)
+    for label, (seconds, size) in [("own Pipeline", separate), ("shared topology", shared)]:
+        print(
+            f"tenants: {tenants} x {services}x{schemas}, {label}: "
+            f"{seconds / tenants * 1000:.2f}ms and {size / tenants / 1024:,.0f} KiB per tenant"
+        )
+
+
+def bench_actuation(ticks=20000):
+    for label in [None] + list(CONTROLLERS):
+        pipeline = load(SEVEN_SCHEMAS, verbose=False)
+        actuator = Actuator(pipeline, CONTROLLERS[label]() if label else None)
+        report = simulate(pipeline, ticks, resolve_every=10, actuator=actuator)
+        capacity = sum(sum(service.current_capacity.values()) for service in pipeline.services.values())
+        throughput = sum(stats["throughput"] for stats in report["schemas"].values())
+        dropped = sum(stats["dropped"] for stats in report["schemas"].values())
+        swing = max(stats["swing"] for stats in report["schemas"].values())
+        print(
+            f"actuation: sevenSchemas, {label or 'fixed'}: capacity {capacity:,.0f} for "
+            f"{throughput:,.1f}/tick, dropped {dropped:,.0f}, swing {swing:,.0f}, "
+            f"{ticks / report['seconds']:,.0f} ticks/s"
+        )
+
+
+def bench_forecast(ticks=10_000, period=60):
+    # Repeated ramps: flat, 20 ticks up, flat, 20 ticks down.
+    shape = [0.3] * 10 + [0.3 + 0.025 * i for i in range(20)] + [0.8] * 10
+    shape += [0.8 - 0.025 * i for i in range(20)]
+    profile = [shape[tick % period] for tick in range(ticks)]
+    service_flows = read_definition(SEVEN_SCHEMAS)[0]
+    for label in ("reactive", "holt"):
+        pipeline = load(SEVEN_SCHEMAS, verbose=False)
+        forecaster = Forecaster(pipeline) if label == "holt" else None
+        with open(os.devnull, "w") as output:
+            summary = replay(pipeline, scaled_ticks(service_flows, profile), output, forecaster)
+        error = f", wape {forecaster.errors()['overall']['wape']:.3f}" if forecaster else ""
+        print(
+            f"forecast: {ticks} ramp ticks on sevenSchemas, {label}: "
+            f"{summary['late_ticks']} late, {summary['overloaded_ticks']} overloaded, "
+            f"{summary['seconds']:.2f}s{error}"
+        )
+
+
+BENCHMARKS = {
+    "collector": bench_metrics_collector,
+    "snapshot": bench_snapshot_restore,
+    "loader": bench_scenario_loader,
+    "replay": bench_batch_replay,
+    "trace": bench_trace_overhead,
+    "instrument": bench_instrumentation,
+    "memory": bench_memory,
+    "simulate": bench_simulation,
+    "sweep": bench_sweep,
+    "batch": bench_batch,
+    "budget": bench_budget,
+    "warm": bench_warm_start,
+    "cache": bench_allocation_cache,
+    "coarsen": bench_coarsening,
+    "kernels": bench_kernels,
+    "strategies": bench_strategies,
+    "apportion": bench_apportionment,
+    "mutation": bench_mutation,
+    "tenants": bench_tenants,
+    "actuation": bench_actuation,
+    "forecast": bench_forecast,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
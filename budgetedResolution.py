@@ -0,0 +1,100 @@
+from actuation import Actuator
+from crystal import Pipeline, ServiceStatus
+from forecast import Forecaster
+from instrument import Instrumentation
+from memory import MemoryDebugger
+from tracelog import TraceRecorder
+
+
+def fan_out_definition():
+    # Src feeds A (S1, 50% over capacity) and B (S2, a third over); S2 has the
+    # higher priority.
+    service_flows = {
+        "Src": {"S1": (200, 200), "S2": (150, 150)},
+        "A": {"S1": (200, 100)},
+        "B": {"S2": (150, 100)},
+    }
+    schema_capacities = {
+        "Src": {"S1": (10, 400), "S2": (10, 400)},
+        "A": {"S1": (10, 100)},
+        "B": {"S2": (10, 100)},
+    }
+    graph = {"Src": ["A", "B"], "A": [], "B": []}
+    schema_priorities = {"S1": 1, "S2": 2}
+    return service_flows, schema_capacities, graph, schema_priorities
+
+
+def record_waves(pipeline):
+    waves = []
+    depth = [0]
+    propagate_backpressure = pipeline.propagate_backpressure
+
+    def recorded(service_name, schema, reduction_percentage):
+        if not depth[0]:
+            waves.append((service_name, schema.name))
+        depth[0] += 1
+        try:
+            return propagate_backpressure(service_name, schema, reduction_percentage)
+        finally:
+            depth[0] -= 1
+
+    pipeline.propagate_backpressure = recorded
+    return waves
+
+
+def test_without_a_budget_resolution_completes():
+    definition = fan_out_definition()
+    pipeline = Pipeline(*definition, verbose=False)
+    assert pipeline.run_cycle(definition[0]) is True
+    assert pipeline.resolution_complete
+    assert pipeline.services["A"].incoming_flow[pipeline.schemas["S1"]] <= 100
+
+
+def test_work_budget_takes_the_most_severe_overload_first():
+    definition = fan_out_definition()
+    pipeline = Pipeline(*definition, verbose=False)
+    waves = record_waves(pipeline)
+    assert pipeline.run_cycle(definition[0], work_budget=1) is False
+    assert not pipeline.resolution_complete
+    assert waves == [("A", "S1")]
+
+    pipeline = Pipeline(*definition, verbose=False)
+    waves = record_waves(pipeline)
+    assert pipeline.run_cycle(definition[0], work_budget=2) is False
+    assert waves == [("A", "S1"), ("B", "S2")]
+
+
+def test_spent_time_budget_still_leaves_a_consistent_plan():
+    definition = fan_out_definition()
+    pipeline = Pipeline(*definition, verbose=False)
+    assert pipeline.run_cycle(definition[0], time_budget=0) is False
+    a = pipeline.services["A"]
+    s1 = pipeline.schemas["S1"]
+    assert a.incoming_flow[s1] == 200
+    assert a.allocated_capacity == a.allocate_capacity()
+    assert a.status == ServiceStatus.OVERLOADED
+
+
+def test_generous_budget_completes():
+    definition = fan_out_definition()
+    pipeline = Pipeline(*definition, verbose=False)
+    assert pipeline.run_cycle(definition[0], time_budget=60, work_budget=10_000) is True
+    assert all(
+        pct <= 0
+        for schemas in pipeline.calculate_overloads().values()
+        for pct in schemas.values()
+    )
+
+
+def test_wrappers_forward_positional_budgets(tmp_path):
+    definition = fan_out_definition()
+    pipeline = Pipeline(*definition, verbose=False)
+    recorder = TraceRecorder.open(tmp_path / "cycles.trace", pipeline)
+    instrumentation = Instrumentation(pipeline)
+    debugger = MemoryDebugger(pipeline)
+    assert pipeline.run_cycle(definition[0], 60, 1) is False
+    assert Actuator(pipeline).run_cycle(definition[0], None, 1) is False
+    assert Forecaster(pipeline).run_cycle(definition[0], 60, 10_000) is True
+    debugger.close()
+    instrumentation.close()
+    recorder.close()
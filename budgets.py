@@ -0,0 +1,173 @@
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+# Fixed layout of the segment (all little endian, doubles 8-byte aligned):
+#
+#   header     magic, layout version, services, schemas, workers, sequence
+#   names      service names then schema names, NAME_SIZE bytes each
+#   admitted   one double per (service, schema) slot, written by the controller
+#   budget     one double per slot, written by the controller
+#   baseline   one double per slot, consumption already accounted for at publish
+#   consumed   one column of doubles per worker, each written by its worker only
+#
+# The controller is the only writer of the first three arrays and guards them
+# with a sequence lock: the sequence is odd while a publish is in flight.
+MAGIC = b"MSTB"
+LAYOUT_VERSION = 1
+NAME_SIZE = 32
+HEADER = struct.Struct("<4sHHIII")
+SEQUENCE_OFFSET = 24
+HEADER_SIZE = 32
+
+
+def segment_size(services, schemas, workers):
+    slots = services * schemas
+    names = (services + schemas) * NAME_SIZE
+    return HEADER_SIZE + names + 8 * slots * (3 + workers)
+
+
+class BudgetTable:
+    def __init__(self, shm, worker=None, owner=False):
+        self.shm = shm
+        self.worker = worker
+        self.owner = owner
+
+        magic, version, _, services, schemas, workers = HEADER.unpack_from(shm.buf)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise ValueError(f"{shm.name} is not a budget table segment")
+        if worker is not None and not 0 <= worker < workers:
+            raise ValueError(f"worker {worker} out of range 0..{workers - 1}")
+
+        offset = HEADER_SIZE
+        names = []
+        for _ in range(services + schemas):
+            raw = bytes(shm.buf[offset : offset + NAME_SIZE])
+            names.append(raw.rstrip(b"\0").decode())
+            offset += NAME_SIZE
+        self.service_names = names[:services]
+        self.schema_names = names[services:]
+        self.slots = {
+            (service, schema): i * schemas + j
+            for i, service in enumerate(self.service_names)
+            for j, schema in enumerate(self.schema_names)
+        }
+
+        slots = services * schemas
+        self._sequence = shm.buf[SEQUENCE_OFFSET:HEADER_SIZE].cast("Q")
+        self._admitted = self._doubles(offset, slots)
+        self._budget = self._doubles(offset + 8 * slots, slots)
+        self._baseline = self._doubles(offset + 16 * slots, slots)
+        self._consumed = [
+            self._doubles(offset + 8 * slots * (3 + w), slots) for w in range(workers)
+        ]
+
+    def _doubles(self, offset, count):
+        return self.shm.buf[offset : offset + 8 * count].cast("d")
+
+    @classmethod
+    def create(cls, pipeline, workers, name=None):
+        service_names = list(pipeline.services)
+        schema_names = list(pipeline.schemas)
+        size = segment_size(len(service_names), len(schema_names), workers)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        HEADER.pack_into(
+            shm.buf,
+            0,
+            MAGIC,
+            LAYOUT_VERSION,
+            0,
+            len(service_names),
+            len(schema_names),
+            workers,
+        )
+        offset = HEADER_SIZE
+        for label in service_names + schema_names:
+            encoded = label.encode()
+            if len(encoded) > NAME_SIZE:
+                shm.close()
+                shm.unlink()
+                raise ValueError(f"name {label!r} longer than {NAME_SIZE} bytes")
+            shm.buf[offset : offset + len(encoded)] = encoded
+            offset += NAME_SIZE
+
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name, worker=None):
+        shm = shared_memory.SharedMemory(name=name)
+        # Only the controller that created the segment may unlink it; without
+        # this a worker exiting would have its resource tracker remove it.
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, worker=worker)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def sequence(self):
+        return self._sequence[0]
+
+    def publish(self, pipeline, period=1.0):
+        schema_count = len(self.schema_names)
+        admitted = [0.0] * len(self._admitted)
+        for i, service_name in enumerate(self.service_names):
+            service = pipeline.services[service_name]
+            for j, schema_name in enumerate(self.schema_names):
+                schema = pipeline.schemas[schema_name]
+                if schema in service.supported_schemas:
+                    admitted[i * schema_count + j] = min(
+                        service.incoming_flow[schema],
+                        service.allocated_capacity[schema],
+                    )
+
+        self._sequence[0] += 1
+        for slot, rate in enumerate(admitted):
+            self._admitted[slot] = rate
+            self._budget[slot] = rate * period
+            self._baseline[slot] = self._total_consumed(slot)
+        self._sequence[0] += 1
+        return self._sequence[0]
+
+    def _total_consumed(self, slot):
+        return sum(column[slot] for column in self._consumed)
+
+    def read(self, service_name, schema_name):
+        slot = self.slots[(service_name, schema_name)]
+        while True:
+            sequence = self._sequence[0]
+            if sequence & 1:
+                continue
+            admitted = self._admitted[slot]
+            budget = self._budget[slot]
+            baseline = self._baseline[slot]
+            if self._sequence[0] == sequence:
+                break
+        remaining = budget - (self._total_consumed(slot) - baseline)
+        return admitted, remaining
+
+    def consume(self, service_name, schema_name, amount=1):
+        if self.worker is None:
+            raise RuntimeError("consume requires a table attached with a worker id")
+        _, remaining = self.read(service_name, schema_name)
+        if remaining < amount:
+            return False
+        # Each worker only ever writes its own column, so no lock is needed;
+        # concurrent workers may overshoot by at most one request each.
+        self._consumed[self.worker][self.slots[(service_name, schema_name)]] += amount
+        return True
+
+    def close(self):
+        for view in [self._sequence, self._admitted, self._budget, self._baseline]:
+            view.release()
+        for view in self._consumed:
+            view.release()
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            # Workers forked from the controller share its resource tracker, so
+            # their unregister in attach() also dropped ours; restore it first.
+            resource_tracker.register(self.shm._name, "shared_memory")
+            self.shm.unlink()
@@ -0,0 +1,102 @@
+from crystal import Pipeline, ServiceAction, ServiceStatus
+from publisher import DecisionPublisher
+
+
+def build_pipeline():
+    service_flows = {
+        "Source": {"S1": (100, 100)},
+        "Processor": {"S1": (100, 80)},
+        "Destination": {"S1": (80, 80)},
+    }
+    schema_capacities = {
+        "Source": {"S1": (0, 120)},
+        "Processor": {"S1": (60, 80)},
+        "Destination": {"S1": (60, 100)},
+    }
+    graph = {
+        "Source": ["Processor"],
+        "Processor": ["Destination"],
+        "Destination": [],
+    }
+    pipeline = Pipeline(service_flows, schema_capacities, graph, {"S1": 1})
+    pipeline.run_cycle(service_flows)
+    return pipeline, service_flows
+
+
+def test_only_deltas_are_published(capsys):
+    pipeline, service_flows = build_pipeline()
+    pushed = []
+    publisher = DecisionPublisher(sink=pushed.append)
+
+    first = publisher.publish(pipeline)
+    assert set(first) == {"Source", "Processor", "Destination"}
+    assert first["Processor"]["allocated_capacity"] == {"S1": 80}
+
+    # Same inputs converge to the same decisions: nothing to push.
+    pipeline.run_cycle(service_flows)
+    assert publisher.publish(pipeline) == {}
+    assert len(pushed) == 1
+
+    schema = pipeline.schemas["S1"]
+    pipeline.services["Processor"].allocated_capacity[schema] = 60
+    batch = publisher.publish(pipeline)
+    assert batch == {"Processor": {"allocated_capacity": {"S1": 60}}}
+    assert publisher.stats()["batches"] == 2
+
+
+def test_deadband_suppresses_small_changes_until_they_accumulate(capsys):
+    pipeline, _ = build_pipeline()
+    publisher = DecisionPublisher(relative_deadband=0.05, absolute_deadband=1.0)
+    publisher.publish(pipeline)
+    published = publisher.published_changes
+
+    schema = pipeline.schemas["S1"]
+    processor = pipeline.services["Processor"]
+    for value in (81, 82, 83):
+        processor.allocated_capacity[schema] = value
+        assert publisher.publish(pipeline) == {}
+    assert publisher.suppressed_changes == 3
+
+    # 85 is more than 5% away from the last pushed 80.
+    processor.allocated_capacity[schema] = 85
+    assert publisher.publish(pipeline) == {
+        "Processor": {"allocated_capacity": {"S1": 85}}
+    }
+    assert publisher.published_changes == published + 1
+
+
+def test_transitions_to_and_from_zero_are_always_published(capsys):
+    pipeline, _ = build_pipeline()
+    publisher = DecisionPublisher(relative_deadband=0.05, absolute_deadband=1.0)
+    schema = pipeline.schemas["S1"]
+    processor = pipeline.services["Processor"]
+    processor.allocated_capacity[schema] = 0.5
+    publisher.publish(pipeline)
+
+    processor.allocated_capacity[schema] = 0
+    assert publisher.publish(pipeline) == {"Processor": {"allocated_capacity": {"S1": 0}}}
+    processor.allocated_capacity[schema] = 0.8
+    assert publisher.publish(pipeline) == {"Processor": {"allocated_capacity": {"S1": 0.8}}}
+    processor.allocated_capacity[schema] = 1.2
+    assert publisher.publish(pipeline) == {}
+
+
+def test_status_hysteresis_holds_back_flapping(capsys):
+    pipeline, _ = build_pipeline()
+    publisher = DecisionPublisher(hold_cycles=2)
+    publisher.publish(pipeline)
+
+    source = pipeline.services["Source"]
+    original = (source.status, source.action)
+    source.status, source.action = ServiceStatus.OVERLOADED, ServiceAction.SLOWDOWN
+    assert publisher.publish(pipeline) == {}
+
+    # Flapping back resets the hold.
+    source.status, source.action = original
+    assert publisher.publish(pipeline) == {}
+
+    source.status, source.action = ServiceStatus.OVERLOADED, ServiceAction.SLOWDOWN
+    assert publisher.publish(pipeline) == {}
+    assert publisher.publish(pipeline) == {
+        "Source": {"status": "OVERLOADED", "action": "SLOWDOWN"}
+    }
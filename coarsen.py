@@ -0,0 +1,248 @@
+import sys
+
+from crystal import Pipeline
+
+# Graph coarsening: resolve overloads on a reduced graph and expand the result
+# back to every service.
+#
+#   siblings  services with the same schemas and capacity bounds, the same
+#             upstream services and the same downstream services (the Bungee
+#             clusters behind the CDIS nodes) become one node whose flows and
+#             capacities are the members' sums
+#   chains    a node whose only downstream node has it as its only upstream
+#             is merged with it; a chain admits what its tightest stage
+#             admits, so its capacity per schema is the head's incoming flow
+#             times the smallest capacity / incoming ratio along the chain
+#
+# The coarse nodes form an ordinary Pipeline. Each cycle it resolves on the
+# aggregated flows, giving every node an admitted fraction (resolved incoming
+# / raw incoming, at most 1). The members of a node's head are scaled by it;
+# every later stage by the smallest of its own capacity / incoming ratio, the
+# ratios of the stages after it and the admitted fractions of the downstream
+# nodes, which is what backpressure reaching it from downstream would leave,
+# but never by less than the head. The fine pipeline's final status pass and
+# assessment then run as usual. Siblings pool capacity, so results
+# approximate resolving the full graph rather than replicate it.
+
+
+def neighbours(pipeline):
+    # Upstream as propagate_backpressure sees it: graph keys that list the service.
+    upstream = {name: [] for name in pipeline.services}
+    for service_name, targets in pipeline.graph.items():
+        for target in dict.fromkeys(targets):
+            if target in upstream:
+                upstream[target].append(service_name)
+    downstream = {
+        name: list(dict.fromkeys(pipeline.graph.get(name, []))) for name in pipeline.services
+    }
+    return upstream, downstream
+
+
+def sibling_groups(pipeline):
+    upstream, downstream = neighbours(pipeline)
+    groups = {}
+    for name, service in pipeline.services.items():
+        if name in upstream[name]:
+            key = (name,)
+        else:
+            key = (
+                tuple(schema.name for schema in service.supported_schemas),
+                frozenset(
+                    (schema.name, tuple(bounds))
+                    for schema, bounds in service.schema_capacities.items()
+                ),
+                frozenset(upstream[name]),
+                frozenset(downstream[name]),
+            )
+        groups.setdefault(key, []).append(name)
+    return list(groups.values())
+
+
+def chains(nodes, schemas, upstream, downstream):
+    """Merge node runs a -> b where b is a's only downstream and a is b's only upstream."""
+    successor = {}
+    has_predecessor = set()
+    for a in range(len(nodes)):
+        if len(downstream[a]) == 1:
+            b = downstream[a][0]
+            if b != a and upstream[b] == [a] and schemas[a] == schemas[b]:
+                successor[a] = b
+                has_predecessor.add(b)
+    runs = []
+    placed = set()
+    for a in range(len(nodes)):
+        if a in has_predecessor or a in placed:
+            continue
+        run = [a]
+        placed.add(a)
+        while run[-1] in successor and successor[run[-1]] not in placed:
+            run.append(successor[run[-1]])
+            placed.add(run[-1])
+        runs.append(run)
+    # Cycles of single-parent nodes have no head; keep them as they are.
+    runs.extend([a] for a in range(len(nodes)) if a not in placed)
+    return runs
+
+
+class CoarseResolver:
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        groups = sibling_groups(pipeline)
+        group_of = {name: g for g, members in enumerate(groups) for name in members}
+        upstream, downstream = neighbours(pipeline)
+        group_upstream = [list(dict.fromkeys(group_of[u] for u in upstream[m[0]])) for m in groups]
+        group_downstream = [
+            list(dict.fromkeys(group_of[d] for d in downstream[m[0]] if d in group_of))
+            for m in groups
+        ]
+        group_schemas = [
+            [schema.name for schema in pipeline.services[m[0]].supported_schemas] for m in groups
+        ]
+        runs = chains(groups, group_schemas, group_upstream, group_downstream)
+        runs.sort(key=lambda run: min(group_of[groups[g][0]] for g in run))
+
+        # nodes[n]: the node's stages, head first; each stage is a list of
+        # sibling service names.
+        self.nodes = [[groups[g] for g in run] for run in runs]
+        self.schemas = [group_schemas[run[0]] for run in runs]
+        self.names = [self.node_name(stages) for stages in self.nodes]
+        node_of_group = {g: n for n, run in enumerate(runs) for g in run}
+        graph = {
+            self.names[n]: list(
+                dict.fromkeys(self.names[node_of_group[g]] for g in group_downstream[run[-1]])
+            )
+            for n, run in enumerate(runs)
+        }
+        flows, capacities, _ = self.aggregate()
+        self.coarse = Pipeline(
+            flows,
+            capacities,
+            graph,
+            {name: schema.priority for name, schema in pipeline.schemas.items()},
+            verbose=False,
+        )
+
+    @staticmethod
+    def node_name(stages):
+        name = stages[0][0] if len(stages[0]) == 1 else f"{stages[0][0]}*{len(stages[0])}"
+        if len(stages) > 1:
+            tail = stages[-1]
+            name += ">" + (tail[0] if len(tail) == 1 else f"{tail[0]}*{len(tail)}")
+        return name
+
+    def stage_totals(self, members, schema):
+        incoming = outgoing = low = high = 0
+        for name in members:
+            service = self.pipeline.services[name]
+            schema_obj = self.pipeline.schemas[schema]
+            incoming += service.incoming_flow[schema_obj]
+            outgoing += service.outgoing_flow[schema_obj]
+            bounds = service.schema_capacities[schema_obj]
+            low += bounds[0]
+            high += service.current_capacity[schema_obj]
+        return incoming, outgoing, low, high
+
+    def aggregate(self):
+        """Coarse service_flows and schema_capacities from the fine pipeline's state.
+
+        Also returns, per node and schema, each stage's capacity / incoming
+        ratio (at most 1): the fraction its own overload would admit.
+        """
+        flows = {}
+        capacities = {}
+        ratios = {}
+        for name, stages, schemas in zip(self.names, self.nodes, self.schemas):
+            flows[name] = {}
+            capacities[name] = {}
+            ratios[name] = {}
+            for schema in schemas:
+                totals = [self.stage_totals(members, schema) for members in stages]
+                head_in = totals[0][0]
+                bottleneck = min(
+                    range(len(totals)),
+                    key=lambda k: totals[k][3] / totals[k][0] if totals[k][0] > 0 else float("inf"),
+                )
+                high = totals[bottleneck][3]
+                if totals[bottleneck][0] > 0:
+                    high = head_in * (high / totals[bottleneck][0])
+                flows[name][schema] = (head_in, totals[-1][1])
+                capacities[name][schema] = (min(min(stage[2] for stage in totals), high), high)
+                ratios[name][schema] = [
+                    min(1.0, stage[3] / stage[0]) if stage[0] > 0 else 1.0 for stage in totals
+                ]
+        return flows, capacities, ratios
+
+    @property
+    def reduction(self):
+        return len(self.pipeline.services) / len(self.names) if self.names else 1.0
+
+    def run_cycle(self, service_flows):
+        """Pipeline.run_cycle on the fine pipeline, resolved on the coarse graph."""
+        pipeline = self.pipeline
+        for service_name, flows in service_flows.items():
+            service = pipeline.services[service_name]
+            for schema_name, (in_flow, out_flow) in flows.items():
+                schema = pipeline.schemas[schema_name]
+                service.incoming_flow[schema] = in_flow
+                service.outgoing_flow[schema] = out_flow
+
+        flows, capacities, ratios = self.aggregate()
+        coarse = self.coarse
+        for name, bounds in capacities.items():
+            node = coarse.services[name]
+            for schema_name, (low, high) in bounds.items():
+                schema = coarse.schemas[schema_name]
+                node.schema_capacities[schema] = (low, high)
+                node.current_capacity[schema] = high
+        complete = coarse.run_cycle(flows)
+
+        admitted = {}
+        for name, node_flows in flows.items():
+            node = coarse.services[name]
+            admitted[name] = {}
+            for schema_name, (raw, _) in node_flows.items():
+                resolved = node.incoming_flow[coarse.schemas[schema_name]]
+                admitted[name][schema_name] = min(1.0, resolved / raw) if raw > 0 else 1.0
+
+        for name, stages in zip(self.names, self.nodes):
+            downstream = coarse.graph.get(name, [])
+            for schema_name, head in admitted[name].items():
+                # Backpressure reaches a stage from its own overload, from
+                # every stage after it and from the nodes downstream, which
+                # pass on what their heads gave up; the head itself keeps
+                # what the coarse graph admitted.
+                fraction = min(
+                    (admitted[d][schema_name] for d in downstream if schema_name in admitted[d]),
+                    default=1.0,
+                )
+                fractions = []
+                for ratio in reversed(ratios[name][schema_name]):
+                    fraction = min(fraction, ratio)
+                    fractions.append(max(head, fraction))
+                fractions[-1] = head
+                fine_schema = pipeline.schemas[schema_name]
+                for members, fraction in zip(stages, reversed(fractions)):
+                    if fraction < 1.0:
+                        for member in members:
+                            pipeline.services[member].incoming_flow[fine_schema] *= fraction
+        pipeline.update_statuses()
+        pipeline.assess_service_status()
+        return complete
+
+
+def format_summary(resolver):
+    lines = [
+        f"{len(resolver.pipeline.services):,} services -> {len(resolver.names):,} nodes "
+        f"({resolver.reduction:.1f}x)"
+    ]
+    for name, stages in zip(resolver.names, resolver.nodes):
+        size = sum(len(members) for members in stages)
+        if size > 1:
+            lines.append(f"  {name}: {size} services in {len(stages)} stage(s)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from loader import load
+
+    print(format_summary(CoarseResolver(load(sys.argv[1], verbose=False))))
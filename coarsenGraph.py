@@ -0,0 +1,134 @@
+import pytest
+
+from coarsen import CoarseResolver, sibling_groups
+from crystal import Pipeline
+from testSupport import scenario, state
+
+COARSE = ("incoming_flow", "status", "action")
+
+
+def replicated_definition(clusters, replicas, schemas=3):
+    """sevenSchemas-shaped clusters: Router -> 3 CDIS -> `replicas` Bungees -> Hoth."""
+    schema_names = [f"S{j + 1}" for j in range(schemas)]
+    service_flows = {}
+    schema_capacities = {}
+    graph = {}
+
+    def add(name, flow, capacity, downstream):
+        service_flows[name] = {schema: (flow, flow) for schema in schema_names}
+        schema_capacities[name] = {schema: (flow / 2, capacity) for schema in schema_names}
+        graph[name] = downstream
+
+    for c in range(clusters):
+        cdis = [f"CDIS{c}_{k}" for k in range(3)]
+        bungees = [f"Bungee{c}_{k}" for k in range(replicas)]
+        per_bungee = 10 * (1 + c % 5)
+        add(f"Router{c}", per_bungee * replicas, 2 * per_bungee * replicas, cdis)
+        for name in cdis:
+            add(name, per_bungee * replicas / 3, per_bungee * replicas, bungees)
+        for name in bungees:
+            # Every third cluster's Bungees are 20% short of capacity.
+            add(name, per_bungee, per_bungee * (0.8 if c % 3 == 0 else 1.5), ["Hoth"])
+    add("Hoth", 10 * clusters * replicas * 3, 10 * clusters * replicas * 6, [])
+    schema_priorities = {schema: schemas - j for j, schema in enumerate(schema_names)}
+    return service_flows, schema_capacities, graph, schema_priorities
+
+
+def test_bungee_clusters_and_chains_collapse():
+    resolver = CoarseResolver(Pipeline(*scenario("hothSingle.jsonl"), verbose=False))
+    stages = dict(zip(resolver.names, resolver.nodes))
+    assert stages["CDIS1*2"] == [["CDIS1", "CDIS2"]]
+    assert stages["Bungee3*6"] == [[f"Bungee{k}" for k in range(3, 9)]]
+    assert stages["R2>Hoth"] == [["R2"], ["Hoth"]]
+    assert len(resolver.names) == 11
+
+
+def test_linear_chains_resolve_like_the_full_graph():
+    for name in [
+        "simplestGraph.jsonl",
+        "cases_simple_linear_overload.jsonl",
+        "cases_multi_schema_priority.jsonl",
+    ]:
+        definition = scenario(name)
+        full = Pipeline(*definition, verbose=False)
+        resolver = CoarseResolver(Pipeline(*definition, verbose=False))
+        assert len(resolver.names) == 1
+        for _ in range(3):
+            full.run_cycle(definition[0])
+            resolver.run_cycle(definition[0])
+            assert state(resolver.pipeline, COARSE) == state(full, COARSE)
+
+
+def test_replicated_clusters_resolve_like_the_full_graph():
+    definition = replicated_definition(6, 4)
+    full = Pipeline(*definition, verbose=False)
+    resolver = CoarseResolver(Pipeline(*definition, verbose=False))
+    assert len(resolver.names) == 7
+    full.run_cycle(definition[0])
+    resolver.run_cycle(definition[0])
+    for (name, fine_in, *fine_status), (full_name, full_in, *full_status) in zip(
+        state(resolver.pipeline, COARSE), state(full, COARSE)
+    ):
+        assert (name, *fine_status) == (full_name, *full_status)
+        assert all(abs(a - b) < 1e-9 for (_, a), (_, b) in zip(fine_in, full_in))
+
+
+def test_services_in_a_loop_are_not_merged():
+    definition = scenario("simplestGraph.jsonl")
+    definition[2]["Processor"] = ["Destination", "Processor"]
+    groups = sibling_groups(Pipeline(*definition, verbose=False))
+    assert ["Processor"] in groups
+
+
+def test_siblings_with_different_bounds_are_not_merged():
+    definition = scenario("multiSourceMultiDestination_overloaded.jsonl")
+    groups = sibling_groups(Pipeline(*definition, verbose=False))
+    assert ["Source1"] in groups and ["Source2"] in groups
+
+    definition[1]["Source2"] = dict(definition[1]["Source1"])
+    groups = sibling_groups(Pipeline(*definition, verbose=False))
+    assert ["Source1", "Source2"] in groups
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "cases_dual_path_bottleneck.jsonl",
+        "cases_complex_diamond_pattern.jsonl",
+        "multiSourceSingleDestination.jsonl",
+        "multiSourceMultiDestination_normal.jsonl",
+        "hothMultiSchemaTest.jsonl",
+    ],
+)
+def test_every_stage_resolves_like_the_full_graph(name):
+    definition = scenario(name)
+    full = Pipeline(*definition, verbose=False)
+    resolver = CoarseResolver(Pipeline(*definition, verbose=False))
+    full.run_cycle(definition[0])
+    resolver.run_cycle(definition[0])
+    for service_name, service in full.services.items():
+        fine = resolver.pipeline.services[service_name]
+        assert fine.status == service.status, service_name
+        assert list(fine.incoming_flow.values()) == pytest.approx(
+            list(service.incoming_flow.values())
+        ), service_name
+
+
+def test_stages_after_the_head_are_throttled():
+    # Dest1 and Dest2 are the tail of Processor>Dest1*2 and over capacity
+    # themselves; the full resolver brings both down to it.
+    definition = scenario("multiSourceMultiDestination_overloaded.jsonl")
+    full = Pipeline(*definition, verbose=False)
+    resolver = CoarseResolver(Pipeline(*definition, verbose=False))
+    full.run_cycle(definition[0])
+    resolver.run_cycle(definition[0])
+    for service_name in ["Dest1", "Dest2"]:
+        fine = resolver.pipeline.services[service_name]
+        service = full.services[service_name]
+        assert fine.status == service.status
+        assert list(fine.incoming_flow.values()) == pytest.approx(
+            list(service.incoming_flow.values())
+        )
+    for service in resolver.pipeline.services.values():
+        for schema, incoming in service.incoming_flow.items():
+            assert incoming <= service.current_capacity[schema] + 1e-9
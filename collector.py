@@ -0,0 +1,182 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+try:
+    import boto3
+    from botocore.config import Config
+except ImportError:  # only needed when no client is injected
+    boto3 = None
+
+# GetMetricData accepts at most this many MetricDataQueries per call.
+MAX_QUERIES_PER_CALL = 500
+INPUT_TPS = "InputTPS"
+OUTPUT_TPS = "OutputTPS"
+CAPACITY = "Capacity"
+METRICS = (INPUT_TPS, OUTPUT_TPS, CAPACITY)
+
+
+def create_client(region_name=None, max_pool_connections=10):
+    if boto3 is None:
+        raise RuntimeError("boto3 is required to create a CloudWatch client")
+    config = Config(
+        max_pool_connections=max_pool_connections,
+        retries={"mode": "adaptive", "max_attempts": 5},
+    )
+    # botocore clients are thread safe, so one client (and its connection
+    # pool) is shared by every fetch thread.
+    return boto3.client("cloudwatch", region_name=region_name, config=config)
+
+
+class MetricsCollector:
+    def __init__(
+        self,
+        pipeline,
+        client=None,
+        namespace="Contra/Throttling",
+        period=60,
+        max_workers=4,
+        batch_size=MAX_QUERIES_PER_CALL,
+    ):
+        if not 0 < batch_size <= MAX_QUERIES_PER_CALL:
+            raise ValueError(f"batch_size must be in 1..{MAX_QUERIES_PER_CALL}")
+        self.pipeline = pipeline
+        self.namespace = namespace
+        self.period = period
+        self.batch_size = batch_size
+        self.client = client or create_client(max_pool_connections=max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self.series = [
+            (service_name, schema.name, metric)
+            for service_name, service in pipeline.services.items()
+            for schema in service.supported_schemas
+            for metric in METRICS
+        ]
+        # Latest (timestamp, value) per series; series without new datapoints
+        # keep their cached value instead of dropping out of the cycle.
+        self.latest = {}
+        self.changed = set()
+        self.last_window = None
+        self.api_calls = 0
+
+    def query(self, index):
+        service_name, schema_name, metric = self.series[index]
+        return {
+            "Id": f"m{index}",
+            "MetricStat": {
+                "Metric": {
+                    "Namespace": self.namespace,
+                    "MetricName": metric,
+                    "Dimensions": [
+                        {"Name": "Service", "Value": service_name},
+                        {"Name": "Schema", "Value": schema_name},
+                    ],
+                },
+                "Period": self.period,
+                "Stat": "Average",
+            },
+            "ReturnData": True,
+        }
+
+    def window(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        epoch = int(now.timestamp())
+        end = datetime.fromtimestamp(epoch - epoch % self.period, timezone.utc)
+        return end - timedelta(seconds=2 * self.period), end
+
+    def fetch_batch(self, start, end, indices):
+        queries = [self.query(i) for i in indices]
+        results = []
+        calls = 0
+        kwargs = {
+            "MetricDataQueries": queries,
+            "StartTime": start,
+            "EndTime": end,
+            "ScanBy": "TimestampDescending",
+        }
+        while True:
+            response = self.client.get_metric_data(**kwargs)
+            calls += 1
+            results.extend(response["MetricDataResults"])
+            token = response.get("NextToken")
+            if not token:
+                return results, calls
+            kwargs["NextToken"] = token
+
+    def collect(self, now=None):
+        start, end = self.window(now)
+        if end == self.last_window:
+            # The period has not rolled over, nothing new can be published.
+            self.changed = set()
+            return self.flows()
+
+        batches = [
+            range(i, min(i + self.batch_size, len(self.series)))
+            for i in range(0, len(self.series), self.batch_size)
+        ]
+        futures = [
+            self.executor.submit(self.fetch_batch, start, end, batch)
+            for batch in batches
+        ]
+        changed = set()
+        for future in futures:
+            results, calls = future.result()
+            self.api_calls += calls
+            for result in results:
+                if not result["Values"]:
+                    continue
+                index = int(result["Id"][1:])
+                # Datapoints come newest first; pages may split one series.
+                latest = (result["Timestamps"][0], result["Values"][0])
+                previous = self.latest.get(index)
+                if previous is None or latest[0] > previous[0]:
+                    if previous is None or latest[1] != previous[1]:
+                        changed.add(self.series[index][:2])
+                    self.latest[index] = latest
+
+        self.last_window = end
+        self.changed = changed
+        return self.flows()
+
+    def values(self):
+        values = {}
+        for index, (_, value) in self.latest.items():
+            service_name, schema_name, metric = self.series[index]
+            values.setdefault(service_name, {}).setdefault(schema_name, {})[
+                metric
+            ] = value
+        return values
+
+    def flows(self):
+        """Return (service_flows, capacities) in the shape Pipeline expects."""
+        service_flows = {}
+        capacities = {}
+        for service_name, schemas in self.values().items():
+            for schema_name, metrics in schemas.items():
+                if INPUT_TPS in metrics or OUTPUT_TPS in metrics:
+                    service_flows.setdefault(service_name, {})[schema_name] = (
+                        metrics.get(INPUT_TPS, 0),
+                        metrics.get(OUTPUT_TPS, 0),
+                    )
+                if CAPACITY in metrics:
+                    capacities.setdefault(service_name, {})[schema_name] = metrics[
+                        CAPACITY
+                    ]
+        return service_flows, capacities
+
+    def apply_capacities(self, capacities):
+        for service_name, schemas in capacities.items():
+            service = self.pipeline.services[service_name]
+            for schema_name, capacity in schemas.items():
+                schema = self.pipeline.schemas[schema_name]
+                low, high = service.schema_capacities[schema]
+                service.current_capacity[schema] = min(max(capacity, low), high)
+
+    def feed(self, now=None):
+        service_flows, capacities = self.collect(now)
+        self.apply_capacities(capacities)
+        self.pipeline.run_cycle(service_flows)
+        return service_flows
+
+    def close(self):
+        self.executor.shutdown()
@@ -1,6 +1,9 @@
 import random
+import sys
+import time
 from enum import Enum
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
+from itertools import count
 
 from output import print_service_table_only_ips, print_dependency_graph
 
@@ -26,22 +29,156 @@ class Schema:
         return self.name
 
 
+class AllocationCache:
+    """Bounded LRU cache of allocation results.
+
+    Reallocation is a pure function of a service's incoming flow and current
+    capacity in schema order, so results are keyed by the policy and those two
+    vectors and shared by every service of the same shape. With quantum > 0
+    the vectors are rounded to multiples of it first, which trades exactness
+    for hits on nearly identical traffic.
+    """
+
+    def __init__(self, maxsize=4096, quantum=0):
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, policy, incoming, capacity):
+        quantum = self.quantum
+        if quantum:
+            return (
+                policy,
+                tuple(round(value / quantum) for value in incoming.values()),
+                tuple(round(value / quantum) for value in capacity.values()),
+            )
+        return (policy, tuple(incoming.values()), tuple(capacity.values()))
+
+    def get(self, key):
+        allocated = self.entries.get(key)
+        if allocated is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return allocated
+
+    def put(self, key, allocated):
+        self.entries[key] = allocated
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
 class Service:
-    def __init__(self, name, supported_schemas, schema_capacities):
+    def __init__(self, name, supported_schemas, schema_capacities, verbose=True):
+        self.set_state(
+            name,
+            supported_schemas,
+            schema_capacities,
+            {schema: 0 for schema in supported_schemas},
+            {schema: 0 for schema in supported_schemas},
+            {schema: schema_capacities[schema][1] for schema in supported_schemas},
+            None,
+            ServiceStatus.NORMAL,
+            ServiceAction.NO_ACTION,
+            {schema: False for schema in supported_schemas},
+            {schema: 0 for schema in supported_schemas},
+            verbose,
+        )
+        self.allocated_capacity = self.allocate_capacity()
+
+    @classmethod
+    def from_state(
+        cls,
+        name,
+        supported_schemas,
+        schema_capacities,
+        incoming_flow,
+        outgoing_flow,
+        current_capacity,
+        allocated_capacity,
+        status,
+        action,
+        visited,
+        reduction_factors,
+        verbose=True,
+    ):
+        """A service with the given state and no __init__ recomputation.
+
+        The schema list and bounds are used as given, so callers can share
+        them between services (tenants.SharedTopology); the state dicts are
+        owned by the new service.
+        """
+        service = cls.__new__(cls)
+        service.set_state(
+            name,
+            supported_schemas,
+            schema_capacities,
+            incoming_flow,
+            outgoing_flow,
+            current_capacity,
+            allocated_capacity,
+            status,
+            action,
+            visited,
+            reduction_factors,
+            verbose,
+        )
+        return service
+
+    def set_state(
+        self,
+        name,
+        supported_schemas,
+        schema_capacities,
+        incoming_flow,
+        outgoing_flow,
+        current_capacity,
+        allocated_capacity,
+        status,
+        action,
+        visited,
+        reduction_factors,
+        verbose,
+    ):
+        # Every Service attribute is set here, whichever way it was built.
         self.name = name
+        self.verbose = verbose
+        self.allocation_cache = None
         self.supported_schemas = supported_schemas
         self.schema_capacities = schema_capacities
-        self.incoming_flow = {schema: 0 for schema in supported_schemas}
-        self.outgoing_flow = {schema: 0 for schema in supported_schemas}
-        self.current_capacity = {
-            schema: schema_capacities[schema][1] for schema in supported_schemas
-        }
-        self.allocated_capacity = self.allocate_capacity()
-        self.status = ServiceStatus.NORMAL
-        self.action = ServiceAction.NO_ACTION
+        self.incoming_flow = incoming_flow
+        self.outgoing_flow = outgoing_flow
+        self.current_capacity = current_capacity
+        self.allocated_capacity = allocated_capacity
+        self.status = status
+        self.action = action
         # will be determined by the actual service not by this throttling algo
-        self.visited = {schema: False for schema in supported_schemas}
-        self.reduction_factors = {schema: 0 for schema in supported_schemas}
+        self.visited = visited
+        self.reduction_factors = reduction_factors
+        # Queue reports (Pipeline.report_queue): the last depth seen per
+        # schema, and this cycle's admissible incoming rate where the queue
+        # says it is lower than the flows alone would.
+        self.queue_depths = None
+        self.queue_limits = None
 
     def allocate_capacity(self):
         allocated = {}
@@ -83,21 +220,65 @@ class Service:
             )
 
             self.incoming_flow[schema] = new_flow
-            print(
-                f"  Applying {actual_reduction_percentage:.2%} backpressure to {self.name} for {schema}"
-            )
-            print(
-                f"    Reduced {self.name} {schema} input from {original_flow:.2f} to {new_flow:.2f}"
-            )
+            if self.verbose:
+                print(
+                    f"  Applying {actual_reduction_percentage:.2%} backpressure to {self.name} for {schema}"
+                )
+                print(
+                    f"    Reduced {self.name} {schema} input from {original_flow:.2f} to {new_flow:.2f}"
+                )
 
             return actual_reduction_percentage
         return 0
 
+    def set_capacity(self, schema, low, high):
+        # The schema list and bounds may be shared with other pipelines
+        # (tenants.py), so they are copied rather than edited.
+        self.schema_capacities = dict(self.schema_capacities)
+        # A schema the service did not support yet starts with no flow.
+        if schema not in self.incoming_flow:
+            self.supported_schemas = self.supported_schemas + [schema]
+            self.incoming_flow[schema] = 0
+            self.outgoing_flow[schema] = 0
+            self.visited[schema] = False
+            self.reduction_factors[schema] = 0
+        self.schema_capacities[schema] = (low, high)
+        self.current_capacity[schema] = high
+        self.allocated_capacity[schema] = min(self.allocated_capacity.get(schema, 0), high)
+
+    def remove_schema(self, schema):
+        self.supported_schemas = [s for s in self.supported_schemas if s is not schema]
+        self.schema_capacities = dict(self.schema_capacities)
+        for state in (
+            self.schema_capacities,
+            self.incoming_flow,
+            self.outgoing_flow,
+            self.current_capacity,
+            self.allocated_capacity,
+            self.visited,
+            self.reduction_factors,
+            self.queue_depths or {},
+            self.queue_limits or {},
+        ):
+            state.pop(schema, None)
+
     def reset_backpressure_state(self):
         self.visited = {schema: False for schema in self.supported_schemas}
         self.reduction_factors = {schema: 0 for schema in self.supported_schemas}
 
     def reallocate_capacity_across_schemas(self):
+        cache = self.allocation_cache
+        if cache is None:
+            return self.compute_reallocation()
+        key = cache.key("reallocate", self.incoming_flow, self.current_capacity)
+        allocated = cache.get(key)
+        if allocated is None:
+            self.compute_reallocation()
+            cache.put(key, tuple(self.allocated_capacity.values()))
+        else:
+            self.allocated_capacity = dict(zip(self.supported_schemas, allocated))
+
+    def compute_reallocation(self):
         self.allocated_capacity = self.allocate_capacity()
         total_incoming = sum(self.incoming_flow.values())
         total_allocated = sum(self.allocated_capacity.values())
@@ -142,10 +323,11 @@ class Service:
                     self.allocated_capacity[schema] += additional
 
     def process_flow(self):
-        print(f"\nProcessing flow for {self.name}")
-        print(f" Incoming flow: {self.incoming_flow}")
-        print(f" Current capacity: {self.current_capacity}")
-        print(f" Initial allocated capacity: {self.allocated_capacity}")
+        if self.verbose:
+            print(f"\nProcessing flow for {self.name}")
+            print(f" Incoming flow: {self.incoming_flow}")
+            print(f" Current capacity: {self.current_capacity}")
+            print(f" Initial allocated capacity: {self.allocated_capacity}")
 
         self.reallocate_capacity_across_schemas()
 
@@ -154,16 +336,23 @@ class Service:
             allocated = self.allocated_capacity[schema]
             self.outgoing_flow[schema] = min(incoming, allocated)
 
-        print(f" After reallocation:")
-        print(f" Allocated capacity: {self.allocated_capacity}")
-        print(f" Outgoing flow: {self.outgoing_flow}")
-        print(f" Service status: {self.status.value}")
-        print(f" Service action: {self.action.value}")
+        if self.verbose:
+            print(f" After reallocation:")
+            print(f" Allocated capacity: {self.allocated_capacity}")
+            print(f" Outgoing flow: {self.outgoing_flow}")
+            print(f" Service status: {self.status.value}")
+            print(f" Service action: {self.action.value}")
 
     def is_overloaded(self):
         return any(
             self.incoming_flow[s] > self.current_capacity[s]
             for s in self.supported_schemas
+        ) or self.is_queue_limited()
+
+    def is_queue_limited(self):
+        limits = self.queue_limits
+        return bool(limits) and any(
+            self.incoming_flow[schema] > limit for schema, limit in limits.items()
         )
 
     def is_underutilized(self):
@@ -174,7 +363,17 @@ class Service:
 
 
 class Pipeline:
-    def __init__(self, service_flows, schema_capacities, graph, schema_priorities):
+    def __init__(
+        self,
+        service_flows,
+        schema_capacities,
+        graph,
+        schema_priorities,
+        verbose=True,
+        warm_start=False,
+        allocation_cache=None,
+    ):
+        self.verbose = verbose
         self.schemas = {
             name: Schema(name, priority) for name, priority in schema_priorities.items()
         }
@@ -192,7 +391,7 @@ class Pipeline:
             }
 
             self.services[service_name] = Service(
-                service_name, supported_schemas, schema_obj_capacities
+                service_name, supported_schemas, schema_obj_capacities, verbose
             )
             for schema_name, (in_flow, out_flow) in flows.items():
                 schema = self.schemas[schema_name]
@@ -200,6 +399,205 @@ class Pipeline:
                 self.services[service_name].outgoing_flow[schema] = out_flow
 
         self.graph = graph
+        self.upstream_index = None
+        self.graph_order = None
+        self.graph_positions = None
+        self.service_order = None
+        # Bumped by every change to services, schemas or edges, for anything
+        # compiled from the topology (forecast.Forecaster) to notice.
+        self.topology_version = 0
+        # A tenants.SharedTopology when schemas, graph and indexes belong to
+        # it; the topology methods below copy them before the first change.
+        self.shared_topology = None
+        self.set_allocation_cache(allocation_cache)
+        self.resolution_complete = True
+        self.resolution_converged = True
+        self.resolution_iterations = 0
+        self.resolution_waves = 0
+
+        # Warm start: the last converged cold solution, as ({service:
+        # {schema: (raw input, admitted input, Schema)}}, iterations). Cycles
+        # whose inputs are unchanged, or up to warm_tolerance higher where
+        # nothing was throttled, start from the admitted ones instead of from
+        # scratch and end where a cold solve would.
+        self.warm_start = warm_start
+        self.warm_tolerance = 0.05
+        self.warm_anchor = None
+        self.warm_cycles = 0
+        self.cold_cycles = 0
+        self.iterations_saved = 0
+
+        # Queue-aware overload detection (apply_queue_reports). Reports are
+        # optional and consumed by the next cycle; queue_interval is the time
+        # between cycles and queue_drain_seconds how fast a queue past its
+        # latency SLO should get back under it.
+        self.queue_reports = {}
+        self.queue_limited = []
+        self.latency_slos = {}
+        self.queue_interval = 1.0
+        self.queue_drain_seconds = 10.0
+
+    def set_verbose(self, verbose):
+        self.verbose = verbose
+        for service in self.services.values():
+            service.verbose = verbose
+
+    def set_allocation_cache(self, allocation_cache):
+        # One AllocationCache can be shared by several pipelines.
+        self.allocation_cache = allocation_cache
+        for service in self.services.values():
+            service.allocation_cache = allocation_cache
+
+    def upstreams(self, service_name):
+        index = self.upstream_index
+        if index is None:
+            index = self.index_upstreams()
+        return index.get(service_name, ())
+
+    def index_upstreams(self):
+        # Upstream services of every service, in graph order (the order a
+        # scan of the graph finds them in). Built on first use and kept
+        # current by the topology methods below; code that edits self.graph
+        # directly afterwards must call this again.
+        index = {}
+        for upstream, targets in self.graph.items():
+            for target in dict.fromkeys(targets):
+                index.setdefault(target, []).append(upstream)
+        self.upstream_index = index
+        self.graph_order = {name: position for position, name in enumerate(self.graph)}
+        self.graph_positions = count(len(self.graph))
+        return index
+
+    def own_topology(self):
+        if self.shared_topology is None:
+            return
+        self.shared_topology = None
+        self.schemas = dict(self.schemas)
+        self.graph = dict(self.graph)
+        self.upstream_index = None
+        self.graph_order = None
+        self.graph_positions = None
+
+    # Live topology changes. Each one touches the services and edges it
+    # names (a schema, every service supporting it) and the upstream index
+    # entries for them; every other service keeps its converged state. Graph
+    # lists are replaced rather than edited, as callers may share them. The
+    # warm-start anchor describes the old topology and is dropped.
+
+    def add_schema(self, name, priority):
+        if name in self.schemas:
+            raise ValueError(f"schema {name} already exists")
+        self.own_topology()
+        self.schemas[name] = Schema(name, priority)
+        self.topology_version += 1
+
+    def remove_schema(self, name):
+        self.own_topology()
+        schema = self.schemas.pop(name)
+        for service in self.services.values():
+            if schema in service.incoming_flow:
+                service.remove_schema(schema)
+        self.queue_reports = {
+            pair: report for pair, report in self.queue_reports.items() if pair[1] != name
+        }
+        self.latency_slos.pop(name, None)
+        self.topology_version += 1
+        self.warm_anchor = None
+
+    def add_service(self, name, flows, capacities, downstream=()):
+        if name in self.services:
+            raise ValueError(f"service {name} already exists")
+        schemas = self.schemas
+        service = Service(
+            name,
+            [schemas[schema_name] for schema_name in flows],
+            {schemas[s]: tuple(caps) for s, caps in capacities.items()},
+            self.verbose,
+        )
+        service.allocation_cache = self.allocation_cache
+        for schema_name, (in_flow, out_flow) in flows.items():
+            schema = schemas[schema_name]
+            service.incoming_flow[schema] = in_flow
+            service.outgoing_flow[schema] = out_flow
+        self.services[name] = service
+        for target in downstream:
+            self.add_edge(name, target)
+        self.service_order = None
+        self.topology_version += 1
+        self.warm_anchor = None
+        return service
+
+    def remove_service(self, name):
+        self.own_topology()
+        del self.services[name]
+        if name in self.queue_limited:
+            self.queue_limited.remove(name)
+        self.queue_reports = {
+            pair: report for pair, report in self.queue_reports.items() if pair[0] != name
+        }
+        index = self.upstream_index
+        if index is None:
+            index = self.index_upstreams()
+        for upstream in index.pop(name, ()):
+            self.graph[upstream] = [
+                target for target in self.graph[upstream] if target != name
+            ]
+        for target in dict.fromkeys(self.graph.pop(name, ())):
+            index[target].remove(name)
+        self.graph_order.pop(name, None)
+        self.service_order = None
+        self.topology_version += 1
+        self.warm_anchor = None
+
+    def add_edge(self, upstream, downstream):
+        for name in (upstream, downstream):
+            if name not in self.services:
+                raise ValueError(f"unknown service {name}")
+        self.own_topology()
+        index = self.upstream_index
+        if index is None:
+            index = self.index_upstreams()
+        targets = self.graph.get(upstream)
+        if targets is None:
+            targets = []
+            self.graph_order[upstream] = next(self.graph_positions)
+        elif downstream in targets:
+            return
+        self.graph[upstream] = targets + [downstream]
+
+        # Keep the downstream's upstreams in graph order.
+        order = self.graph_order
+        upstreams = index.setdefault(downstream, [])
+        position = len(upstreams)
+        while position and order[upstreams[position - 1]] > order[upstream]:
+            position -= 1
+        upstreams.insert(position, upstream)
+        self.service_order = None
+        self.topology_version += 1
+        self.warm_anchor = None
+
+    def remove_edge(self, upstream, downstream):
+        targets = self.graph.get(upstream, ())
+        if downstream not in targets:
+            raise ValueError(f"no edge {upstream} -> {downstream}")
+        self.own_topology()
+        index = self.upstream_index
+        if index is None:
+            index = self.index_upstreams()
+        self.graph[upstream] = [target for target in targets if target != downstream]
+        index[downstream].remove(upstream)
+        self.service_order = None
+        self.topology_version += 1
+        self.warm_anchor = None
+
+    def set_capacity(self, service_name, schema_name, low, high):
+        """Change (or add) a service's capacity bounds for one schema."""
+        service = self.services[service_name]
+        schema = self.schemas[schema_name]
+        if schema not in service.incoming_flow:
+            self.topology_version += 1
+        service.set_capacity(schema, low, high)
+        self.warm_anchor = None
 
     def is_bungee_overloaded_for_schema(self, schema):
         return any(
@@ -209,9 +607,7 @@ class Pipeline:
         )
 
     def propagate_slowdown(self, service_name):
-        upstream_services = [
-            s for s, deps in self.graph.items() if service_name in deps
-        ]
+        upstream_services = self.upstreams(service_name)
         for upstream in upstream_services:
             service = self.services[upstream]
             if service.status != ServiceStatus.OVERLOADED:
@@ -344,12 +740,24 @@ class Pipeline:
                         break
                 sccs.append(scc)
 
-        for v in self.services:
-            if v not in indices:
-                strongconnect(v)
+        # strongconnect recurses once per service on a chain.
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 2 * len(self.services) + 100))
+        try:
+            for v in self.services:
+                if v not in indices:
+                    strongconnect(v)
+        finally:
+            sys.setrecursionlimit(limit)
         return sccs
 
     def topological_sort_with_loops(self):
+        # Cached until the topology methods change the graph.
+        if self.service_order is None:
+            self.service_order = self.sort_services()
+        return self.service_order
+
+    def sort_services(self):
         sccs = self.tarjan_scc()
         scc_graph = defaultdict(list)
         scc_map = {}
@@ -382,7 +790,8 @@ class Pipeline:
         return result
 
     def propagate_flow(self, sorted_services):
-        print("\nPropagating flow through the pipeline:")
+        if self.verbose:
+            print("\nPropagating flow through the pipeline:")
         processed = set()
         iteration = 0
         max_iterations = len(self.services) * 2
@@ -405,7 +814,8 @@ class Pipeline:
                     # Remove downstream services from processed set to reprocess them
                     processed.difference_update(set(self.graph.get(service_name, [])))
 
-            print(f"Iteration {iteration} completed")
+            if self.verbose:
+                print(f"Iteration {iteration} completed")
 
         self.determine_service_actions()
 
@@ -436,49 +846,77 @@ class Pipeline:
             actual_reduction_percentage = (
                 (original_flow - new_flow) / original_flow if original_flow > 0 else 0
             )
-            print(
-                f"  Applying {actual_reduction_percentage:.2%} backpressure to {service_name} for {schema}"
-            )
+            if self.verbose:
+                print(
+                    f"  Applying {actual_reduction_percentage:.2%} backpressure to {service_name} for {schema}"
+                )
             service.incoming_flow[schema] = new_flow
-            print(
-                f"    Reduced {service_name} {schema} input from {original_flow:.2f} to {new_flow:.2f}"
-            )
-            upstream_services = [
-                s for s, deps in self.graph.items() if service_name in deps
-            ]
+            if self.verbose:
+                print(
+                    f"    Reduced {service_name} {schema} input from {original_flow:.2f} to {new_flow:.2f}"
+                )
+            upstream_services = self.upstreams(service_name)
             for upstream in upstream_services:
                 self.apply_backpressure(
                     upstream, schema, actual_reduction_percentage, visited.copy()
                 )
 
-    def resolve_overloads_by_backprop(self):
+    def resolve_overloads_by_backprop(self, time_budget=None, work_budget=None):
+        # With a budget (seconds, or a number of backpressure waves) the most
+        # severe overloads go first, by percentage and then schema priority,
+        # and resolution stops once the budget is spent. Returns False if it
+        # was cut short.
         iteration = 0
         max_iterations = len(self.services) * 2
         changes_made = True
+        self.resolution_converged = False
+        budgeted = time_budget is not None or work_budget is not None
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        work = 0
 
         while changes_made and iteration < max_iterations:
             changes_made = False
             iteration += 1
-            print(f"\nIteration {iteration}")
+            self.resolution_iterations = iteration
+            if self.verbose:
+                print(f"\nIteration {iteration}")
             overloaded = self.calculate_overloads()
             if not overloaded:
-                print("No overloads detected. Ending resolution.")
+                if self.verbose:
+                    print("No overloads detected. Ending resolution.")
+                self.resolution_converged = True
                 break
 
             # Reset backpressure state for all services
             for service in self.services.values():
                 service.reset_backpressure_state()
 
-            for service_name, schema_overloads in overloaded.items():
-                for schema, overload_percentage in schema_overloads.items():
-                    self.propagate_backpressure(
-                        service_name, schema, overload_percentage
-                    )
-                    changes_made = True
+            waves = [
+                (service_name, schema, overload_percentage)
+                for service_name, schema_overloads in overloaded.items()
+                for schema, overload_percentage in schema_overloads.items()
+            ]
+            if budgeted:
+                waves.sort(key=lambda wave: (wave[2], wave[1].priority), reverse=True)
+            for service_name, schema, overload_percentage in waves:
+                if budgeted and (
+                    (work_budget is not None and work >= work_budget)
+                    or (deadline is not None and time.perf_counter() >= deadline)
+                ):
+                    if self.verbose:
+                        print(f"Budget spent after {work} waves. Keeping best-so-far plan.")
+                    self.resolution_waves = work
+                    return False
+                self.propagate_backpressure(service_name, schema, overload_percentage)
+                work += 1
+                changes_made = True
 
             # Print the current state after each iteration
-            print("\nCurrent state after iteration:")
-            print_service_table_only_ips(self.services)
+            if self.verbose:
+                print("\nCurrent state after iteration:")
+                print_service_table_only_ips(self.services)
+        self.resolution_waves = work
+        return True
 
     def propagate_backpressure(self, service_name, schema, reduction_percentage):
         service = self.services[service_name]
@@ -486,9 +924,7 @@ class Pipeline:
 
         if actual_reduction > 0:
             # Propagate backpressure upstream
-            upstream_services = [
-                s for s, deps in self.graph.items() if service_name in deps
-            ]
+            upstream_services = self.upstreams(service_name)
             for upstream in upstream_services:
                 self.propagate_backpressure(upstream, schema, actual_reduction)
 
@@ -504,6 +940,14 @@ class Pipeline:
                         - service.allocated_capacity[schema]
                     ) / service.incoming_flow[schema]
                     service_overloads[schema] = overload_percentage
+            limits = service.queue_limits
+            if limits:
+                for schema, limit in limits.items():
+                    incoming = service.incoming_flow[schema]
+                    if incoming > limit:
+                        overload_percentage = (incoming - limit) / incoming
+                        if overload_percentage > service_overloads.get(schema, 0):
+                            service_overloads[schema] = overload_percentage
             if service_overloads:
                 overloaded[service_name] = service_overloads
         return overloaded
@@ -521,12 +965,25 @@ class Pipeline:
                         downstream_service.incoming_flow[
                             schema
                         ] += outgoing_per_downstream
-                        print(f" Propagating from {service_name} to {downstream}")
-                        print(f" {schema}: {outgoing_per_downstream}")
+                        if self.verbose:
+                            print(f" Propagating from {service_name} to {downstream}")
+                            print(f" {schema}: {outgoing_per_downstream}")
+
+    def resolve_overloads(self, time_budget=None, work_budget=None):
+        if self.verbose:
+            print("\nResolving overloads in the pipeline:")
+        # update_statuses always runs, so a cut-short resolution still
+        # leaves consistent allocations and statuses.
+        self.resolution_complete = self.resolve_overloads_by_backprop(
+            time_budget, work_budget
+        )
+        self.update_statuses()
+        if self.verbose:
+            print("\nFinal state after resolution:")
+            print_service_table_only_ips(self.services)
+        return self.resolution_complete
 
-    def resolve_overloads(self):
-        print("\nResolving overloads in the pipeline:")
-        self.resolve_overloads_by_backprop()
+    def update_statuses(self):
         # Final pass to update service statuses
         for service_name, service in self.services.items():
             service.reallocate_capacity_across_schemas()  # One final reallocation
@@ -535,7 +992,7 @@ class Pipeline:
                 for schema in service.supported_schemas
                 if service.incoming_flow[schema] > service.allocated_capacity[schema]
             ]
-            if overloaded_schemas:
+            if overloaded_schemas or service.is_queue_limited():
                 service.status = ServiceStatus.OVERLOADED
                 service.action = ServiceAction.SLOWDOWN
             elif all(
@@ -547,24 +1004,149 @@ class Pipeline:
             else:
                 service.status = ServiceStatus.NORMAL
                 service.action = ServiceAction.NO_ACTION
-        print("\nFinal state after resolution:")
-        print_service_table_only_ips(self.services)
 
-    def run_cycle(self, service_flows):
-        print("\n---- New Cycle ----")
-        print_service_table_only_ips(self.services)
+    def run_cycle(self, service_flows, time_budget=None, work_budget=None):
+        if self.verbose:
+            print("\n---- New Cycle ----")
+            print_service_table_only_ips(self.services)
         for service_name, flows in service_flows.items():
             service = self.services[service_name]
             for schema_name, (in_flow, out_flow) in flows.items():
                 schema = self.schemas[schema_name]
                 service.incoming_flow[schema] = in_flow
                 service.outgoing_flow[schema] = out_flow
-        self.print_overload_dependencies_dfs_way()
-        self.resolve_overloads()
+        queue_limited = self.apply_queue_reports()
+        warm = self.warm_start and not queue_limited and self.seed_from_anchor(service_flows)
+        if self.verbose:
+            self.print_overload_dependencies_dfs_way()
+        complete = self.resolve_overloads(time_budget, work_budget)
         self.assess_service_status()
+        if self.warm_start:
+            # A queue-limited solution depends on more than the flows, so it
+            # is neither seeded nor kept as an anchor.
+            if queue_limited:
+                self.warm_anchor = None
+            else:
+                self.update_anchor(service_flows, warm)
 
-        print("\n---- Crystallized ----")
-        print_service_table_only_ips(self.services)
+        if self.verbose:
+            print("\n---- Crystallized ----")
+            print_service_table_only_ips(self.services)
+        return complete
+
+    def report_queue(self, service_name, schema_name, depth, latency):
+        """Queue depth (requests) and latency (seconds) seen since the last cycle."""
+        self.queue_reports[(service_name, schema_name)] = (depth, latency)
+
+    def set_latency_slo(self, schema_name, seconds):
+        self.latency_slos[schema_name] = seconds
+
+    def apply_queue_reports(self):
+        # By Little's law depth = throughput x latency, so depth / latency is
+        # the rate a queue is actually served at. When the queue grew since
+        # the last report, or its latency is past the schema's SLO, that rate
+        # is the service's real capacity whatever its allocation says. The
+        # admissible incoming rate is then the lowest of
+        #   incoming - growth per second        (stop the queue growing)
+        #   throughput - excess / drain time    (back under the SLO, the
+        #                                        excess being depth beyond
+        #                                        throughput x SLO)
+        # and calculate_overloads treats incoming above it as overload.
+        for name in self.queue_limited:
+            self.services[name].queue_limits = None
+        self.queue_limited = []
+        reports, self.queue_reports = self.queue_reports, {}
+        interval = self.queue_interval
+        for (service_name, schema_name), (depth, latency) in reports.items():
+            service = self.services[service_name]
+            schema = self.schemas[schema_name]
+            if service.queue_depths is None:
+                service.queue_depths = {}
+            previous = service.queue_depths.get(schema)
+            service.queue_depths[schema] = depth
+
+            incoming = service.incoming_flow[schema]
+            growth = max(0, depth - previous) / interval if previous is not None else 0
+            slo = self.latency_slos.get(schema_name)
+            breached = slo is not None and latency > slo
+            limit = incoming - growth
+            if depth > 0 and latency > 0 and (growth > 0 or breached):
+                throughput = depth / latency
+                drain = 0
+                if breached:
+                    drain = max(0, depth - throughput * slo) / self.queue_drain_seconds
+                limit = min(limit, throughput - drain)
+            if limit < incoming:
+                if not service.queue_limits:
+                    service.queue_limits = {}
+                    self.queue_limited.append(service_name)
+                service.queue_limits[schema] = max(0, limit)
+        return bool(self.queue_limited)
+
+    def seed_from_anchor(self, service_flows):
+        if self.warm_anchor is None:
+            return False
+        anchor, _ = self.warm_anchor
+        tolerance = self.warm_tolerance
+        seeds = []
+        for service_name, flows in service_flows.items():
+            service_anchor = anchor.get(service_name)
+            if service_anchor is None:
+                return False
+            for schema_name, (in_flow, _) in flows.items():
+                raw, admitted, schema = service_anchor.get(schema_name, (None, 0, None))
+                # Backpressure only ever lowers inputs, so a seed below what a
+                # cold solve would admit is never raised again. A throttled
+                # input that moved at all, or any input that fell, could land
+                # there (how much a cold solve admits is not proportional to
+                # the input), so those solve cold. What is left is unchanged
+                # inputs, seeded with what they were admitted, and unthrottled
+                # ones up to warm_tolerance higher, seeded with the new input;
+                # neither above the raw input.
+                if raw is None or in_flow < raw or in_flow - raw > tolerance * raw:
+                    return False
+                if in_flow != raw:
+                    if admitted < raw:
+                        return False
+                    admitted = in_flow
+                seeds.append((service_name, schema, min(in_flow, admitted)))
+        services = self.services
+        for service_name, schema, in_flow in seeds:
+            services[service_name].incoming_flow[schema] = in_flow
+        if self.verbose:
+            print("Warm start from the previous solution.")
+        return True
+
+    def update_anchor(self, service_flows, warm):
+        if not (self.resolution_complete and self.resolution_converged):
+            self.warm_anchor = None
+        elif warm:
+            self.warm_cycles += 1
+            self.iterations_saved += max(
+                0, self.warm_anchor[1] - self.resolution_iterations
+            )
+            if self.resolution_iterations > 1:
+                # The seed needed adjusting; keep the adjusted inputs, scaled
+                # back to the raw inputs of the cold solve.
+                for service_name, flows in service_flows.items():
+                    incoming = self.services[service_name].incoming_flow
+                    service_anchor = self.warm_anchor[0][service_name]
+                    for schema_name, (in_flow, _) in flows.items():
+                        raw, _, schema = service_anchor[schema_name]
+                        admitted = incoming[schema]
+                        if in_flow != raw:
+                            admitted *= raw / in_flow
+                        service_anchor[schema_name] = (raw, admitted, schema)
+        else:
+            self.cold_cycles += 1
+            anchor = {}
+            for service_name, flows in service_flows.items():
+                incoming = self.services[service_name].incoming_flow
+                service_anchor = anchor.setdefault(service_name, {})
+                for schema_name, (in_flow, _) in flows.items():
+                    schema = self.schemas[schema_name]
+                    service_anchor[schema_name] = (in_flow, incoming[schema], schema)
+            self.warm_anchor = (anchor, self.resolution_iterations)
 
     def assess_service_status(self):
         for service in self.services.values():
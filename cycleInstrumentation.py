@@ -0,0 +1,106 @@
+import os
+import urllib.request
+
+import pytest
+
+from instrument import Instrumentation, render_prometheus, serve
+from loader import load, read_definition
+from tracelog import TraceRecorder, replay_trace
+
+SCENARIO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scenarios", "hothSingle.jsonl"
+)
+
+
+def run(pipeline, cycles):
+    service_flows = read_definition(SCENARIO)[0]
+    for _ in range(cycles):
+        pipeline.run_cycle(service_flows)
+
+
+def test_phases_are_counted_per_cycle():
+    pipeline = load(SCENARIO, verbose=False)
+    instrumentation = Instrumentation(pipeline)
+    run(pipeline, 5)
+    snapshot = instrumentation.snapshot()
+    phases = snapshot["phases"]
+
+    assert phases["run_cycle"]["count"] == 5
+    assert phases["resolve_overloads"]["count"] == 5
+    assert phases["assess_service_status"]["count"] == 5
+    # Quiet pipelines skip the dependency printout entirely.
+    assert phases["print_overload_dependencies_dfs_way"]["count"] == 0
+    assert phases["calculate_overloads"]["count"] == snapshot["backprop_iterations"]["sum"]
+    assert phases["reallocate_capacity_across_schemas"]["count"] > 0
+    # Hoth is overloaded, so every cycle sends at least one wave upstream.
+    assert phases["propagate_backpressure"]["count"] >= 5
+    assert snapshot["wave_depth"]["count"] == phases["propagate_backpressure"]["count"]
+    assert snapshot["wave_services"]["buckets"][-1] == (
+        "+Inf",
+        phases["propagate_backpressure"]["count"],
+    )
+    assert phases["run_cycle"]["sum"] >= phases["resolve_overloads"]["sum"]
+
+
+def test_close_restores_the_plain_methods():
+    pipeline = load(SCENARIO, verbose=False)
+    instrumentation = Instrumentation(pipeline)
+    instrumentation.close()
+    assert "run_cycle" not in vars(pipeline)
+    assert all(
+        "reallocate_capacity_across_schemas" not in vars(service)
+        for service in pipeline.services.values()
+    )
+    run(pipeline, 1)
+    assert instrumentation.snapshot()["phases"]["run_cycle"]["count"] == 0
+
+
+@pytest.mark.parametrize("recorder_first", [True, False])
+def test_nests_with_a_trace_recorder(tmp_path, recorder_first):
+    alone = load(SCENARIO, verbose=False)
+    reference = Instrumentation(alone)
+    run(alone, 5)
+
+    path = tmp_path / "cycles.trace"
+    pipeline = load(SCENARIO, verbose=False)
+    if recorder_first:
+        recorder = TraceRecorder.open(path, pipeline)
+        instrumentation = Instrumentation(pipeline)
+    else:
+        instrumentation = Instrumentation(pipeline)
+        recorder = TraceRecorder.open(path, pipeline)
+    run(pipeline, 5)
+    snapshot = instrumentation.snapshot()
+    expected = reference.snapshot()
+    # Waves recurse upstream, so the depth shows whether recursion was seen.
+    assert expected["wave_depth"]["sum"] > expected["wave_depth"]["count"]
+    for key in ("backprop_iterations", "wave_services", "wave_depth"):
+        assert snapshot[key]["buckets"] == expected[key]["buckets"]
+
+    if recorder_first:
+        instrumentation.close()
+        recorder.close()
+    else:
+        recorder.close()
+        instrumentation.close()
+    assert "propagate_backpressure" not in vars(pipeline)
+    assert replay_trace(path) == (5, [])
+
+
+def test_prometheus_exporter():
+    pipeline = load(SCENARIO, verbose=False)
+    instrumentation = Instrumentation(pipeline)
+    run(pipeline, 3)
+    text = render_prometheus(instrumentation)
+    assert 'mst_phase_seconds_count{phase="run_cycle"} 3' in text
+    assert 'mst_phase_seconds_bucket{phase="run_cycle",le="+Inf"} 3' in text
+    assert "mst_backprop_iterations_count 3" in text
+
+    server = serve(instrumentation, port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert response.read().decode() == text
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,121 @@
+import os
+
+from crystal import AllocationCache
+from loader import load, read_definition
+from replay import scaled_ticks
+from tracelog import TraceRecorder, read_records, replay_trace
+
+SCENARIO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scenarios", "hothSingle.jsonl"
+)
+
+
+def record(path, cycles, **kwargs):
+    service_flows = read_definition(SCENARIO)[0]
+    profile = [0.6 + 0.8 * ((tick * 37) % 100) / 100 for tick in range(cycles)]
+    pipeline = load(SCENARIO, verbose=False)
+    recorder = TraceRecorder.open(path, pipeline, **kwargs)
+    for _, flows in scaled_ticks(service_flows, profile):
+        pipeline.run_cycle(flows)
+    return pipeline, recorder
+
+
+def test_replay_reproduces_every_cycle(tmp_path):
+    path = tmp_path / "cycles.trace"
+    pipeline, recorder = record(path, 40, keyframe_interval=16)
+    recorder.close()
+    assert "run_cycle" not in vars(pipeline)
+
+    replayed, mismatches = replay_trace(path)
+    assert replayed == 40
+    assert mismatches == []
+
+
+def test_replay_a_cycle_range_from_the_nearest_keyframe(tmp_path):
+    path = tmp_path / "cycles.trace"
+    record(path, 40, keyframe_interval=8)[1].close()
+    replayed, mismatches = replay_trace(path, 19, 30)
+    assert replayed == 11
+    assert mismatches == []
+
+
+def test_outside_changes_need_a_sync(tmp_path):
+    path = tmp_path / "cycles.trace"
+    pipeline, recorder = record(path, 4)
+    hoth = pipeline.services["Hoth"]
+    schema = hoth.supported_schemas[0]
+    hoth.current_capacity[schema] = 10
+    for _, flows in scaled_ticks(read_definition(SCENARIO)[0], [1.0] * 4):
+        pipeline.run_cycle(flows)
+    recorder.close()
+    _, mismatches = replay_trace(path)
+    assert mismatches
+
+    os.remove(path)
+    pipeline, recorder = record(path, 4)
+    hoth = pipeline.services["Hoth"]
+    hoth.current_capacity[hoth.supported_schemas[0]] = 10
+    recorder.sync()
+    for _, flows in scaled_ticks(read_definition(SCENARIO)[0], [1.0] * 4):
+        pipeline.run_cycle(flows)
+    recorder.close()
+    assert replay_trace(path) == (8, [])
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    path = tmp_path / "cycles.trace"
+    record(path, 10)[1].close()
+    records = len(list(read_records(path)))
+    with open(path, "ab") as f:
+        f.write(b"\x04\x00\x00")
+    assert len(list(read_records(path))) == records
+    assert replay_trace(path) == (10, [])
+
+
+def test_budgeted_cycles_replay_with_the_same_result(tmp_path):
+    path = tmp_path / "cycles.trace"
+    pipeline = load(SCENARIO, verbose=False)
+    recorder = TraceRecorder.open(path, pipeline, keyframe_interval=4)
+    complete = []
+    profile = [1.0, 1.3, 0.8, 1.2] * 3
+    budgets = [{}, {"work_budget": 3}, {"time_budget": 0.0}]
+    for tick, (_, flows) in enumerate(scaled_ticks(read_definition(SCENARIO)[0], profile)):
+        complete.append(pipeline.run_cycle(flows, **budgets[tick % 3]))
+    recorder.close()
+    assert False in complete
+    assert replay_trace(path) == (12, [])
+    assert replay_trace(path, 5, 10) == (5, [])
+
+
+def test_replay_follows_warm_start_queue_reports_and_cache(tmp_path):
+    path = tmp_path / "cycles.trace"
+    pipeline = load(SCENARIO, verbose=False)
+    pipeline.warm_start = True
+    pipeline.set_allocation_cache(AllocationCache(quantum=5))
+    pipeline.set_latency_slo("S1", 0.5)
+    recorder = TraceRecorder.open(path, pipeline, keyframe_interval=8)
+    profile = [1.0 if tick % 4 else 0.9 for tick in range(40)]
+    for tick, (_, flows) in enumerate(scaled_ticks(read_definition(SCENARIO)[0], profile)):
+        if tick % 5 == 0:
+            pipeline.report_queue("Hoth", "S1", 100 + tick, 1.0)
+        pipeline.run_cycle(flows)
+    recorder.close()
+    assert pipeline.warm_cycles
+    assert replay_trace(path) == (40, [])
+    assert replay_trace(path, 19, 30) == (11, [])
+
+
+def test_flows_updated_in_place_are_recorded_per_cycle(tmp_path):
+    path = tmp_path / "cycles.trace"
+    pipeline = load(SCENARIO, verbose=False)
+    recorder = TraceRecorder.open(path, pipeline)
+    flows = {
+        name: dict(schema_flows) for name, schema_flows in read_definition(SCENARIO)[0].items()
+    }
+    for _ in range(5):
+        pipeline.run_cycle(flows)
+        for schema_flows in flows.values():
+            for schema_name, (in_flow, out_flow) in schema_flows.items():
+                schema_flows[schema_name] = (in_flow * 1.5, out_flow * 1.5)
+    recorder.close()
+    assert replay_trace(path) == (5, [])
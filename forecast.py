@@ -0,0 +1,163 @@
+from array import array
+
+from replay import carry_forward, current_flows
+from topology import compile_topology
+
+# Short-horizon demand forecasts for pre-emptive throttling. run_cycle only
+# sees the current in_tps, so on a ramp every cycle plans for demand that has
+# already been overtaken: until the next cycle the traffic arrives above the
+# allocations. A Forecaster keeps, per (service, schema) slot, Holt's linear
+# trend over the in_tps it observes:
+#
+#   level    alpha * observed + (1 - alpha) * (level + trend)
+#   trend    beta * (level - previous level) + (1 - beta) * trend
+#   next     level + trend, never below zero
+#
+# (beta = 0 leaves the trend at zero: a plain EWMA.) Its run_cycle hands the
+# pipeline max(current, next) for every pair, scaling out_tps with in_tps, so
+# allocations and backpressure are sized for the next tick. Like replay, it
+# carries raw demand forward: a pair a tick leaves out is observed and
+# planned at its last demand, not at what the pipeline admitted.
+#
+# State is flat arrays indexed by topology slot. The last `history` signed
+# errors (forecast - observed) and observations per slot sit in two ring
+# buffers of slot_count * history doubles, which is what errors() reports.
+# observe() on its own only updates the slots it is given.
+#
+# When the pipeline's topology changes (add_service, set_capacity on a new
+# schema, ...) the slots are recompiled on next use. Pairs that survive keep
+# their forecast state and carried demand; new pairs start from the flows
+# the pipeline has for them, and removed ones are dropped.
+
+
+class Forecaster:
+    def __init__(self, pipeline, alpha=0.5, beta=0.3, history=32):
+        self.pipeline = pipeline
+        self.alpha = alpha
+        self.beta = beta
+        self.history = history
+        self.slots = {}
+        self.demand = {}
+        self.version = None
+        self.refresh()
+
+    def refresh(self):
+        """Recompile the slots if the pipeline's topology changed since."""
+        pipeline = self.pipeline
+        if self.version == pipeline.topology_version:
+            return
+        self.version = pipeline.topology_version
+        history = self.history
+        topology = compile_topology(pipeline)
+        count = topology.slot_count
+        level = array("d", bytes(8 * count))
+        trend = array("d", bytes(8 * count))
+        forecast = array("d", bytes(8 * count))
+        observed = array("q", bytes(8 * count))
+        error_ring = array("d", bytes(8 * count * history))
+        value_ring = array("d", bytes(8 * count * history))
+        for pair, slot in topology.slots.items():
+            old = self.slots.get(pair)
+            if old is not None:
+                level[slot] = self.level[old]
+                trend[slot] = self.trend[old]
+                forecast[slot] = self.next[old]
+                observed[slot] = self.observed[old]
+                window = slice(slot * history, (slot + 1) * history)
+                old_window = slice(old * history, (old + 1) * history)
+                error_ring[window] = self.error_ring[old_window]
+                value_ring[window] = self.value_ring[old_window]
+        self.slots = topology.slots
+        self.level, self.trend, self.next, self.observed = level, trend, forecast, observed
+        self.error_ring, self.value_ring = error_ring, value_ring
+
+        demand = current_flows(pipeline)
+        for service_name, flows in demand.items():
+            carried = self.demand.get(service_name, {})
+            for schema_name in flows.keys() & carried.keys():
+                flows[schema_name] = carried[schema_name]
+        self.demand = demand
+
+    def observe(self, service_flows):
+        self.refresh()
+        alpha, beta, history = self.alpha, self.beta, self.history
+        level, trend, forecast, observed = self.level, self.trend, self.next, self.observed
+        for service_name, flows in service_flows.items():
+            for schema_name, (in_flow, _) in flows.items():
+                slot = self.slots[service_name, schema_name]
+                n = observed[slot]
+                if n:
+                    at = slot * history + (n - 1) % history
+                    self.error_ring[at] = forecast[slot] - in_flow
+                    self.value_ring[at] = in_flow
+                    previous = level[slot]
+                    level[slot] = alpha * in_flow + (1 - alpha) * (previous + trend[slot])
+                    trend[slot] = beta * (level[slot] - previous) + (1 - beta) * trend[slot]
+                else:
+                    level[slot] = in_flow
+                forecast[slot] = max(0.0, level[slot] + trend[slot])
+                observed[slot] = n + 1
+
+    def forecast(self, service_name, schema_name):
+        """Predicted in_tps for the next tick (0 before any observation)."""
+        self.refresh()
+        return self.next[self.slots[service_name, schema_name]]
+
+    def planned(self, service_flows):
+        """service_flows with each in_tps raised to its forecast."""
+        self.refresh()
+        planned = {}
+        for service_name, flows in service_flows.items():
+            planned_flows = planned[service_name] = {}
+            for schema_name, (in_flow, out_flow) in flows.items():
+                expected = self.next[self.slots[service_name, schema_name]]
+                if expected > in_flow:
+                    if in_flow > 0:
+                        out_flow *= expected / in_flow
+                    in_flow = expected
+                planned_flows[schema_name] = (in_flow, out_flow)
+        return planned
+
+    def run_cycle(self, service_flows, time_budget=None, work_budget=None):
+        self.refresh()
+        service_flows = carry_forward(self.demand, service_flows)
+        self.observe(service_flows)
+        return self.pipeline.run_cycle(
+            self.planned(service_flows), time_budget, work_budget
+        )
+
+    def errors(self):
+        """Per (service, schema) and overall error over the last `history` ticks.
+
+        mae is the mean absolute error, bias the mean signed error (positive:
+        forecasts ran high), wape the absolute error over observed demand.
+        """
+        self.refresh()
+        history = self.history
+        report = {}
+        total_abs = total_signed = total_values = 0.0
+        total_count = 0
+        for (service_name, schema_name), slot in self.slots.items():
+            count = min(self.observed[slot] - 1, history)
+            if count <= 0:
+                continue
+            start = slot * history
+            window = self.error_ring[start : start + count]
+            absolute = sum(map(abs, window))
+            signed = sum(window)
+            values = sum(self.value_ring[start : start + count])
+            report.setdefault(service_name, {})[schema_name] = {
+                "mae": absolute / count,
+                "bias": signed / count,
+                "wape": absolute / values if values else 0.0,
+            }
+            total_abs += absolute
+            total_signed += signed
+            total_values += values
+            total_count += count
+        overall = {
+            "mae": total_abs / total_count if total_count else 0.0,
+            "bias": total_signed / total_count if total_count else 0.0,
+            "wape": total_abs / total_values if total_values else 0.0,
+        }
+        return {"slots": report, "overall": overall}
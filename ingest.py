@@ -0,0 +1,163 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+from array import array
+
+# Ring file layout (little endian):
+#
+#   header   magic, layout version, record size, capacity, appended count
+#   records  capacity fixed-size records
+#
+# A record is (stamp, service_id, schema_id, in_tps, out_tps, timestamp,
+# stamp). Writers put the stamp (append position + 1) at both ends, writing
+# the trailing one last, so a reader that sees two equal stamps matching the
+# position it expects knows the record is complete and was not overwritten.
+MAGIC = b"MSTR"
+LAYOUT_VERSION = 1
+HEADER = struct.Struct("<4sHHIQ")
+COUNT_OFFSET = 12
+HEADER_SIZE = 24
+RECORD = struct.Struct("<QIIddd")
+STAMP = struct.Struct("<Q")
+RECORD_SIZE = RECORD.size + STAMP.size
+
+
+def create_ring(path, capacity):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, LAYOUT_VERSION, RECORD_SIZE, capacity, 0))
+        f.truncate(HEADER_SIZE + capacity * RECORD_SIZE)
+
+
+class _MappedRing:
+    def __init__(self, path, writable):
+        self.file = open(path, "r+b" if writable else "rb")
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self.map = mmap.mmap(self.file.fileno(), 0, access=access)
+        magic, version, record_size, capacity, _ = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != LAYOUT_VERSION or record_size != RECORD_SIZE:
+            self.close()
+            raise ValueError(f"{path} is not a metrics ring file")
+        self.capacity = capacity
+
+    def appended(self):
+        return STAMP.unpack_from(self.map, COUNT_OFFSET)[0]
+
+    def offset(self, position):
+        return HEADER_SIZE + (position % self.capacity) * RECORD_SIZE
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class RingWriter(_MappedRing):
+    """Appends TPS samples; safe to share a file between local agents."""
+
+    def __init__(self, path):
+        super().__init__(path, writable=True)
+
+    def append(self, service_id, schema_id, in_tps, out_tps, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        try:
+            position = self.appended()
+            stamp = position + 1
+            offset = self.offset(position)
+            # Invalidate the trailing stamp first so a reader never pairs the
+            # new leading stamp with a stale trailer from the previous lap.
+            STAMP.pack_into(self.map, offset + RECORD.size, 0)
+            RECORD.pack_into(
+                self.map, offset, stamp, service_id, schema_id, in_tps, out_tps, timestamp
+            )
+            STAMP.pack_into(self.map, offset + RECORD.size, stamp)
+            STAMP.pack_into(self.map, COUNT_OFFSET, stamp)
+        finally:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+
+
+def open_ring(path, capacity):
+    if not os.path.exists(path):
+        create_ring(path, capacity)
+    return RingWriter(path)
+
+
+class RingReader(_MappedRing):
+    """Controller side: drains new records and keeps the latest flow matrices."""
+
+    def __init__(self, path, services, schemas):
+        super().__init__(path, writable=False)
+        self.services = services
+        self.schemas = schemas
+        # Pick up whatever is still in the ring, e.g. after a controller restart.
+        self.cursor = max(0, self.appended() - self.capacity)
+        self.in_tps = array("d", bytes(8 * services * schemas))
+        self.out_tps = array("d", bytes(8 * services * schemas))
+        # Timestamp of each slot's latest sample; None until one arrives
+        # (0.0 is a valid timestamp).
+        self.updated = [None] * (services * schemas)
+        self.overrun = 0
+        self.torn = 0
+
+    def drain(self):
+        """Apply every complete record appended since the last drain.
+
+        Returns the number of records applied. Records lost because writers
+        lapped the reader are counted in `overrun`, records caught mid-write
+        (or overwritten while being read) in `torn`.
+        """
+        end = self.appended()
+        start = self.cursor
+        if end - start > self.capacity:
+            self.overrun += end - start - self.capacity
+            start = end - self.capacity
+
+        applied = 0
+        view = memoryview(self.map)
+        for position in range(start, end):
+            offset = self.offset(position)
+            stamp, service_id, schema_id, in_tps, out_tps, timestamp = RECORD.unpack_from(
+                view, offset
+            )
+            trailer = STAMP.unpack_from(view, offset + RECORD.size)[0]
+            if stamp != position + 1 or trailer != stamp:
+                self.torn += 1
+                continue
+            if service_id >= self.services or schema_id >= self.schemas:
+                self.torn += 1
+                continue
+            slot = service_id * self.schemas + schema_id
+            updated = self.updated[slot]
+            if updated is None or timestamp >= updated:
+                self.in_tps[slot] = in_tps
+                self.out_tps[slot] = out_tps
+                self.updated[slot] = timestamp
+            applied += 1
+        view.release()
+        self.cursor = end
+        return applied
+
+
+def service_ids(pipeline):
+    return {name: i for i, name in enumerate(pipeline.services)}
+
+
+def schema_ids(pipeline):
+    return {name: i for i, name in enumerate(pipeline.schemas)}
+
+
+def build_service_flows(reader, pipeline):
+    """Turn the reader's matrices into the `service_flows` run_cycle expects."""
+    schema_index = schema_ids(pipeline)
+    service_flows = {}
+    for i, (service_name, service) in enumerate(pipeline.services.items()):
+        flows = {}
+        for schema in service.supported_schemas:
+            slot = i * reader.schemas + schema_index[schema.name]
+            if reader.updated[slot] is not None:
+                flows[schema.name] = (reader.in_tps[slot], reader.out_tps[slot])
+        if flows:
+            service_flows[service_name] = flows
+    return service_flows
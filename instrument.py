@@ -0,0 +1,236 @@
+import bisect
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tracelog import installed
+
+# Per-phase timing for Pipeline.run_cycle. Instrumentation wraps the phase
+# methods on one pipeline instance (and its services), so an uninstrumented
+# pipeline runs the plain class methods and pays nothing; close() puts back
+# whatever was there before, so it nests with tracelog.TraceRecorder.
+PHASES = [
+    "run_cycle",
+    "print_overload_dependencies_dfs_way",
+    "resolve_overloads",
+    "calculate_overloads",
+    "assess_service_status",
+]
+SERVICE_PHASES = ["reallocate_capacity_across_schemas"]
+SECONDS_BUCKETS = [
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+]
+COUNT_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        buckets = []
+        total = 0
+        for bound, count in zip(self.bounds + ["+Inf"], self.counts):
+            total += count
+            buckets.append((bound, total))
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class Instrumentation:
+    """Phase histograms for one pipeline, recorded until close()."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.phases = {
+            phase: Histogram(SECONDS_BUCKETS)
+            for phase in PHASES + SERVICE_PHASES + ["propagate_backpressure"]
+        }
+        self.iterations = Histogram(COUNT_BUCKETS)
+        self.wave_services = Histogram(COUNT_BUCKETS)
+        self.wave_depth = Histogram(COUNT_BUCKETS)
+        self.cycle_iterations = 0
+        self.depth = 0
+        self.max_depth = 0
+        self.touched = set()
+
+        self.replaced = []
+        for phase in PHASES:
+            self.wrap(pipeline, phase, self.timed(phase, getattr(pipeline, phase)))
+        for service in pipeline.services.values():
+            for phase in SERVICE_PHASES:
+                self.wrap(service, phase, self.timed(phase, getattr(service, phase)))
+        self.wrap(pipeline, "calculate_overloads", self.counted(pipeline.calculate_overloads))
+        self.wrap(pipeline, "propagate_backpressure", self.wave(pipeline.propagate_backpressure))
+        self.wrap(pipeline, "run_cycle", self.cycle(pipeline.run_cycle))
+
+    def reset(self):
+        for histogram in [
+            *self.phases.values(),
+            self.iterations,
+            self.wave_services,
+            self.wave_depth,
+        ]:
+            histogram.reset()
+
+    def wrap(self, target, name, wrapper):
+        self.replaced.append((target, name, installed(target, name)))
+        setattr(target, name, wrapper)
+
+    def timed(self, phase, method):
+        histogram = self.phases[phase]
+        clock = time.perf_counter
+
+        def timed_phase(*args, **kwargs):
+            started = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.observe(clock() - started)
+
+        return timed_phase
+
+    def counted(self, calculate_overloads):
+        # One calculate_overloads call per resolve_overloads_by_backprop
+        # iteration; run_cycle's wrapper turns the tally into a histogram.
+        def counted_calculate_overloads():
+            self.cycle_iterations += 1
+            return calculate_overloads()
+
+        return counted_calculate_overloads
+
+    def wave(self, propagate_backpressure):
+        # A wave is one top-level propagate_backpressure call together with
+        # the upstream recursion it starts.
+        histogram = self.phases["propagate_backpressure"]
+        clock = time.perf_counter
+
+        def propagate_wave(service_name, schema, reduction_percentage):
+            self.depth += 1
+            self.touched.add(service_name)
+            if self.depth > self.max_depth:
+                self.max_depth = self.depth
+            if self.depth > 1:
+                try:
+                    return propagate_backpressure(service_name, schema, reduction_percentage)
+                finally:
+                    self.depth -= 1
+            started = clock()
+            try:
+                return propagate_backpressure(service_name, schema, reduction_percentage)
+            finally:
+                histogram.observe(clock() - started)
+                self.wave_services.observe(len(self.touched))
+                self.wave_depth.observe(self.max_depth)
+                self.depth = 0
+                self.touched = set()
+                self.max_depth = 0
+
+        return propagate_wave
+
+    def cycle(self, run_cycle):
+        def counted_run_cycle(service_flows, time_budget=None, work_budget=None):
+            self.cycle_iterations = 0
+            try:
+                return run_cycle(service_flows, time_budget, work_budget)
+            finally:
+                self.iterations.observe(self.cycle_iterations)
+
+        return counted_run_cycle
+
+    def snapshot(self):
+        """Everything recorded so far, as plain dicts (the pull API)."""
+        return {
+            "phases": {phase: h.snapshot() for phase, h in self.phases.items()},
+            "backprop_iterations": self.iterations.snapshot(),
+            "wave_services": self.wave_services.snapshot(),
+            "wave_depth": self.wave_depth.snapshot(),
+        }
+
+    def close(self):
+        for target, name, previous in reversed(self.replaced):
+            if previous is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, previous)
+        self.replaced = []
+
+
+def format_labels(labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_histogram(lines, name, snapshot, labels):
+    for bound, count in snapshot["buckets"]:
+        lines.append(
+            f"{name}_bucket{{{format_labels({**labels, 'le': bound})}}} {count}"
+        )
+    label_text = f"{{{format_labels(labels)}}}" if labels else ""
+    lines.append(f"{name}_sum{label_text} {snapshot['sum']}")
+    lines.append(f"{name}_count{label_text} {snapshot['count']}")
+
+
+def render_prometheus(instrumentation, prefix="mst"):
+    """Prometheus text exposition of an Instrumentation snapshot."""
+    snapshot = instrumentation.snapshot()
+    lines = [
+        f"# HELP {prefix}_phase_seconds Wall time per call of each run_cycle phase.",
+        f"# TYPE {prefix}_phase_seconds histogram",
+    ]
+    for phase, histogram in snapshot["phases"].items():
+        render_histogram(lines, f"{prefix}_phase_seconds", histogram, {"phase": phase})
+    for key, help_text in [
+        ("backprop_iterations", "Backpressure iterations per cycle."),
+        ("wave_services", "Distinct services touched per backpressure wave."),
+        ("wave_depth", "Recursion depth reached per backpressure wave."),
+    ]:
+        lines.append(f"# HELP {prefix}_{key} {help_text}")
+        lines.append(f"# TYPE {prefix}_{key} histogram")
+        render_histogram(lines, f"{prefix}_{key}", snapshot[key], {})
+    return "\n".join(lines) + "\n"
+
+
+def serve(instrumentation, port=9464, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; shutdown() the result to stop."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus(instrumentation).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    from loader import load, read_definition
+
+    pipeline = load(sys.argv[1], verbose=False)
+    instrumentation = Instrumentation(pipeline)
+    service_flows = read_definition(sys.argv[1])[0]
+    for _ in range(int(sys.argv[2]) if len(sys.argv) > 2 else 1):
+        pipeline.run_cycle(service_flows)
+    print(render_prometheus(instrumentation), end="")
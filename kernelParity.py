@@ -0,0 +1,85 @@
+import os
+import random
+
+import pytest
+
+from crystal import Pipeline
+from kernels import KernelBackend, KernelState, array, propagate_downstream, to_list
+from loader import read_definition
+from sweep import perturb
+from testSupport import SCENARIOS, STATE, state
+
+KERNEL = STATE + ("visited", "reduction_factors")
+
+
+@pytest.mark.parametrize("path", SCENARIOS, ids=os.path.basename)
+def test_kernels_match_the_engine_cycle_after_cycle(path):
+    definition = read_definition(path)
+    rng = random.Random(path)
+    engine = Pipeline(*definition, verbose=False)
+    accelerated = Pipeline(*definition, verbose=False)
+    backend = KernelBackend(accelerated)
+    for cycle in range(8):
+        flows = perturb(definition, rng, 0.5, 0.0)[0] if cycle else definition[0]
+        engine.run_cycle(flows)
+        backend.run_cycle(flows)
+        assert state(accelerated, KERNEL) == state(engine, KERNEL)
+        assert backend.state.topology.services == list(engine.services)
+
+
+def test_downstream_kernel_matches_propagate_to_downstream():
+    definition = read_definition(SCENARIOS[0])
+    pipeline = Pipeline(*definition, verbose=False)
+    kernel_state = KernelState(pipeline)
+    topology = kernel_state.topology
+    outgoing = []
+    incoming = []
+    for name in topology.services:
+        outgoing.extend(pipeline.services[name].outgoing_flow.values())
+        incoming.extend(pipeline.services[name].incoming_flow.values())
+    incoming = array(incoming, "float64")
+    propagate_downstream(
+        array(outgoing, "float64"),
+        incoming,
+        kernel_state.edge_from,
+        kernel_state.edge_to,
+        kernel_state.edge_share,
+        0,
+        len(topology.slot_edges),
+    )
+    for name in topology.services:
+        pipeline.propagate_to_downstream(name)
+    expected = []
+    for name in topology.services:
+        expected.extend(pipeline.services[name].incoming_flow.values())
+    assert to_list(incoming) == pytest.approx(expected)
+
+
+def test_upstream_without_the_schema_fails_like_the_engine():
+    definition = (
+        {"A": {"S1": (50, 50)}, "B": {"S1": (100, 100), "S2": (100, 100)}},
+        {"A": {"S1": (10, 100)}, "B": {"S1": (10, 50), "S2": (10, 50)}},
+        {"A": ["B"], "B": []},
+        {"S1": 1, "S2": 2},
+    )
+    with pytest.raises(KeyError):
+        Pipeline(*definition, verbose=False).run_cycle(definition[0])
+    with pytest.raises(KeyError):
+        KernelBackend(Pipeline(*definition, verbose=False)).run_cycle(definition[0])
+
+
+def test_numba_backend_compiles_the_kernels():
+    pytest.importorskip("numba")
+    numpy = pytest.importorskip("numpy")
+    import kernels
+
+    assert kernels.BACKEND == "numba"
+    definition = read_definition(SCENARIOS[0])
+    engine = Pipeline(*definition, verbose=False)
+    accelerated = Pipeline(*definition, verbose=False)
+    backend = KernelBackend(accelerated)
+    assert isinstance(backend.state.offsets, numpy.ndarray)
+    engine.run_cycle(definition[0])
+    backend.run_cycle(definition[0])
+    assert state(accelerated, KERNEL) == state(engine, KERNEL)
+    assert kernels.resolve.signatures
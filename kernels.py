@@ -0,0 +1,406 @@
+from crystal import ServiceAction, ServiceStatus
+from topology import compile_topology
+
+try:
+    import numba
+    import numpy as np
+except ImportError:
+    numba = None
+
+# Inner loops of the resolver as kernels over flat, slot-indexed arrays (see
+# topology.py for the slot layout):
+#
+#   reallocate            Service.reallocate_capacity_across_schemas for the
+#                         slots low..high of one service
+#   backpressure          Pipeline.propagate_backpressure: the depth-first
+#                         upstream walk, on an explicit stack, over upstream
+#                         slots in CSR form (up_offsets, up_slots; -1 marks an
+#                         upstream service without the schema)
+#   propagate_downstream  Pipeline.propagate_to_downstream over slot edges
+#   resolve               resolve_overloads plus assess_service_status
+#
+# The kernels only index arrays and do scalar arithmetic. With numba
+# installed they are compiled with numba.njit and state lives in NumPy
+# arrays; without it they run as plain Python over lists, which keeps the
+# engine's int/float arithmetic bit for bit.
+BACKEND = "numba" if numba is not None else "python"
+
+# Codes for statuses and actions in the resolve kernel's output arrays.
+STATUSES = [ServiceStatus.NORMAL, ServiceStatus.OVERLOADED, ServiceStatus.UNDERUTILIZED]
+ACTIONS = [ServiceAction.NO_ACTION, ServiceAction.SPEEDUP, ServiceAction.SLOWDOWN]
+
+# backpressure and resolve return codes
+OK = 0
+MISSING_SCHEMA = 1
+STACK_OVERFLOW = 2
+
+
+def kernel(function):
+    if numba is None:
+        return function
+    return numba.njit(cache=True)(function)
+
+
+def array(values, dtype):
+    if numba is None:
+        return list(values)
+    return np.array(list(values), dtype=dtype)
+
+
+def to_list(values):
+    if numba is None:
+        return values
+    return values.tolist()
+
+
+def zeros(size, dtype):
+    if numba is None:
+        return [0] * size
+    return np.zeros(size, dtype=dtype)
+
+
+@kernel
+def reallocate(incoming, current, allocated, low, high, order):
+    remaining = 0
+    for i in range(low, high):
+        remaining += current[i]
+    for i in range(low, high):
+        needed = incoming[i] if incoming[i] <= current[i] else current[i]
+        allocated[i] = needed
+        remaining -= needed
+    if remaining > 0:
+        total_unfulfilled = 0
+        for i in range(low, high):
+            if incoming[i] > allocated[i]:
+                total_unfulfilled += incoming[i] - allocated[i]
+        if total_unfulfilled > 0:
+            for i in range(low, high):
+                unfulfilled = incoming[i] - allocated[i] if incoming[i] > allocated[i] else 0
+                extra = int(remaining * (unfulfilled / total_unfulfilled))
+                allocated[i] += extra
+                remaining -= extra
+
+    total_incoming = 0
+    total_allocated = 0
+    for i in range(low, high):
+        total_incoming += incoming[i]
+        total_allocated += allocated[i]
+    if total_incoming <= total_allocated:
+        return
+
+    # Stable insertion sort by incoming flow, largest first.
+    n = high - low
+    for k in range(n):
+        i = low + k
+        position = k
+        while position > 0 and incoming[order[position - 1]] < incoming[i]:
+            order[position] = order[position - 1]
+            position -= 1
+        order[position] = i
+
+    total_excess = 0
+    for i in range(low, high):
+        if allocated[i] > incoming[i]:
+            total_excess += allocated[i] - incoming[i]
+    for k in range(n):
+        i = order[k]
+        if incoming[i] > allocated[i]:
+            needed = incoming[i] - allocated[i]
+            reallocated = needed if needed <= total_excess else total_excess
+            allocated[i] += reallocated
+            total_excess -= reallocated
+    if total_excess > 0:
+        total_deficit = 0
+        for i in range(low, high):
+            if incoming[i] > allocated[i]:
+                total_deficit += incoming[i] - allocated[i]
+        for k in range(n):
+            i = order[k]
+            if incoming[i] > allocated[i]:
+                deficit = incoming[i] - allocated[i]
+                share = deficit / total_deficit if total_deficit > 0 else 0
+                additional = int(total_excess * share)
+                headroom = current[i] - allocated[i]
+                allocated[i] += additional if additional <= headroom else headroom
+
+
+@kernel
+def apply_backpressure(i, reduction_percentage, incoming, visited, reduction):
+    """Service.apply_backpressure for slot i; returns the actual reduction."""
+    if visited[i] and not reduction_percentage > reduction[i]:
+        return 0
+    visited[i] = True
+    reduction[i] = reduction_percentage
+    original_flow = incoming[i]
+    new_flow = original_flow * (1 - reduction_percentage)
+    if new_flow < 0:
+        new_flow = 0
+    incoming[i] = new_flow
+    if original_flow > 0:
+        return (original_flow - new_flow) / original_flow
+    return 0
+
+
+@kernel
+def backpressure(
+    start,
+    reduction_percentage,
+    incoming,
+    visited,
+    reduction,
+    up_offsets,
+    up_slots,
+    stack_slot,
+    stack_reduction,
+    stack_next,
+):
+    actual = apply_backpressure(start, reduction_percentage, incoming, visited, reduction)
+    if not actual > 0:
+        return OK
+    top = 0
+    stack_slot[0] = start
+    stack_reduction[0] = actual
+    stack_next[0] = up_offsets[start]
+    while top >= 0:
+        i = stack_slot[top]
+        k = stack_next[top]
+        if k == up_offsets[i + 1]:
+            top -= 1
+            continue
+        stack_next[top] = k + 1
+        upstream = up_slots[k]
+        if upstream < 0:
+            return MISSING_SCHEMA
+        actual = apply_backpressure(
+            upstream, stack_reduction[top], incoming, visited, reduction
+        )
+        if actual > 0:
+            top += 1
+            if top == len(stack_slot):
+                return STACK_OVERFLOW
+            stack_slot[top] = upstream
+            stack_reduction[top] = actual
+            stack_next[top] = up_offsets[upstream]
+    return OK
+
+
+@kernel
+def propagate_downstream(outgoing, incoming, edge_from, edge_to, edge_share, first, last):
+    for e in range(first, last):
+        incoming[edge_to[e]] += outgoing[edge_from[e]] * edge_share[e]
+
+
+@kernel
+def resolve(
+    incoming,
+    current,
+    allocated,
+    visited,
+    reduction,
+    offsets,
+    up_offsets,
+    up_slots,
+    statuses,
+    actions,
+    first_slots,
+    first_reductions,
+    overload_slots,
+    overload_reductions,
+    order,
+    stack_slot,
+    stack_reduction,
+    stack_next,
+):
+    """run_cycle after the flows are set; returns (code, iterations, first overloads)."""
+    services = len(offsets) - 1
+    slots = len(incoming)
+    iteration = 0
+    first_count = -1
+    changes_made = True
+    while changes_made and iteration < 2 * services:
+        changes_made = False
+        iteration += 1
+        count = 0
+        for k in range(services):
+            for i in range(offsets[k], offsets[k + 1]):
+                if incoming[i] > allocated[i]:
+                    reallocate(incoming, current, allocated, offsets[k], offsets[k + 1], order)
+                    overload_slots[count] = i
+                    overload_reductions[count] = (incoming[i] - allocated[i]) / incoming[i]
+                    count += 1
+        if first_count < 0:
+            first_count = count
+            for n in range(count):
+                first_slots[n] = overload_slots[n]
+                first_reductions[n] = overload_reductions[n]
+        if count == 0:
+            break
+        for i in range(slots):
+            visited[i] = False
+            reduction[i] = 0
+        for n in range(count):
+            code = backpressure(
+                overload_slots[n],
+                overload_reductions[n],
+                incoming,
+                visited,
+                reduction,
+                up_offsets,
+                up_slots,
+                stack_slot,
+                stack_reduction,
+                stack_next,
+            )
+            if code != OK:
+                return code, iteration, first_count
+            changes_made = True
+
+    for k in range(services):
+        low = offsets[k]
+        high = offsets[k + 1]
+        reallocate(incoming, current, allocated, low, high, order)
+        over = False
+        under = True
+        for i in range(low, high):
+            if incoming[i] > allocated[i]:
+                over = True
+            if not incoming[i] < 0.5 * allocated[i]:
+                under = False
+        actions[k] = 2 if over else (1 if under else 0)
+        # assess_service_status: the status is judged against current capacity.
+        over = False
+        under = True
+        for i in range(low, high):
+            if incoming[i] > current[i]:
+                over = True
+            if not incoming[i] < 0.5 * current[i]:
+                under = False
+        statuses[k] = 1 if over else (2 if under else 0)
+    return OK, iteration, first_count
+
+
+def upstream_slots(pipeline, topology):
+    """CSR upstream slots per slot, in the order propagate_backpressure visits them."""
+    upstreams = {name: [] for name in topology.services}
+    for upstream, downstream in pipeline.graph.items():
+        for name in set(downstream):
+            if name in upstreams:
+                upstreams[name].append(upstream)
+    up_offsets = [0]
+    up_slots = []
+    for k, j in zip(topology.slot_service, topology.slot_schema):
+        schema = topology.schemas[j]
+        for upstream in upstreams[topology.services[k]]:
+            up_slots.append(topology.slots.get((upstream, schema), -1))
+        up_offsets.append(len(up_slots))
+    return up_offsets, up_slots
+
+
+class KernelState:
+    """Array-backed topology plus the scratch buffers the kernels need."""
+
+    def __init__(self, pipeline):
+        self.topology = topology = compile_topology(pipeline)
+        slots = topology.slot_count
+        up_offsets, up_slots = upstream_slots(pipeline, topology)
+        self.offsets = array(topology.slot_offsets, "int64")
+        self.up_offsets = array(up_offsets, "int64")
+        self.up_slots = array(up_slots, "int64")
+        self.edge_from = array([edge[0] for edge in topology.slot_edges], "int64")
+        self.edge_to = array([edge[1] for edge in topology.slot_edges], "int64")
+        self.edge_share = array([edge[2] for edge in topology.slot_edges], "float64")
+        self.statuses = zeros(len(topology.services), "int64")
+        self.actions = zeros(len(topology.services), "int64")
+        self.first_slots = zeros(slots, "int64")
+        self.first_reductions = zeros(slots, "float64")
+        self.overload_slots = zeros(slots, "int64")
+        self.overload_reductions = zeros(slots, "float64")
+        widest = max(
+            [0] + [len(service.supported_schemas) for service in pipeline.services.values()]
+        )
+        self.order = zeros(widest, "int64")
+        self.stack_slot = zeros(slots + 1, "int64")
+        self.stack_reduction = zeros(slots + 1, "float64")
+        self.stack_next = zeros(slots + 1, "int64")
+
+    def resolve(self, incoming, current, allocated, visited, reduction):
+        code, iterations, first_count = resolve(
+            incoming,
+            current,
+            allocated,
+            visited,
+            reduction,
+            self.offsets,
+            self.up_offsets,
+            self.up_slots,
+            self.statuses,
+            self.actions,
+            self.first_slots,
+            self.first_reductions,
+            self.overload_slots,
+            self.overload_reductions,
+            self.order,
+            self.stack_slot,
+            self.stack_reduction,
+            self.stack_next,
+        )
+        if code == MISSING_SCHEMA:
+            raise KeyError("an upstream service does not support the schema being throttled")
+        if code == STACK_OVERFLOW:
+            raise RecursionError("backpressure walk deeper than the slot count")
+        first = [
+            (int(self.first_slots[n]), self.first_reductions[n]) for n in range(first_count)
+        ]
+        return iterations, first
+
+
+class KernelBackend:
+    """Pipeline.run_cycle (quiet, no budget or warm start) on the kernels.
+
+    State is packed into arrays, resolved and written back into the
+    pipeline's Service objects, so the pipeline stays the source of truth.
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.state = KernelState(pipeline)
+        self.services = [pipeline.services[name] for name in self.state.topology.services]
+
+    def pack(self, name, dtype):
+        values = []
+        for service in self.services:
+            values.extend(getattr(service, name).values())
+        return array(values, dtype)
+
+    def run_cycle(self, service_flows):
+        pipeline = self.pipeline
+        for service_name, flows in service_flows.items():
+            service = pipeline.services[service_name]
+            for schema_name, (in_flow, out_flow) in flows.items():
+                schema = pipeline.schemas[schema_name]
+                service.incoming_flow[schema] = in_flow
+                service.outgoing_flow[schema] = out_flow
+        incoming = self.pack("incoming_flow", "float64")
+        allocated = self.pack("allocated_capacity", "float64")
+        visited = self.pack("visited", "bool_")
+        reduction = self.pack("reduction_factors", "float64")
+        current = self.pack("current_capacity", "float64")
+        iterations, _ = self.state.resolve(incoming, current, allocated, visited, reduction)
+
+        incoming = to_list(incoming)
+        allocated = to_list(allocated)
+        visited = to_list(visited)
+        reduction = to_list(reduction)
+        statuses = to_list(self.state.statuses)
+        actions = to_list(self.state.actions)
+        offset = 0
+        for k, service in enumerate(self.services):
+            for schema in service.supported_schemas:
+                service.incoming_flow[schema] = incoming[offset]
+                service.allocated_capacity[schema] = allocated[offset]
+                service.visited[schema] = visited[offset]
+                service.reduction_factors[schema] = reduction[offset]
+                offset += 1
+            service.status = STATUSES[statuses[k]]
+            service.action = ACTIONS[actions[k]]
+        return iterations
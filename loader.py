@@ -0,0 +1,157 @@
+import json
+import sys
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+from crystal import Pipeline, Schema, Service
+from output import print_dependency_graph
+from snapshot import load_snapshot, paused_gc
+
+# Scenario files describe the same four things the Pipeline constructor takes
+# (schema priorities, per-service flows and capacities, the graph), one
+# record at a time so large topologies never exist as nested dicts:
+#
+#   .jsonl  one JSON object per line, schemas before the services using them
+#           {"schema": "S1", "priority": 7}
+#           {"service": "C1", "flows": {"S1": [200, 200]},
+#            "capacities": {"S1": [200, 250]}, "downstream": ["AggStream"]}
+#   .toml   small hand-written configs
+#           [schemas]
+#           S1 = 7
+#           [services.C1]
+#           flows = { S1 = [200, 200] }
+#           capacities = { S1 = [200, 250] }
+#           downstream = ["AggStream"]
+#   .snap   the columnar binary form written by snapshot.save_snapshot
+
+
+class PipelineBuilder:
+    def __init__(self, verbose=True):
+        self.pipeline = Pipeline({}, {}, {}, {}, verbose)
+
+    def add_schema(self, name, priority):
+        if name in self.pipeline.schemas:
+            raise ValueError(f"schema {name} defined twice")
+        self.pipeline.schemas[name] = Schema(name, priority)
+
+    def add_service(self, name, flows, capacities, downstream=None):
+        if name in self.pipeline.services:
+            raise ValueError(f"service {name} defined twice")
+        schemas = self.pipeline.schemas
+        supported_schemas = [schemas[schema_name] for schema_name in flows]
+        service = Service(
+            name,
+            supported_schemas,
+            {schemas[s]: tuple(caps) for s, caps in capacities.items()},
+            self.pipeline.verbose,
+        )
+        for schema_name, (in_flow, out_flow) in flows.items():
+            schema = schemas[schema_name]
+            service.incoming_flow[schema] = in_flow
+            service.outgoing_flow[schema] = out_flow
+        self.pipeline.services[name] = service
+        if downstream is not None:
+            self.pipeline.graph[name] = list(downstream)
+
+
+def load_jsonl(path, verbose=True):
+    builder = PipelineBuilder(verbose)
+    with open(path) as f, paused_gc():
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            try:
+                if "schema" in record:
+                    builder.add_schema(record["schema"], record["priority"])
+                elif "service" in record:
+                    builder.add_service(
+                        record["service"],
+                        record["flows"],
+                        record["capacities"],
+                        record.get("downstream"),
+                    )
+                else:
+                    raise ValueError(f"unknown record {line.strip()}")
+            except ValueError as error:
+                raise ValueError(f"{path}:{number}: {error}") from None
+    return builder.pipeline
+
+
+def load_toml(path, verbose=True):
+    with open(path, "rb") as f:
+        document = tomllib.load(f)
+    builder = PipelineBuilder(verbose)
+    for name, priority in document.get("schemas", {}).items():
+        builder.add_schema(name, priority)
+    for name, service in document.get("services", {}).items():
+        builder.add_service(
+            name,
+            service.get("flows", {}),
+            service.get("capacities", {}),
+            service.get("downstream"),
+        )
+    return builder.pipeline
+
+
+def load(path, verbose=True):
+    path = str(path)
+    if path.endswith(".jsonl"):
+        return load_jsonl(path, verbose)
+    if path.endswith(".toml"):
+        return load_toml(path, verbose)
+    if path.endswith(".snap"):
+        return load_snapshot(path, verbose)
+    raise ValueError(f"unknown scenario format: {path}")
+
+
+def dump_jsonl(service_flows, schema_capacities, graph, schema_priorities, path):
+    """Write a Pipeline-constructor style definition as a .jsonl scenario."""
+    with open(path, "w") as f:
+        for name, priority in schema_priorities.items():
+            f.write(json.dumps({"schema": name, "priority": priority}) + "\n")
+        for name, flows in service_flows.items():
+            record = {
+                "service": name,
+                "flows": {schema: list(flow) for schema, flow in flows.items()},
+                "capacities": {
+                    schema: list(caps)
+                    for schema, caps in schema_capacities.get(name, {}).items()
+                },
+            }
+            if name in graph:
+                record["downstream"] = graph[name]
+            f.write(json.dumps(record) + "\n")
+
+
+def read_definition(path):
+    """Read a .jsonl scenario back into the four Pipeline constructor dicts."""
+    service_flows = {}
+    schema_capacities = {}
+    graph = {}
+    schema_priorities = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "schema" in record:
+                schema_priorities[record["schema"]] = record["priority"]
+                continue
+            name = record["service"]
+            if name in service_flows:
+                raise ValueError(f"{path}: service {name} defined twice")
+            service_flows[name] = {s: tuple(v) for s, v in record["flows"].items()}
+            schema_capacities[name] = {
+                s: tuple(v) for s, v in record["capacities"].items()
+            }
+            if "downstream" in record:
+                graph[name] = record["downstream"]
+    return service_flows, schema_capacities, graph, schema_priorities
+
+
+if __name__ == "__main__":
+    print_dependency_graph(load(sys.argv[1]))
@@ -0,0 +1,186 @@
+import sys
+import tracemalloc
+import types
+
+from tracelog import installed
+
+# memory_report() breaks a pipeline's footprint into:
+#
+#   topology     schemas, the services dict, Service objects with their names,
+#                supported_schemas lists and capacity bounds, and the graph
+#   flow_state   the per-service, per-schema dicts a cycle reads and rewrites
+#                (incoming/outgoing flow, current/allocated capacity, visited,
+#                reduction factors) and their values
+#   caches       anything held under CACHE_ATTRIBUTES on the pipeline
+#   diagnostics  whatever wrappers installed on the pipeline or its services
+#                (Instrumentation, TraceRecorder, MemoryDebugger) keep alive
+#
+# Objects shared between categories are counted once, in the first category
+# that reaches them. Sizes come from sys.getsizeof, so they are the interpreter
+# view (object headers and containers), not allocator overhead.
+FLOW_STATE = [
+    "incoming_flow",
+    "outgoing_flow",
+    "current_capacity",
+    "allocated_capacity",
+    "visited",
+    "reduction_factors",
+]
+CACHE_ATTRIBUTES = ["allocation_cache", "upstream_index", "graph_order"]
+PIPELINE_METHODS = [
+    "run_cycle",
+    "print_overload_dependencies_dfs_way",
+    "resolve_overloads",
+    "calculate_overloads",
+    "propagate_backpressure",
+    "assess_service_status",
+]
+SERVICE_METHODS = ["reallocate_capacity_across_schemas"]
+
+
+def deep_size(roots, seen):
+    """Bytes reachable from `roots` that are not already in `seen`.
+
+    Follows containers, bound methods, closures and plain instances; classes,
+    modules and function code are shared with the program and not counted.
+    """
+    total = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ModuleType)):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, types.MethodType):
+            stack.append(obj.__self__)
+            continue
+        if isinstance(obj, types.FunctionType):
+            stack.extend(cell.cell_contents for cell in obj.__closure__ or ())
+            continue
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__"):
+            stack.append(vars(obj))
+    return total
+
+
+def memory_report(pipeline):
+    services = pipeline.services.values()
+    schemas = pipeline.schemas.values()
+    slots = sum(len(service.supported_schemas) for service in services)
+
+    # Schema and Service objects are sized by hand and marked seen up front:
+    # reading their __dict__ would materialise it and slow every later cycle.
+    seen = {id(obj) for obj in [pipeline, *schemas, *services]}
+    topology = sum(sys.getsizeof(obj) for obj in [pipeline, *schemas, *services])
+    topology += deep_size([pipeline.schemas, pipeline.services, pipeline.graph], seen)
+    topology += deep_size([[schema.name, schema.priority] for schema in schemas], seen)
+    topology += deep_size(
+        [
+            [service.name, service.supported_schemas, service.schema_capacities]
+            for service in services
+        ],
+        seen,
+    )
+    flow_state = deep_size(
+        [getattr(service, name) for service in services for name in FLOW_STATE], seen
+    )
+    caches = deep_size(
+        [
+            getattr(pipeline, name)
+            for name in CACHE_ATTRIBUTES
+            if getattr(pipeline, name, None) is not None
+        ],
+        seen,
+    )
+    wrappers = [installed(pipeline, name) for name in PIPELINE_METHODS]
+    wrappers += [
+        installed(service, name) for service in services for name in SERVICE_METHODS
+    ]
+    diagnostics = deep_size([wrapper for wrapper in wrappers if wrapper], seen)
+
+    total = topology + flow_state + caches + diagnostics
+    return {
+        "topology": topology,
+        "flow_state": flow_state,
+        "caches": caches,
+        "diagnostics": diagnostics,
+        "total": total,
+        "services": len(pipeline.services),
+        "slots": slots,
+        "flow_state_per_slot": flow_state / slots if slots else 0,
+        "topology_per_service": topology / len(pipeline.services) if services else 0,
+    }
+
+
+class MemoryDebugger:
+    """Debug mode: tracemalloc peak and retained bytes for every run_cycle.
+
+    Starts tracemalloc if it is not already running (and stops it on close).
+    With top > 0 each cycle also diffs tracemalloc snapshots and keeps the
+    `top` source lines that grew the most, which is slow.
+    """
+
+    def __init__(self, pipeline, top=0):
+        self.pipeline = pipeline
+        self.top = top
+        self.cycles = []
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+        self.replaced = installed(pipeline, "run_cycle")
+        self.run_cycle = pipeline.run_cycle
+        pipeline.run_cycle = self.traced_run_cycle
+
+    def traced_run_cycle(self, service_flows, time_budget=None, work_budget=None):
+        before = tracemalloc.take_snapshot() if self.top else None
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            return self.run_cycle(service_flows, time_budget, work_budget)
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            cycle = {
+                "cycle": len(self.cycles),
+                "peak": peak - baseline,
+                "retained": current - baseline,
+            }
+            if before is not None:
+                growth = tracemalloc.take_snapshot().compare_to(before, "lineno")
+                cycle["top"] = [
+                    (str(stat.traceback), stat.size_diff) for stat in growth[: self.top]
+                ]
+            self.cycles.append(cycle)
+
+    def peak(self):
+        return max((cycle["peak"] for cycle in self.cycles), default=0)
+
+    def close(self):
+        if self.replaced is None:
+            del self.pipeline.run_cycle
+        else:
+            self.pipeline.run_cycle = self.replaced
+        if self.started:
+            tracemalloc.stop()
+
+
+def format_report(report):
+    lines = []
+    for category in ["topology", "flow_state", "caches", "diagnostics", "total"]:
+        lines.append(f"{category:<12} {report[category]:>14,} bytes")
+    lines.append(
+        f"{report['services']:,} services, {report['slots']:,} service/schema slots: "
+        f"{report['topology_per_service']:,.0f} topology bytes/service, "
+        f"{report['flow_state_per_slot']:,.0f} flow state bytes/slot"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from loader import load
+
+    print(format_report(memory_report(load(sys.argv[1], verbose=False))))
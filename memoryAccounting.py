@@ -0,0 +1,63 @@
+import os
+import tracemalloc
+
+from crystal import Pipeline
+from instrument import Instrumentation
+from loader import load, read_definition
+from memory import MemoryDebugger, memory_report
+from snapshotRestore import diamond_definition
+
+SCENARIO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scenarios", "hothSingle.jsonl"
+)
+
+
+def test_report_categories_add_up():
+    report = memory_report(load(SCENARIO, verbose=False))
+    assert report["slots"] == 168
+    assert report["topology"] > 0 and report["flow_state"] > 0
+    assert report["caches"] == 0 and report["diagnostics"] == 0
+    assert report["total"] == sum(
+        report[category]
+        for category in ["topology", "flow_state", "caches", "diagnostics"]
+    )
+
+
+def test_flow_state_scales_with_slots():
+    service_flows, schema_capacities, graph, schema_priorities = diamond_definition()
+    small = memory_report(Pipeline(*diamond_definition(), verbose=False))
+    doubled = {
+        f"{name}{copy}": flows for copy in "ab" for name, flows in service_flows.items()
+    }
+    capacities = {
+        f"{name}{copy}": caps for copy in "ab" for name, caps in schema_capacities.items()
+    }
+    large = memory_report(Pipeline(doubled, capacities, {}, schema_priorities, verbose=False))
+    assert large["slots"] == 2 * small["slots"]
+    assert large["flow_state"] <= 2 * small["flow_state"]
+    assert large["flow_state_per_slot"] <= small["flow_state_per_slot"]
+
+
+def test_diagnostics_follow_attached_wrappers():
+    pipeline = load(SCENARIO, verbose=False)
+    instrumentation = Instrumentation(pipeline)
+    assert memory_report(pipeline)["diagnostics"] > 0
+    instrumentation.close()
+    assert memory_report(pipeline)["diagnostics"] == 0
+
+
+def test_debug_mode_tracks_cycle_peaks():
+    assert not tracemalloc.is_tracing()
+    pipeline = load(SCENARIO, verbose=False)
+    debugger = MemoryDebugger(pipeline, top=3)
+    service_flows = read_definition(SCENARIO)[0]
+    for _ in range(3):
+        pipeline.run_cycle(service_flows)
+    debugger.close()
+
+    assert [cycle["cycle"] for cycle in debugger.cycles] == [0, 1, 2]
+    assert debugger.peak() > 0
+    assert all(cycle["peak"] >= cycle["retained"] for cycle in debugger.cycles)
+    assert all(len(cycle["top"]) <= 3 for cycle in debugger.cycles)
+    assert not tracemalloc.is_tracing()
+    assert "run_cycle" not in vars(pipeline)
@@ -0,0 +1,103 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+from collector import MAX_QUERIES_PER_CALL, MetricsCollector
+from crystal import Pipeline
+
+
+class FakeCloudWatch:
+    """Offline stand-in for the CloudWatch client's get_metric_data."""
+
+    def __init__(self, value, page_size=100):
+        self.value = value
+        self.page_size = page_size
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_metric_data(
+        self, MetricDataQueries, StartTime, EndTime, ScanBy, NextToken=None
+    ):
+        assert len(MetricDataQueries) <= MAX_QUERIES_PER_CALL
+        with self.lock:
+            self.calls += 1
+        offset = int(NextToken or 0)
+        page = MetricDataQueries[offset : offset + self.page_size]
+        results = []
+        for query in page:
+            stat = query["MetricStat"]
+            dimensions = {d["Name"]: d["Value"] for d in stat["Metric"]["Dimensions"]}
+            value = self.value(
+                dimensions["Service"], dimensions["Schema"], stat["Metric"]["MetricName"]
+            )
+            results.append(
+                {
+                    "Id": query["Id"],
+                    "Timestamps": [EndTime, EndTime - timedelta(seconds=stat["Period"])],
+                    "Values": [value, value],
+                    "StatusCode": "Complete",
+                }
+            )
+        response = {"MetricDataResults": results}
+        if offset + self.page_size < len(MetricDataQueries):
+            response["NextToken"] = str(offset + self.page_size)
+        return response
+
+
+def build_pipeline(services=3):
+    names = [f"Svc{i}" for i in range(services)]
+    service_flows = {name: {"S1": (0, 0), "S2": (0, 0)} for name in names}
+    schema_capacities = {name: {"S1": (10, 100), "S2": (10, 100)} for name in names}
+    graph = {name: names[i + 1 : i + 2] for i, name in enumerate(names)}
+    return Pipeline(service_flows, schema_capacities, graph, {"S1": 2, "S2": 1})
+
+
+def metric_value(service_name, schema_name, metric):
+    return {"InputTPS": 120.0, "OutputTPS": 90.0, "Capacity": 250.0}[metric]
+
+
+def test_collector_batches_and_feeds_run_cycle(capsys):
+    pipeline = build_pipeline(services=200)
+    client = FakeCloudWatch(metric_value, page_size=150)
+    collector = MetricsCollector(pipeline, client=client, max_workers=4)
+    now = datetime(2024, 10, 1, 12, 0, 30, tzinfo=timezone.utc)
+    try:
+        service_flows = collector.feed(now)
+    finally:
+        collector.close()
+
+    # 200 services x 2 schemas x 3 metrics = 1200 series -> 3 batches,
+    # each split over pages of 150 queries.
+    assert len(collector.series) == 1200
+    assert client.calls == collector.api_calls == 4 + 4 + 2
+    assert service_flows["Svc0"]["S1"] == (120.0, 90.0)
+    schema = pipeline.schemas["S1"]
+    # The reported capacity is clamped to the service's (min, max) bounds.
+    assert pipeline.services["Svc0"].current_capacity[schema] == 100
+
+
+def test_collector_reuses_cached_series(capsys):
+    pipeline = build_pipeline()
+    values = {"InputTPS": 50.0, "OutputTPS": 50.0, "Capacity": 80.0}
+    client = FakeCloudWatch(lambda service, schema, metric: values[metric])
+    collector = MetricsCollector(pipeline, client=client)
+    now = datetime(2024, 10, 1, 12, 0, 30, tzinfo=timezone.utc)
+    try:
+        collector.collect(now)
+        assert len(collector.changed) == 6
+
+        # Same period: served from the cache without calling the API.
+        collector.collect(now + timedelta(seconds=10))
+        assert client.calls == 1
+        assert collector.changed == set()
+
+        # Next period with identical values: fetched, but nothing changed.
+        collector.collect(now + timedelta(seconds=60))
+        assert client.calls == 2
+        assert collector.changed == set()
+
+        values["InputTPS"] = 75.0
+        service_flows, _ = collector.collect(now + timedelta(seconds=120))
+        assert len(collector.changed) == 6
+        assert service_flows["Svc1"]["S2"] == (75.0, 50.0)
+    finally:
+        collector.close()
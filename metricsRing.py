@@ -0,0 +1,108 @@
+import struct
+
+from crystal import Pipeline
+from ingest import (
+    RECORD,
+    RingReader,
+    build_service_flows,
+    create_ring,
+    open_ring,
+    schema_ids,
+    service_ids,
+)
+
+
+def build_pipeline():
+    service_flows = {
+        "Input1": {"S1": (50, 50)},
+        "Input2": {"S1": (70, 70)},
+        "Aggregator": {"S1": (150, 150)},
+        "Destination": {"S1": (150, 150)},
+    }
+    schema_capacities = {
+        "Input1": {"S1": (40, 60)},
+        "Input2": {"S1": (60, 80)},
+        "Aggregator": {"S1": (120, 180)},
+        "Destination": {"S1": (130, 170)},
+    }
+    graph = {
+        "Input1": ["Aggregator"],
+        "Input2": ["Aggregator"],
+        "Aggregator": ["Destination"],
+        "Destination": [],
+    }
+    return Pipeline(service_flows, schema_capacities, graph, {"S1": 1})
+
+
+def test_agent_records_feed_run_cycle(tmp_path, capsys):
+    pipeline = build_pipeline()
+    services = service_ids(pipeline)
+    schemas = schema_ids(pipeline)
+    path = tmp_path / "tps.ring"
+
+    writer = open_ring(path, capacity=16)
+    reader = RingReader(path, len(services), len(schemas))
+    writer.append(services["Input1"], schemas["S1"], 55, 55, timestamp=1.0)
+    writer.append(services["Aggregator"], schemas["S1"], 190, 170, timestamp=1.0)
+    # A later sample for the same slot replaces the earlier one.
+    writer.append(services["Input1"], schemas["S1"], 58, 57, timestamp=2.0)
+
+    assert reader.drain() == 3
+    service_flows = build_service_flows(reader, pipeline)
+    assert service_flows == {
+        "Input1": {"S1": (58, 57)},
+        "Aggregator": {"S1": (190, 170)},
+    }
+
+    pipeline.run_cycle(service_flows)
+    schema = pipeline.schemas["S1"]
+    assert pipeline.services["Aggregator"].incoming_flow[schema] <= 180
+    writer.close()
+    reader.close()
+
+
+def test_reader_skips_records_lost_to_wrap_around(tmp_path):
+    path = tmp_path / "tps.ring"
+    create_ring(path, capacity=4)
+    writer = open_ring(path, capacity=4)
+    reader = RingReader(path, services=1, schemas=1)
+    for i in range(10):
+        writer.append(0, 0, float(i), float(i), timestamp=float(i))
+
+    assert reader.drain() == 4
+    assert reader.overrun == 6
+    assert reader.in_tps[0] == 9.0
+    assert reader.drain() == 0
+    writer.close()
+    reader.close()
+
+
+def test_reader_rejects_torn_record(tmp_path):
+    path = tmp_path / "tps.ring"
+    writer = open_ring(path, capacity=4)
+    reader = RingReader(path, services=1, schemas=1)
+    writer.append(0, 0, 10.0, 10.0, timestamp=1.0)
+    writer.append(0, 0, 20.0, 20.0, timestamp=2.0)
+
+    # Simulate an agent that died between the payload and the trailing stamp.
+    offset = writer.offset(1)
+    struct.pack_into("<Q", writer.map, offset + RECORD.size, 0)
+
+    assert reader.drain() == 1
+    assert reader.torn == 1
+    assert reader.in_tps[0] == 10.0
+    writer.close()
+    reader.close()
+
+
+def test_sample_at_timestamp_zero_counts_as_data(tmp_path):
+    pipeline = build_pipeline()
+    path = tmp_path / "tps.ring"
+    writer = open_ring(path, capacity=4)
+    reader = RingReader(path, len(service_ids(pipeline)), len(schema_ids(pipeline)))
+    writer.append(0, 0, 42.0, 41.0, timestamp=0.0)
+
+    assert reader.drain() == 1
+    assert build_service_flows(reader, pipeline) == {"Input1": {"S1": (42.0, 41.0)}}
+    writer.close()
+    reader.close()
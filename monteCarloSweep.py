@@ -0,0 +1,38 @@
+import os
+
+from loader import read_definition
+from sweep import run_sample, sweep
+
+SCENARIO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scenarios", "hothSingle.jsonl"
+)
+
+
+def test_sweep_is_reproducible_across_worker_counts():
+    definition = read_definition(SCENARIO)
+    inline = sweep(definition, 40, seed=3, workers=0, chunk_size=7)
+    pooled = sweep(definition, 40, seed=3, workers=2, chunk_size=16)
+    assert inline == pooled
+    assert sweep(definition, 40, seed=4, workers=0) != inline
+
+
+def test_without_noise_every_sample_is_the_base_case():
+    definition = read_definition(SCENARIO)
+    base = run_sample(definition, 0, 0, 0.0, 0.0)
+    report = sweep(definition, 5, flow_noise=0.0, capacity_noise=0.0, workers=0)
+    for (bottleneck, offered, admitted), stats in zip(base, report["slots"].values()):
+        assert stats["bottleneck"] == float(bottleneck)
+        assert stats["admitted"]["p05"] == stats["admitted"]["p95"] == admitted
+        assert stats["throttled"] == max(0.0, offered - admitted)
+
+
+def test_hoth_is_the_usual_bottleneck():
+    report = sweep(read_definition(SCENARIO), 200, workers=0)
+    slots = report["slots"]
+    worst = max(slots, key=lambda slot: slots[slot]["bottleneck"])
+    assert worst == ("Hoth", "S1")
+    assert 0 < slots[worst]["bottleneck"] < 1
+    assert all(
+        stats["admitted"]["p05"] <= stats["admitted"]["p50"] <= stats["admitted"]["p95"]
+        for stats in slots.values()
+    )
@@ -0,0 +1,88 @@
+class DecisionPublisher:
+    """Pushes only what changed since the last push.
+
+    Capacities are compared against the last *published* value, so a slow
+    drift that stays inside the deadband from cycle to cycle still goes out
+    once it has accumulated. Status/action changes must hold for
+    `hold_cycles` consecutive cycles before they are published, which keeps a
+    service flapping around a threshold from churning configs on every host.
+    """
+
+    def __init__(
+        self, sink=None, relative_deadband=0.05, absolute_deadband=1.0, hold_cycles=1
+    ):
+        self.sink = sink
+        self.relative_deadband = relative_deadband
+        self.absolute_deadband = absolute_deadband
+        self.hold_cycles = hold_cycles
+        self.capacities = {}
+        self.states = {}
+        self.pending_states = {}
+        self.published_changes = 0
+        self.suppressed_changes = 0
+        self.batches = 0
+
+    def significant(self, previous, current):
+        # Shutting a flow off, or opening it again, always goes out, however
+        # small the rate was.
+        if (previous == 0) != (current == 0):
+            return True
+        band = max(self.absolute_deadband, self.relative_deadband * abs(previous))
+        return abs(current - previous) > band
+
+    def diff(self, pipeline):
+        batch = {}
+        for service_name, service in pipeline.services.items():
+            changes = {}
+
+            state = (service.status.value, service.action.value)
+            previous_state = self.states.get(service_name)
+            if previous_state is None:
+                changes["status"], changes["action"] = state
+                self.states[service_name] = state
+            elif state != previous_state:
+                seen_state, seen = self.pending_states.get(service_name, (state, 0))
+                seen = seen + 1 if seen_state == state else 1
+                if seen >= self.hold_cycles:
+                    changes["status"], changes["action"] = state
+                    self.states[service_name] = state
+                    self.pending_states.pop(service_name, None)
+                else:
+                    self.pending_states[service_name] = (state, seen)
+                    self.suppressed_changes += 1
+            else:
+                self.pending_states.pop(service_name, None)
+
+            published = self.capacities.setdefault(service_name, {})
+            capacity_changes = {}
+            for schema in service.supported_schemas:
+                value = service.allocated_capacity[schema]
+                previous = published.get(schema.name)
+                if previous is None or self.significant(previous, value):
+                    capacity_changes[schema.name] = value
+                    published[schema.name] = value
+                elif value != previous:
+                    self.suppressed_changes += 1
+            if capacity_changes:
+                changes["allocated_capacity"] = capacity_changes
+
+            if changes:
+                # A status/action pair counts as one change, as does each schema.
+                self.published_changes += ("status" in changes) + len(capacity_changes)
+                batch[service_name] = changes
+        return batch
+
+    def publish(self, pipeline):
+        batch = self.diff(pipeline)
+        if batch:
+            self.batches += 1
+            if self.sink is not None:
+                self.sink(batch)
+        return batch
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "published": self.published_changes,
+            "suppressed": self.suppressed_changes,
+        }
@@ -0,0 +1,102 @@
+import pytest
+
+from crystal import Pipeline
+
+
+def chain(**options):
+    # Src -> A -> Sink, with A running exactly at its allocated capacity.
+    return Pipeline(
+        {"Src": {"S1": (100, 100)}, "A": {"S1": (100, 100)}, "Sink": {"S1": (100, 100)}},
+        {"Src": {"S1": (10, 200)}, "A": {"S1": (10, 100)}, "Sink": {"S1": (10, 200)}},
+        {"Src": ["A"], "A": ["Sink"]},
+        {"S1": 1},
+        verbose=False,
+        **options,
+    )
+
+
+FLOWS = {"Src": {"S1": (100, 100)}, "A": {"S1": (100, 100)}, "Sink": {"S1": (100, 100)}}
+
+
+def incoming(pipeline, name):
+    return pipeline.services[name].incoming_flow[pipeline.schemas["S1"]]
+
+
+def test_matched_throughput_alone_is_not_an_overload():
+    pipeline = chain()
+    pipeline.run_cycle(FLOWS)
+    assert incoming(pipeline, "Src") == 100
+    assert incoming(pipeline, "A") == 100
+
+
+def test_growing_backlog_starts_backpressure():
+    # A really serves 80/s: its queue grows by 20 a cycle at matched TPS.
+    pipeline = chain()
+    pipeline.report_queue("A", "S1", 150, 150 / 80)
+    pipeline.run_cycle(FLOWS)
+    assert incoming(pipeline, "Src") == 100
+
+    pipeline.report_queue("A", "S1", 170, 170 / 80)
+    for service_name, flows in FLOWS.items():
+        for schema_name, (in_flow, _) in flows.items():
+            pipeline.services[service_name].incoming_flow[pipeline.schemas[schema_name]] = in_flow
+    pipeline.apply_queue_reports()
+    overloaded = pipeline.calculate_overloads()
+    assert overloaded["A"][pipeline.schemas["S1"]] == pytest.approx(0.2)
+
+    pipeline.report_queue("A", "S1", 190, 190 / 80)
+    pipeline.run_cycle(FLOWS)
+    assert incoming(pipeline, "A") == pytest.approx(80)
+    assert incoming(pipeline, "Src") == pytest.approx(80)
+
+
+def test_latency_slo_breach_drains_the_queue():
+    pipeline = chain()
+    pipeline.set_latency_slo("S1", 0.5)
+    # Little's law: 100 queued at 1.25s is 80/s served; getting back to
+    # 0.5s means 40 queued, so 60 to drain over queue_drain_seconds.
+    pipeline.report_queue("A", "S1", 100, 1.25)
+    pipeline.run_cycle(FLOWS)
+    assert incoming(pipeline, "A") == pytest.approx(80 - 60 / 10)
+    assert incoming(pipeline, "Src") == pytest.approx(74)
+
+    pipeline.report_queue("A", "S1", 20, 0.25)
+    pipeline.run_cycle(FLOWS)
+    assert incoming(pipeline, "A") == 100
+    assert pipeline.services["A"].queue_limits is None
+
+
+def test_queue_limited_cycles_do_not_warm_start():
+    pipeline = chain(warm_start=True)
+    pipeline.run_cycle(FLOWS)
+    assert pipeline.warm_anchor is not None
+    pipeline.set_latency_slo("S1", 0.5)
+    pipeline.report_queue("A", "S1", 100, 1.25)
+    pipeline.run_cycle(FLOWS)
+    assert pipeline.warm_anchor is None
+    assert pipeline.warm_cycles == 0
+
+
+def test_removing_queue_limited_services_and_schemas():
+    pipeline = chain()
+    pipeline.add_schema("S2", 2)
+    pipeline.set_capacity("A", "S2", 10, 50)
+    pipeline.set_latency_slo("S2", 1.0)
+    pipeline.report_queue("A", "S1", 150, 150 / 80)
+    pipeline.run_cycle(FLOWS)
+    pipeline.report_queue("A", "S1", 170, 170 / 80)
+    pipeline.run_cycle(FLOWS)
+    assert pipeline.queue_limited == ["A"]
+
+    # Pending reports for the removed schema and service are dropped too.
+    pipeline.report_queue("A", "S2", 10, 2.0)
+    pipeline.remove_schema("S2")
+    assert "S2" not in pipeline.latency_slos
+    pipeline.run_cycle(FLOWS)
+
+    pipeline.report_queue("A", "S1", 190, 190 / 80)
+    pipeline.remove_service("A")
+    assert pipeline.queue_limited == []
+    flows = {name: flows for name, flows in FLOWS.items() if name != "A"}
+    pipeline.run_cycle(flows)
+    assert incoming(pipeline, "Src") == 100
@@ -0,0 +1,171 @@
+import csv
+import json
+import sys
+import time
+
+from crystal import ServiceStatus
+from loader import load
+
+# A flow series is a CSV file ordered by tick:
+#
+#   tick,service,schema,in_tps,out_tps
+#   0,C1,S1,200,200
+#   0,C2,S2,50,50
+#   1,C1,S1,210,205
+#
+# A tick only needs the (service, schema) pairs that changed; everything else
+# keeps the demand it had on the previous tick. That is the raw in_tps and
+# out_tps, not what the pipeline admitted, so replay carries the demand
+# forward (carry_forward) and hands run_cycle every pair on every tick.
+SERIES_FIELDS = ["tick", "service", "schema", "in_tps", "out_tps"]
+
+
+def read_ticks(path):
+    """Yield (tick, service_flows) one tick at a time."""
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        if header != SERIES_FIELDS:
+            raise ValueError(f"{path}: expected header {','.join(SERIES_FIELDS)}")
+        tick = None
+        service_flows = {}
+        for row in reader:
+            row_tick = int(row[0])
+            if row_tick != tick:
+                if tick is not None:
+                    if row_tick < tick:
+                        raise ValueError(f"{path}: tick {row_tick} after {tick}")
+                    yield tick, service_flows
+                tick = row_tick
+                service_flows = {}
+            service_flows.setdefault(row[1], {})[row[2]] = (
+                float(row[3]),
+                float(row[4]),
+            )
+        if tick is not None:
+            yield tick, service_flows
+
+
+def write_ticks(path, ticks):
+    """Write an iterable of (tick, service_flows) as a flow series."""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(SERIES_FIELDS)
+        for tick, service_flows in ticks:
+            for service_name, flows in service_flows.items():
+                for schema_name, (in_flow, out_flow) in flows.items():
+                    writer.writerow([tick, service_name, schema_name, in_flow, out_flow])
+
+
+def scaled_ticks(service_flows, profile):
+    """Yield one tick per profile factor, every flow scaled by that factor."""
+    for tick, factor in enumerate(profile):
+        yield tick, {
+            service_name: {
+                schema_name: (in_flow * factor, out_flow * factor)
+                for schema_name, (in_flow, out_flow) in flows.items()
+            }
+            for service_name, flows in service_flows.items()
+        }
+
+
+def current_flows(pipeline):
+    """The pipeline's (in_tps, out_tps) per (service, schema), as run_cycle takes them."""
+    return {
+        service_name: {
+            schema.name: (service.incoming_flow[schema], service.outgoing_flow[schema])
+            for schema in service.supported_schemas
+        }
+        for service_name, service in pipeline.services.items()
+    }
+
+
+def carry_forward(demand, service_flows):
+    """Merge one (possibly sparse) tick into the demand carried between ticks."""
+    for service_name, flows in service_flows.items():
+        demand.setdefault(service_name, {}).update(flows)
+    return demand
+
+
+def tick_result(tick, pipeline):
+    admitted = {}
+    statuses = {}
+    overloaded = 0
+    for service_name, service in pipeline.services.items():
+        admitted[service_name] = {
+            schema.name: min(service.incoming_flow[schema], service.allocated_capacity[schema])
+            for schema in service.supported_schemas
+        }
+        statuses[service_name] = service.status.value
+        if service.status == ServiceStatus.OVERLOADED:
+            overloaded += 1
+    return {
+        "tick": tick,
+        "overloaded": overloaded,
+        "status": statuses,
+        "admitted": admitted,
+    }
+
+
+def late_slots(pipeline, service_flows):
+    """(service, schema) pairs whose in_tps exceeds what the last cycle allocated.
+
+    That traffic arrives before the next cycle can push back on it.
+    """
+    late = []
+    for service_name, flows in service_flows.items():
+        service = pipeline.services[service_name]
+        for schema_name, (in_flow, _) in flows.items():
+            if in_flow > service.allocated_capacity[pipeline.schemas[schema_name]]:
+                late.append((service_name, schema_name))
+    return late
+
+
+def replay(pipeline, ticks, output, forecaster=None):
+    """Feed every tick through one persistent pipeline, streaming results.
+
+    `ticks` is any iterable of (tick, service_flows), e.g. read_ticks(path);
+    `output` is a writable text file that receives one JSON line per tick.
+    A tick is late when some pair's in_tps is above the allocation planned
+    on the tick before. With a `forecaster` (forecast.Forecaster over the
+    same pipeline) cycles plan against max(current, forecast) demand.
+    """
+    count = 0
+    overloaded_ticks = 0
+    late_ticks = 0
+    demand = current_flows(pipeline)
+    started = time.perf_counter()
+    for tick, service_flows in ticks:
+        service_flows = carry_forward(demand, service_flows)
+        late = len(late_slots(pipeline, service_flows))
+        (forecaster or pipeline).run_cycle(service_flows)
+        result = tick_result(tick, pipeline)
+        result["late"] = late
+        output.write(json.dumps(result) + "\n")
+        count += 1
+        if result["overloaded"]:
+            overloaded_ticks += 1
+        if late:
+            late_ticks += 1
+    return {
+        "ticks": count,
+        "overloaded_ticks": overloaded_ticks,
+        "late_ticks": late_ticks,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def main(scenario_path, series_path, output_path):
+    pipeline = load(scenario_path, verbose=False)
+    with open(output_path, "w") as output:
+        summary = replay(pipeline, read_ticks(series_path), output)
+    rate = summary["ticks"] / summary["seconds"] * 60 if summary["seconds"] else 0
+    print(
+        f"Replayed {summary['ticks']} ticks in {summary['seconds']:.2f}s "
+        f"({rate:,.0f} ticks/minute), {summary['overloaded_ticks']} with overloads, "
+        f"{summary['late_ticks']} late"
+    )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
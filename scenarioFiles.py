@@ -0,0 +1,69 @@
+import glob
+import os
+
+import pytest
+
+from crystal import Pipeline
+from loader import dump_jsonl, load, read_definition
+from snapshot import save_snapshot
+from snapshotRestore import state
+
+SCENARIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+
+
+def scenario_paths():
+    return sorted(glob.glob(os.path.join(SCENARIOS, "*.jsonl")))
+
+
+def test_streaming_loader_matches_dict_construction():
+    assert scenario_paths()
+    for path in scenario_paths():
+        definition = read_definition(path)
+        expected = Pipeline(*definition)
+        loaded = load(path)
+        assert state(loaded) == state(expected), path
+        assert loaded.graph == expected.graph, path
+        assert list(loaded.schemas) == list(expected.schemas), path
+
+
+def test_loaded_scenario_runs_like_the_dict_literal(capsys):
+    path = os.path.join(SCENARIOS, "hothSingle.jsonl")
+    service_flows, schema_capacities, graph, schema_priorities = read_definition(path)
+    expected = Pipeline(service_flows, schema_capacities, graph, schema_priorities)
+    loaded = load(path)
+
+    expected.run_cycle(service_flows)
+    loaded.run_cycle(service_flows)
+    assert state(loaded) == state(expected)
+
+
+def test_toml_and_columnar_forms(tmp_path):
+    toml = load(os.path.join(SCENARIOS, "simpleLinearOverload.toml"))
+    jsonl = load(os.path.join(SCENARIOS, "cases_simple_linear_overload.jsonl"))
+    assert state(toml) == state(jsonl)
+    assert toml.graph == jsonl.graph
+
+    path = tmp_path / "linear.snap"
+    save_snapshot(jsonl, path)
+    assert state(load(path)) == state(jsonl)
+
+
+def test_dump_round_trips(tmp_path):
+    source = os.path.join(SCENARIOS, "bungeeHothCombo.jsonl")
+    definition = read_definition(source)
+    path = tmp_path / "copy.jsonl"
+    dump_jsonl(*definition, path)
+    assert read_definition(path) == definition
+
+
+def test_duplicate_service_is_rejected(tmp_path):
+    path = tmp_path / "duplicate.jsonl"
+    path.write_text(
+        '{"schema": "S1", "priority": 1}\n'
+        '{"service": "A", "flows": {"S1": [1, 1]}, "capacities": {"S1": [0, 5]}}\n'
+        '{"service": "A", "flows": {"S1": [2, 2]}, "capacities": {"S1": [0, 9]}}\n'
+    )
+    with pytest.raises(ValueError, match="duplicate.jsonl:3: service A defined twice"):
+        load(path)
+    with pytest.raises(ValueError, match="service A defined twice"):
+        read_definition(path)
@@ -1,3 +1,4 @@
+import math
 import random
 from enum import Enum
 from collections import defaultdict, deque
@@ -121,36 +122,55 @@ class Service:
 
     def reallocate_capacity(self):
         print(f" Reallocating capacity for {self.name}")
-        sorted_schemas = sorted(
-            self.supported_schemas, key=lambda s: s.priority, reverse=True
+        self.allocated_capacity = share_capacity(
+            self.current_capacity, self.incoming_flow, self.supported_schemas
         )
-        total_incoming = sum(self.incoming_flow.values())
-
-        if total_incoming <= self.current_capacity:
-            for schema in sorted_schemas:
-                self.allocated_capacity[schema] = self.incoming_flow[schema]
-        else:
-            for schema in sorted_schemas:
-                self.allocated_capacity[schema] = int(
-                    self.current_capacity
-                    * (self.incoming_flow[schema] / total_incoming)
-                )
-
-        remaining_capacity = self.current_capacity - sum(
-            self.allocated_capacity.values()
-        )
-        while remaining_capacity > 0:
-            for schema in sorted_schemas:
-                if remaining_capacity > 0:
-                    self.allocated_capacity[schema] += 1
-                    remaining_capacity -= 1
-                else:
-                    break
 
         print(f" Final allocated capacity: {self.allocated_capacity}")
         print(f" Final outgoing flow: {self.outgoing_flow}")
 
 
+def share_capacity(capacity, incoming_flow, schemas):
+    """Split `capacity` across schemas by incoming flow, without a unit loop.
+
+    Under capacity every schema gets exactly its incoming flow, and the spare
+    is dealt out in whole units as the old loop did: an equal number each,
+    the units left over one apiece in priority order, and any fraction of a
+    unit to the next schema in that order. Over capacity the quotas
+    capacity * incoming / total are apportioned by largest remainder: each
+    schema gets the floor of its quota and the units left over go to the
+    largest fractional parts, higher priority first on ties. Either way the
+    allocations sum to `capacity`, in O(k log k) for k schemas.
+    """
+    total_incoming = sum(incoming_flow.values())
+    if total_incoming <= capacity:
+        spare = capacity - total_incoming
+        units = math.floor(spare)
+        each, leftover = divmod(units, len(schemas))
+        ranked = sorted(schemas, key=lambda s: s.priority, reverse=True)
+        allocated = {schema: incoming_flow[schema] + each for schema in schemas}
+        for schema in ranked[:leftover]:
+            allocated[schema] += 1
+        if spare > units:
+            allocated[ranked[leftover]] += spare - units
+        return allocated
+
+    quotas = {
+        schema: capacity * (incoming_flow[schema] / total_incoming) for schema in schemas
+    }
+    allocated = {schema: math.floor(quota) for schema, quota in quotas.items()}
+    remaining = math.floor(capacity - sum(allocated.values()))
+    if remaining > 0:
+        ranked = sorted(
+            schemas,
+            key=lambda s: (round(quotas[s] - allocated[s], 9), s.priority),
+            reverse=True,
+        )
+        for schema in ranked[:remaining]:
+            allocated[schema] += 1
+    return allocated
+
+
 class Pipeline:
     def __init__(self, service_flows):
         self.schemas = [Schema(f"S{i}", 8 - i) for i in range(1, 8)]
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from sdx import Schema, share_capacity
+
+
+def schemas(*priorities):
+    return [Schema(f"S{i}", priority) for i, priority in enumerate(priorities, start=1)]
+
+
+def shares(capacity, flows, priorities=(7, 6, 5)):
+    supported = schemas(*priorities)
+    allocated = share_capacity(capacity, dict(zip(supported, flows)), supported)
+    return list(allocated.values())
+
+
+def test_spare_capacity_is_split_evenly_higher_priority_first():
+    # What the unit-at-a-time loop produced: 73 rounds each, then S1 and S2.
+    assert shares(301, (50, 20, 10)) == [124, 94, 83]
+
+
+def test_overload_leftovers_go_to_the_largest_remainders():
+    # Quotas 9.09, 9.09, 11.82: the spare unit goes to S3, not to S1.
+    assert shares(30, (10, 10, 13)) == [9, 9, 12]
+
+
+def test_equal_remainders_break_ties_by_priority():
+    assert shares(20, (10, 10, 10), priorities=(1, 3, 2)) == [6, 7, 7]
+
+
+def test_allocations_sum_to_capacity_and_cover_demand_when_they_can():
+    rng = random.Random(0)
+    for exponent in range(2, 8):
+        capacity = 10**exponent
+        for _ in range(50):
+            flows = [rng.uniform(0, 2 * capacity / 7) for _ in range(7)]
+            allocated = shares(capacity, flows, priorities=range(7, 0, -1))
+            assert sum(allocated) == pytest.approx(capacity)
+            if sum(flows) <= capacity:
+                assert all(a >= f for a, f in zip(allocated, flows))
+            else:
+                assert all(value == int(value) for value in allocated)
+
+
+def test_fractional_demand_under_capacity_is_met_exactly():
+    # The old loop gave 10.5 each; flooring the quotas gave S2 only 10.
+    assert shares(21, (10.5, 10.5), priorities=(2, 1)) == [10.5, 10.5]
+    # Two whole spare units go one apiece by priority, the half to the next.
+    assert shares(23.5, (10.25, 10.75, 0.0)) == [11.25, 11.75, 0.5]
+
+
+def test_large_capacity_needs_no_loop():
+    allocated = shares(10**7, (10, 10, 10))
+    assert allocated == [3333334, 3333333, 3333333]
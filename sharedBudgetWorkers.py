@@ -0,0 +1,94 @@
+import multiprocessing
+
+from budgets import BudgetTable
+from crystal import Pipeline
+
+
+def build_pipeline():
+    service_flows = {
+        "Source": {"S1": (100, 100), "S2": (40, 40)},
+        "Processor": {"S1": (100, 80), "S2": (40, 40)},
+        "Destination": {"S1": (80, 80), "S2": (40, 40)},
+    }
+    schema_capacities = {
+        "Source": {"S1": (0, 120), "S2": (0, 60)},
+        "Processor": {"S1": (60, 80), "S2": (20, 60)},
+        "Destination": {"S1": (60, 100), "S2": (20, 60)},
+    }
+    graph = {
+        "Source": ["Processor"],
+        "Processor": ["Destination"],
+        "Destination": [],
+    }
+    schema_priorities = {"S1": 2, "S2": 1}
+    pipeline = Pipeline(service_flows, schema_capacities, graph, schema_priorities)
+    pipeline.run_cycle(service_flows)
+    return pipeline
+
+
+def drain_budget(name, worker, results):
+    table = BudgetTable.attach(name, worker=worker)
+    admitted = 0
+    while table.consume("Processor", "S1"):
+        admitted += 1
+    results.put((worker, admitted))
+    table.close()
+
+
+def test_workers_share_one_budget(capsys):
+    """
+    Four worker processes consume the Processor/S1 budget concurrently.
+    Between them they must admit roughly the published budget, not four
+    times it as they would with per-process copies of the throttle state.
+    """
+    pipeline = build_pipeline()
+    workers = 4
+    table = BudgetTable.create(pipeline, workers)
+    try:
+        table.publish(pipeline)
+        admitted_rate, budget = table.read("Processor", "S1")
+        assert admitted_rate > 0
+        assert budget == admitted_rate
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=drain_budget, args=(table.name, worker, results)
+            )
+            for worker in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        admitted = dict(results.get(timeout=30) for _ in processes)
+        for process in processes:
+            process.join(timeout=30)
+
+        total = sum(admitted.values())
+        assert budget - 1 <= total <= budget + workers - 1
+        _, remaining = table.read("Processor", "S1")
+        assert remaining < 1
+    finally:
+        table.close()
+        table.unlink()
+
+
+def test_publish_resets_budget_and_bumps_sequence(capsys):
+    pipeline = build_pipeline()
+    table = BudgetTable.create(pipeline, workers=1)
+    worker = BudgetTable.attach(table.name, worker=0)
+    try:
+        first = table.publish(pipeline, period=0.5)
+        assert first % 2 == 0
+        admitted_rate, budget = worker.read("Source", "S2")
+        assert budget == admitted_rate * 0.5
+
+        assert worker.consume("Source", "S2", amount=budget)
+        assert not worker.consume("Source", "S2")
+
+        second = table.publish(pipeline, period=0.5)
+        assert second == first + 2
+        assert worker.read("Source", "S2") == (admitted_rate, budget)
+    finally:
+        worker.close()
+        table.close()
+        table.unlink()
@@ -0,0 +1,59 @@
+from crystal import Pipeline
+from loader import read_definition
+from tenants import SharedTopology
+from testSupport import BUNGEE, scaled, state
+
+
+def test_tenants_resolve_like_their_own_pipelines():
+    definition = read_definition(BUNGEE)
+    topology = SharedTopology(*definition)
+    tenants = [topology.tenant() for _ in range(3)]
+    alone = [Pipeline(*definition, verbose=False) for _ in range(3)]
+    for cycle in range(3):
+        for t, (tenant, pipeline) in enumerate(zip(tenants, alone)):
+            flows = scaled(definition[0], 0.5 + t + cycle / 2)
+            tenant.run_cycle(flows)
+            pipeline.run_cycle(flows)
+            assert state(tenant) == state(pipeline)
+
+
+def test_tenants_share_topology_and_own_their_state():
+    topology = SharedTopology(*read_definition(BUNGEE))
+    first, second = topology.tenant(), topology.tenant()
+    assert first.graph is second.graph is topology.graph
+    assert first.schemas is second.schemas
+    assert first.upstreams("AggStream") is second.upstreams("AggStream")
+    assert first.topological_sort_with_loops() is second.topological_sort_with_loops()
+    for name, service in first.services.items():
+        other = second.services[name]
+        assert service.supported_schemas is other.supported_schemas
+        assert service.schema_capacities is other.schema_capacities
+        assert service.incoming_flow is not other.incoming_flow
+        assert service.allocated_capacity is not other.allocated_capacity
+
+
+def test_topology_changes_are_copied_on_write():
+    definition = read_definition(BUNGEE)
+    topology = SharedTopology(*definition)
+    changed, untouched = topology.tenant(), topology.tenant()
+    changed.add_service("Bungee10", {"S1": (5, 5)}, {"S1": (1, 20)})
+    changed.add_edge("CDIS1", "Bungee10")
+    changed.set_capacity("Bungee1", "S1", 11, 40)
+    changed.remove_schema("S7")
+
+    assert changed.shared_topology is None
+    assert untouched.shared_topology is topology
+    assert untouched.graph == definition[2]
+    assert untouched.upstreams("Bungee10") == ()
+    assert "S7" in untouched.schemas
+    bungee = untouched.services["Bungee1"]
+    assert bungee.schema_capacities[untouched.schemas["S1"]] == tuple(
+        definition[1]["Bungee1"]["S1"]
+    )
+    assert len(bungee.supported_schemas) == 7
+
+    fresh = topology.tenant()
+    alone = Pipeline(*read_definition(BUNGEE), verbose=False)
+    fresh.run_cycle(definition[0])
+    alone.run_cycle(definition[0])
+    assert state(fresh) == state(alone)
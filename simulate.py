@@ -0,0 +1,200 @@
+import random
+import sys
+import time
+from collections import deque
+
+from topology import compile_topology
+
+# Discrete-time queueing model of a pipeline under its own throttling policy.
+#
+# Every slot (service, schema) is a FIFO queue served at the slot's
+# allocated capacity, in requests per tick. Each tick:
+#
+#   1. arrivals join the queues: the source services' external rates, plus
+#      whatever upstream slots served on the previous tick, split across
+#      downstream services the way Pipeline.propagate_to_downstream splits
+#      outgoing flow
+#   2. every slot serves min(queue, allocated capacity)
+#   3. queues longer than queue_limit ticks of the slot's max capacity drop
+#      the excess
+#   4. output with nowhere to go (sinks, or downstream services without the
+#      schema) counts as delivered
+#
+# Every resolve_every ticks the pipeline runs a cycle on what the queues saw
+# over that window: in_tps is arrivals plus the current backlog per tick (the
+# demand it would take to drain), out_tps is what was served. The resulting
+# allocated capacities become the service rates until the next resolve; a
+# throttled source shows up as a capped service rate and drops at its queue.
+
+
+def source_rates(pipeline, topology):
+    rates = [0.0] * topology.slot_count
+    for k in topology.sources():
+        service = pipeline.services[topology.services[k]]
+        for slot, rate in zip(topology.service_slots(k), service.incoming_flow.values()):
+            rates[slot] = float(rate)
+    return rates
+
+
+def allocated(pipeline, topology):
+    capacity = []
+    for name in topology.services:
+        capacity.extend(pipeline.services[name].allocated_capacity.values())
+    return capacity
+
+
+def simulate(
+    pipeline,
+    ticks,
+    resolve_every=10,
+    queue_limit=10.0,
+    rates=None,
+    jitter=0.0,
+    rng=None,
+    tolerance=0.01,
+    sample_every=0,
+    actuator=None,
+):
+    """Run `ticks` ticks and return per-schema throughput, queue and drop stats.
+
+    `rates` overrides the external arrival rate per slot (by default the
+    source services' current incoming_flow). With jitter > 0 each source
+    arrival is scaled by a uniform factor in [1 - jitter, 1 + jitter] drawn
+    from `rng` (a random.Random). Queues saw-tooth within a resolve window,
+    so convergence is judged at window ends: a schema has converged once its
+    total queue stops moving by more than `tolerance` of its total max
+    capacity from one window end to the next. converged_at is the window end
+    where that last happened, or None if it never settled; swing is the
+    range of window-end depths over the last ten windows, so a policy stuck
+    in a limit cycle shows up as a non-zero swing.
+    With an `actuator` (actuation.Actuator over the same pipeline) resolves
+    go through it, so current capacities follow demand between windows.
+    The pipeline should be quiet (verbose=False); its state is advanced.
+    """
+    topology = compile_topology(pipeline)
+    slots = topology.slot_count
+    schemas = topology.schemas
+    base = list(rates) if rates is not None else source_rates(pipeline, topology)
+    sources = [slot for slot, rate in enumerate(base) if rate]
+    rng = rng or random.Random(0)
+    limits = [queue_limit * high for high in topology.slot_max]
+    capacity = allocated(pipeline, topology)
+    edges = topology.slot_edges
+    groups = [[] for _ in schemas]
+    for slot, j in enumerate(topology.slot_schema):
+        groups[j].append(slot)
+    exits = [1.0] * slots
+    for from_slot, _, share in edges:
+        exits[from_slot] -= share
+    thresholds = [
+        tolerance * sum(topology.slot_max[slot] for slot in group) for group in groups
+    ]
+
+    queue = [0.0] * slots
+    pending = list(base)
+    arrived = [0.0] * slots
+    served_total = [0.0] * slots
+    dropped = [0.0] * slots
+    queued_total = [0.0] * slots
+    window_arrived = [0.0] * slots
+    window_served = [0.0] * slots
+    depths = [0.0] * len(schemas)
+    previous = [0.0] * len(schemas)
+    max_queue = [0.0] * len(schemas)
+    converged_at = [0] * len(schemas)
+    window_ends = [deque(maxlen=10) for _ in schemas]
+    samples = []
+    resolves = 0
+
+    started = time.perf_counter()
+    for tick in range(ticks):
+        arrived = [a + p for a, p in zip(arrived, pending)]
+        total = [q + p for q, p in zip(queue, pending)]
+        served = [t if t < c else c for t, c in zip(total, capacity)]
+        queue = [t - s for t, s in zip(total, served)]
+        over = [q - limit for q, limit in zip(queue, limits)]
+        if max(over) > 0:
+            for slot, excess in enumerate(over):
+                if excess > 0:
+                    dropped[slot] += excess
+                    queue[slot] = limits[slot]
+        served_total = [a + s for a, s in zip(served_total, served)]
+        queued_total = [a + q for a, q in zip(queued_total, queue)]
+
+        pending = list(base)
+        if jitter:
+            for slot in sources:
+                pending[slot] *= 1 + jitter * (2 * rng.random() - 1)
+        for from_slot, to_slot, share in edges:
+            pending[to_slot] += served[from_slot] * share
+
+        for j, group in enumerate(groups):
+            depth = sum(map(queue.__getitem__, group))
+            if depth > max_queue[j]:
+                max_queue[j] = depth
+            depths[j] = depth
+        if sample_every and tick % sample_every == 0:
+            samples.append((tick, dict(zip(schemas, depths))))
+
+        if (tick + 1) % resolve_every == 0:
+            for j, depth in enumerate(depths):
+                if abs(depth - previous[j]) > thresholds[j]:
+                    converged_at[j] = tick + 1
+                previous[j] = depth
+                window_ends[j].append(depth)
+            service_flows = {}
+            for slot, (k, j) in enumerate(zip(topology.slot_service, topology.slot_schema)):
+                service_flows.setdefault(topology.services[k], {})[schemas[j]] = (
+                    (arrived[slot] - window_arrived[slot] + queue[slot]) / resolve_every,
+                    (served_total[slot] - window_served[slot]) / resolve_every,
+                )
+            (actuator or pipeline).run_cycle(service_flows)
+            capacity = allocated(pipeline, topology)
+            window_arrived = arrived
+            window_served = served_total
+            resolves += 1
+    seconds = time.perf_counter() - started
+
+    report = {"ticks": ticks, "seconds": seconds, "resolves": resolves, "schemas": {}}
+    for j, group in enumerate(groups):
+        delivered = sum(served_total[slot] * exits[slot] for slot in group)
+        report["schemas"][schemas[j]] = {
+            "delivered": delivered,
+            "throughput": delivered / ticks if ticks else 0,
+            "offered": sum(base[slot] for slot in group),
+            "dropped": sum(dropped[slot] for slot in group),
+            "mean_queue": sum(queued_total[slot] for slot in group) / ticks if ticks else 0,
+            "max_queue": max_queue[j],
+            "final_queue": depths[j],
+            "converged_at": converged_at[j] if converged_at[j] < ticks else None,
+            "swing": max(window_ends[j]) - min(window_ends[j]) if window_ends[j] else 0,
+        }
+    if sample_every:
+        report["samples"] = samples
+    return report
+
+
+def format_report(report):
+    lines = [
+        f"{report['ticks']:,} ticks, {report['resolves']:,} resolves in "
+        f"{report['seconds']:.1f}s",
+        f"{'schema':<8}{'offered':>10}{'throughput':>12}{'dropped':>14}"
+        f"{'mean queue':>12}{'max queue':>12}{'converged':>11}{'swing':>10}",
+    ]
+    for name, stats in report["schemas"].items():
+        converged = stats["converged_at"]
+        lines.append(
+            f"{name:<8}{stats['offered']:>10.1f}{stats['throughput']:>12.1f}"
+            f"{stats['dropped']:>14.1f}{stats['mean_queue']:>12.1f}"
+            f"{stats['max_queue']:>12.1f}{'never' if converged is None else converged:>11}"
+            f"{stats['swing']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from loader import load
+
+    pipeline = load(sys.argv[1], verbose=False)
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    print(format_report(simulate(pipeline, ticks)))
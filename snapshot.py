@@ -0,0 +1,472 @@
+import gc
+import json
+import mmap
+import struct
+from array import array
+from contextlib import contextmanager
+
+from crystal import Pipeline, Service, ServiceAction, ServiceStatus
+
+# Snapshot layout (little endian). Every section starts 8-byte aligned so it
+# can be cast in place from the mapped file:
+#
+#   header          magic, format version, counts, size of the name blob
+#   names           schema names then service names, NUL separated
+#   priorities      int64 per schema
+#   slot_offsets    int32 per service + 1, service i owns slots [o[i], o[i+1])
+#   slot_schemas    int32 per slot, schema index of the slot
+#   graph_keys      int32 per graph entry, in the graph's own key order
+#   edge_offsets    int32 per graph entry + 1
+#   edge_targets    int32 per edge, service index of the downstream service
+#   slot columns    float64 per slot: min and max capacity, current capacity,
+#                   incoming, outgoing, allocated, reduction factor
+#   visited         int8 per slot
+#   status, action  int8 per service
+#   extras          uint64 length, then JSON: the pipeline state that is not
+#                   per slot (warm start and its anchor, queue reports, queue
+#                   depths and limits, latency SLOs); absent in version 1
+MAGIC = b"MSTS"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sHHIIIIQ")
+EXTRAS_SIZE = struct.Struct("<Q")
+SLOT_COLUMNS = (
+    "capacity_min",
+    "capacity_max",
+    "current_capacity",
+    "incoming_flow",
+    "outgoing_flow",
+    "allocated_capacity",
+    "reduction_factors",
+)
+STATUSES = list(ServiceStatus)
+ACTIONS = list(ServiceAction)
+
+
+def _padded(data):
+    return data + bytes(-len(data) % 8)
+
+
+def save_snapshot(pipeline, path):
+    schema_names = list(pipeline.schemas)
+    schema_index = {schema: i for i, schema in enumerate(pipeline.schemas.values())}
+    service_names = list(pipeline.services)
+    service_index = {name: i for i, name in enumerate(service_names)}
+
+    slot_offsets = array("i", [0])
+    slot_schemas = array("i")
+    columns = {name: array("d") for name in SLOT_COLUMNS}
+    visited = array("b")
+    statuses = array("b")
+    actions = array("b")
+    for service in pipeline.services.values():
+        for schema in service.supported_schemas:
+            slot_schemas.append(schema_index[schema])
+            low, high = service.schema_capacities[schema]
+            columns["capacity_min"].append(low)
+            columns["capacity_max"].append(high)
+            columns["current_capacity"].append(service.current_capacity[schema])
+            columns["incoming_flow"].append(service.incoming_flow[schema])
+            columns["outgoing_flow"].append(service.outgoing_flow[schema])
+            columns["allocated_capacity"].append(service.allocated_capacity[schema])
+            columns["reduction_factors"].append(service.reduction_factors[schema])
+            visited.append(service.visited[schema])
+        slot_offsets.append(len(slot_schemas))
+        statuses.append(STATUSES.index(service.status))
+        actions.append(ACTIONS.index(service.action))
+
+    graph_keys = array("i")
+    edge_offsets = array("i", [0])
+    edge_targets = array("i")
+    for name, downstream in pipeline.graph.items():
+        graph_keys.append(service_index[name])
+        edge_targets.extend(service_index[target] for target in downstream)
+        edge_offsets.append(len(edge_targets))
+
+    names = "\0".join(schema_names + service_names).encode()
+    priorities = array("q", (schema.priority for schema in pipeline.schemas.values()))
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        0,
+        len(schema_names),
+        len(service_names),
+        len(graph_keys),
+        len(edge_targets),
+        len(names),
+    )
+    with open(path, "wb") as f:
+        f.write(_padded(header))
+        f.write(_padded(names))
+        for section in [
+            priorities,
+            slot_offsets,
+            slot_schemas,
+            graph_keys,
+            edge_offsets,
+            edge_targets,
+        ]:
+            f.write(_padded(section.tobytes()))
+        for name in SLOT_COLUMNS:
+            f.write(columns[name].tobytes())
+        for section in [visited, statuses, actions]:
+            f.write(_padded(section.tobytes()))
+        extras = json.dumps(describe_extras(pipeline)).encode()
+        f.write(EXTRAS_SIZE.pack(len(extras)))
+        f.write(extras)
+
+
+def describe_extras(pipeline):
+    def by_schema(values):
+        return {schema.name: value for schema, value in values.items()}
+
+    anchor = pipeline.warm_anchor
+    return {
+        "warm_start": pipeline.warm_start,
+        "warm_tolerance": pipeline.warm_tolerance,
+        "warm_anchor": anchor and [
+            {
+                service: {schema: [raw, admitted] for schema, (raw, admitted, _) in slots.items()}
+                for service, slots in anchor[0].items()
+            },
+            anchor[1],
+        ],
+        "queue_interval": pipeline.queue_interval,
+        "queue_drain_seconds": pipeline.queue_drain_seconds,
+        "latency_slos": pipeline.latency_slos,
+        "queue_reports": [
+            [service, schema, depth, latency]
+            for (service, schema), (depth, latency) in pipeline.queue_reports.items()
+        ],
+        "queue_limited": pipeline.queue_limited,
+        "queue_depths": {
+            name: by_schema(service.queue_depths)
+            for name, service in pipeline.services.items()
+            if service.queue_depths is not None
+        },
+        "queue_limits": {
+            name: by_schema(service.queue_limits)
+            for name, service in pipeline.services.items()
+            if service.queue_limits is not None
+        },
+    }
+
+
+def restore_extras(pipeline, extras):
+    schemas = pipeline.schemas
+    pipeline.warm_start = extras["warm_start"]
+    pipeline.warm_tolerance = extras["warm_tolerance"]
+    anchor = extras["warm_anchor"]
+    if anchor:
+        slots, iterations = anchor
+        pipeline.warm_anchor = (
+            {
+                service: {
+                    schema: (raw, admitted, schemas[schema])
+                    for schema, (raw, admitted) in service_slots.items()
+                }
+                for service, service_slots in slots.items()
+            },
+            iterations,
+        )
+    pipeline.queue_interval = extras["queue_interval"]
+    pipeline.queue_drain_seconds = extras["queue_drain_seconds"]
+    pipeline.latency_slos = extras["latency_slos"]
+    pipeline.queue_reports = {
+        (service, schema): (depth, latency)
+        for service, schema, depth, latency in extras["queue_reports"]
+    }
+    pipeline.queue_limited = extras["queue_limited"]
+    for attribute in ("queue_depths", "queue_limits"):
+        for name, values in extras[attribute].items():
+            setattr(
+                pipeline.services[name],
+                attribute,
+                {schemas[schema]: value for schema, value in values.items()},
+            )
+
+
+class SnapshotView:
+    """Zero-copy typed views over a mapped snapshot file."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.map)
+        self.views = []
+        self.users = 0
+        (
+            magic,
+            version,
+            _,
+            schemas,
+            services,
+            graph_keys,
+            edges,
+            names_size,
+        ) = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a pipeline snapshot")
+        if version not in (1, FORMAT_VERSION):
+            self.close()
+            raise ValueError(f"unsupported snapshot version {version}")
+
+        self.offset = HEADER.size
+        names = self._take(names_size, None).tobytes().decode().split("\0")
+        self.schema_names = names[:schemas]
+        self.service_names = names[schemas:] if services else []
+        self.priorities = self._take(schemas, "q")
+        self.slot_offsets = self._take(services + 1, "i")
+        slots = self.slot_offsets[services]
+        self.slot_schemas = self._take(slots, "i")
+        self.graph_keys = self._take(graph_keys, "i")
+        self.edge_offsets = self._take(graph_keys + 1, "i")
+        self.edge_targets = self._take(edges, "i")
+        self.columns = {name: self._take(slots, "d") for name in SLOT_COLUMNS}
+        self.visited = self._take(slots, "b")
+        self.statuses = self._take(services, "b")
+        self.actions = self._take(services, "b")
+        self.extras = None
+        if version >= 2:
+            (size,) = EXTRAS_SIZE.unpack_from(self.buffer, self.offset)
+            start = self.offset + EXTRAS_SIZE.size
+            self.extras = json.loads(self.buffer[start : start + size].tobytes())
+
+    def _take(self, count, fmt):
+        size = count * (struct.calcsize(fmt) if fmt else 1)
+        view = self.buffer[self.offset : self.offset + size]
+        self.offset += size + (-size % 8)
+        if fmt:
+            view = view.cast(fmt)
+        self.views.append(view)
+        return view
+
+    def release(self):
+        # Called by each LazyDict over this view once it no longer needs it.
+        self.users -= 1
+        if not self.users:
+            self.close()
+
+    def close(self):
+        # Views into the mapping must be gone before it can be closed.
+        for view in self.views:
+            view.release()
+        self.buffer.release()
+        self.map.close()
+        self.file.close()
+
+
+@contextmanager
+def paused_gc():
+    # Bulk loads allocate a few containers per slot in one burst and none of
+    # them can form garbage cycles; left on, the cyclic collector rescans the
+    # growing heap over and over and dominates load time.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def load_snapshot(path, verbose=True):
+    # The mapping stays open until the restored pipeline has built all of its
+    # services and graph entries (see LazyDict).
+    snapshot = SnapshotView(path)
+    try:
+        with paused_gc():
+            return restore_pipeline(snapshot, verbose)
+    except BaseException:
+        snapshot.close()
+        raise
+
+
+def restore_service(snapshot, i, schemas, verbose):
+    """Service i, read straight from the mapped columns."""
+    start, end = snapshot.slot_offsets[i], snapshot.slot_offsets[i + 1]
+    supported = [schemas[k] for k in snapshot.slot_schemas[start:end].tolist()]
+    columns = {name: view[start:end].tolist() for name, view in snapshot.columns.items()}
+    return Service.from_state(
+        snapshot.service_names[i],
+        supported,
+        dict(zip(supported, zip(columns["capacity_min"], columns["capacity_max"]))),
+        dict(zip(supported, columns["incoming_flow"])),
+        dict(zip(supported, columns["outgoing_flow"])),
+        dict(zip(supported, columns["current_capacity"])),
+        dict(zip(supported, columns["allocated_capacity"])),
+        STATUSES[snapshot.statuses[i]],
+        ACTIONS[snapshot.actions[i]],
+        dict(zip(supported, map(bool, snapshot.visited[start:end].tolist()))),
+        dict(zip(supported, columns["reduction_factors"])),
+        verbose,
+    )
+
+
+def restore_services(snapshot, schemas, verbose, built):
+    """Every service in snapshot order; those in `built` are kept as they are."""
+    offsets = snapshot.slot_offsets.tolist()
+    slot_schemas = [schemas[i] for i in snapshot.slot_schemas.tolist()]
+    columns = {name: view.tolist() for name, view in snapshot.columns.items()}
+    lows = columns["capacity_min"]
+    highs = columns["capacity_max"]
+    visited = [bool(v) for v in snapshot.visited.tolist()]
+    statuses = snapshot.statuses.tolist()
+    actions = snapshot.actions.tolist()
+
+    for i, name in enumerate(snapshot.service_names):
+        service = built.get(name)
+        if service is None:
+            start, end = offsets[i], offsets[i + 1]
+            supported = slot_schemas[start:end]
+            # Every field __init__ would compute is in the snapshot.
+            service = Service.from_state(
+                name,
+                supported,
+                dict(zip(supported, zip(lows[start:end], highs[start:end]))),
+                dict(zip(supported, columns["incoming_flow"][start:end])),
+                dict(zip(supported, columns["outgoing_flow"][start:end])),
+                dict(zip(supported, columns["current_capacity"][start:end])),
+                dict(zip(supported, columns["allocated_capacity"][start:end])),
+                STATUSES[statuses[i]],
+                ACTIONS[actions[i]],
+                dict(zip(supported, visited[start:end])),
+                dict(zip(supported, columns["reduction_factors"][start:end])),
+                verbose,
+            )
+        yield name, service
+
+
+class LazyDict(dict):
+    """A dict restored from a mapped snapshot one entry at a time.
+
+    Looking a key up builds just that entry. Anything that needs them all
+    (iterating, len, adding or removing keys) builds the rest in one pass,
+    in snapshot order, and lets go of the mapping; from then on this is a
+    plain dict with a few Python-level methods in front. Subclasses give
+    the keys in order and build entries by position.
+    """
+
+    def __init__(self, snapshot, keys):
+        super().__init__()
+        self.snapshot = snapshot
+        self.order = keys
+        self.positions = None
+        snapshot.users += 1
+
+    def position(self, key):
+        if self.positions is None:
+            self.positions = {k: i for i, k in enumerate(self.order)}
+        return self.positions.get(key)
+
+    def __missing__(self, key):
+        i = None if self.snapshot is None else self.position(key)
+        if i is None:
+            raise KeyError(key)
+        value = self.build(i)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def complete(self):
+        if self.snapshot is None:
+            return
+        built = dict(dict.items(self))
+        dict.clear(self)
+        with paused_gc():
+            for key, value in self.build_all(built):
+                dict.__setitem__(self, key, value)
+        self.snapshot.release()
+        self.snapshot = self.order = self.positions = None
+
+    def __contains__(self, key):
+        if dict.__contains__(self, key):
+            return True
+        return self.snapshot is not None and self.position(key) is not None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+
+def _completing(method):
+    def completed(self, *args, **kwargs):
+        self.complete()
+        return method(self, *args, **kwargs)
+
+    completed.__name__ = method.__name__
+    return completed
+
+
+for _name in [
+    "__iter__",
+    "__len__",
+    "__reversed__",
+    "__eq__",
+    "__ne__",
+    "__repr__",
+    "__setitem__",
+    "__delitem__",
+    "keys",
+    "values",
+    "items",
+    "pop",
+    "popitem",
+    "setdefault",
+    "update",
+    "clear",
+    "copy",
+]:
+    setattr(LazyDict, _name, _completing(getattr(dict, _name)))
+del _name
+
+
+class LazyServices(LazyDict):
+    def __init__(self, snapshot, schemas, verbose):
+        super().__init__(snapshot, snapshot.service_names)
+        self.schemas = schemas
+        self.verbose = verbose
+
+    def build(self, i):
+        return restore_service(self.snapshot, i, self.schemas, self.verbose)
+
+    def build_all(self, built):
+        return restore_services(self.snapshot, self.schemas, self.verbose, built)
+
+
+class LazyGraph(LazyDict):
+    def __init__(self, snapshot):
+        names = snapshot.service_names
+        super().__init__(snapshot, [names[i] for i in snapshot.graph_keys.tolist()])
+
+    def build(self, k):
+        names = self.snapshot.service_names
+        offsets = self.snapshot.edge_offsets
+        targets = self.snapshot.edge_targets[offsets[k] : offsets[k + 1]]
+        return [names[i] for i in targets.tolist()]
+
+    def build_all(self, built):
+        names = self.snapshot.service_names
+        offsets = self.snapshot.edge_offsets.tolist()
+        targets = [names[i] for i in self.snapshot.edge_targets.tolist()]
+        for k, key in enumerate(self.order):
+            value = built.get(key)
+            if value is None:
+                value = targets[offsets[k] : offsets[k + 1]]
+            yield key, value
+
+
+def restore_pipeline(snapshot, verbose=True):
+    priorities = snapshot.priorities.tolist()
+    pipeline = Pipeline(
+        {}, {}, {}, dict(zip(snapshot.schema_names, priorities)), verbose
+    )
+    pipeline.services = LazyServices(snapshot, list(pipeline.schemas.values()), verbose)
+    pipeline.graph = LazyGraph(snapshot)
+    if snapshot.extras is not None:
+        restore_extras(pipeline, snapshot.extras)
+    return pipeline
@@ -0,0 +1,137 @@
+from crystal import Pipeline
+from snapshot import load_snapshot, save_snapshot
+from testSupport import STATE, state
+
+SNAPSHOT = STATE + (
+    "supported_schemas",
+    "schema_capacities",
+    "current_capacity",
+    "outgoing_flow",
+    "reduction_factors",
+    "visited",
+)
+
+
+def diamond_definition():
+    service_flows = {
+        "Source": {"S1": (100, 100), "S2": (80, 80)},
+        "PathA": {"S1": (50, 50), "S2": (40, 40)},
+        "PathB": {"S1": (50, 50), "S2": (40, 40)},
+        "Merger": {"S1": (100, 90), "S2": (80, 60)},
+        "Sink": {"S1": (90, 90), "S2": (60, 60)},
+    }
+    schema_capacities = {
+        "Source": {"S1": (0, 150), "S2": (0, 150)},
+        "PathA": {"S1": (20, 60), "S2": (20, 50)},
+        "PathB": {"S1": (20, 40), "S2": (20, 30)},
+        "Merger": {"S1": (50, 90), "S2": (30, 60)},
+        "Sink": {"S1": (50, 100), "S2": (30, 100)},
+    }
+    graph = {
+        "Source": ["PathA", "PathB"],
+        "PathA": ["Merger"],
+        "PathB": ["Merger"],
+        "Merger": ["Sink"],
+        "Sink": [],
+    }
+    schema_priorities = {"S1": 2, "S2": 1}
+    return service_flows, schema_capacities, graph, schema_priorities
+
+
+def test_snapshot_round_trips_converged_state(tmp_path, capsys):
+    service_flows, schema_capacities, graph, schema_priorities = diamond_definition()
+    pipeline = Pipeline(service_flows, schema_capacities, graph, schema_priorities)
+    pipeline.run_cycle(service_flows)
+
+    path = tmp_path / "pipeline.snap"
+    save_snapshot(pipeline, path)
+    restored = load_snapshot(path)
+
+    assert state(restored, SNAPSHOT) == state(pipeline, SNAPSHOT)
+    assert restored.graph == pipeline.graph
+    assert list(restored.graph) == list(pipeline.graph)
+    assert {n: s.priority for n, s in restored.schemas.items()} == schema_priorities
+
+
+def test_restored_pipeline_continues_like_the_original(tmp_path, capsys):
+    service_flows, schema_capacities, graph, schema_priorities = diamond_definition()
+    pipeline = Pipeline(service_flows, schema_capacities, graph, schema_priorities)
+    pipeline.run_cycle(service_flows)
+
+    path = tmp_path / "pipeline.snap"
+    save_snapshot(pipeline, path)
+    restored = load_snapshot(path)
+
+    pipeline.run_cycle(service_flows)
+    restored.run_cycle(service_flows)
+    assert state(restored, SNAPSHOT) == state(pipeline, SNAPSHOT)
+
+
+def test_warm_start_and_queue_state_survive_a_restore(tmp_path):
+    service_flows, schema_capacities, graph, schema_priorities = diamond_definition()
+    pipeline = Pipeline(
+        service_flows, schema_capacities, graph, schema_priorities, verbose=False, warm_start=True
+    )
+    pipeline.set_latency_slo("S1", 0.5)
+    pipeline.report_queue("Merger", "S1", 40, 0.4)
+    pipeline.run_cycle(service_flows)
+    # Growth since the last report limits Merger; the next report is pending.
+    pipeline.report_queue("Merger", "S1", 90, 1.0)
+    pipeline.run_cycle(service_flows)
+    pipeline.report_queue("Merger", "S1", 120, 1.5)
+
+    path = tmp_path / "pipeline.snap"
+    save_snapshot(pipeline, path)
+    restored = load_snapshot(path, verbose=False)
+    assert restored.warm_start and restored.latency_slos == {"S1": 0.5}
+    assert restored.queue_limited == pipeline.queue_limited == ["Merger"]
+
+    for flows in (service_flows, service_flows, service_flows):
+        pipeline.run_cycle(flows)
+        restored.run_cycle(flows)
+        assert state(restored, SNAPSHOT) == state(pipeline, SNAPSHOT)
+        assert restored.resolution_iterations == pipeline.resolution_iterations
+    assert restored.warm_cycles == pipeline.warm_cycles > 0
+
+
+def test_services_are_built_on_first_use(tmp_path):
+    service_flows, schema_capacities, graph, schema_priorities = diamond_definition()
+    pipeline = Pipeline(service_flows, schema_capacities, graph, schema_priorities, verbose=False)
+    pipeline.run_cycle(service_flows)
+    path = tmp_path / "pipeline.snap"
+    save_snapshot(pipeline, path)
+
+    restored = load_snapshot(path, verbose=False)
+    view = restored.services.snapshot
+    assert "Merger" in restored.services and "Nowhere" not in restored.services
+    assert restored.services["Merger"].status == pipeline.services["Merger"].status
+    assert restored.graph.get("PathA") == ["Merger"]
+    assert dict.__len__(restored.services) == 1 and dict.__len__(restored.graph) == 1
+
+    merger = restored.services["Merger"]
+    assert list(restored.services) == list(pipeline.services)
+    assert restored.services["Merger"] is merger
+    # The mapping is let go once both the services and the graph are built.
+    assert restored.services.snapshot is None and not view.map.closed
+    assert list(restored.graph) == list(pipeline.graph)
+    assert view.map.closed
+
+
+def test_restored_topology_can_be_mutated(tmp_path):
+    service_flows, schema_capacities, graph, schema_priorities = diamond_definition()
+    pipeline = Pipeline(service_flows, schema_capacities, graph, schema_priorities, verbose=False)
+    pipeline.run_cycle(service_flows)
+    path = tmp_path / "pipeline.snap"
+    save_snapshot(pipeline, path)
+    restored = load_snapshot(path, verbose=False)
+
+    for target in (pipeline, restored):
+        target.add_service("Audit", {"S1": (90, 90)}, {"S1": (0, 50)})
+        target.add_edge("Merger", "Audit")
+        target.remove_service("PathB")
+    flows = dict(service_flows, Audit={"S1": (90, 90)})
+    del flows["PathB"]
+    pipeline.run_cycle(flows)
+    restored.run_cycle(flows)
+    assert state(restored, SNAPSHOT) == state(pipeline, SNAPSHOT)
+    assert restored.graph == pipeline.graph
@@ -0,0 +1,251 @@
+import sys
+import time
+from functools import partial
+
+from crystal import Pipeline
+from sdx import share_capacity
+from topology import compile_topology
+
+# Resolution strategies over one model. A strategy pairs an allocation policy
+# (how a service splits its capacity across its schemas) with a resolver (how
+# overloads are pushed back through the graph). Both work on a crystal
+# Pipeline, which holds the topology and the per-(service, schema) flows and
+# capacities, so every combination runs on the same input:
+#
+#   policies   crystal   Service.reallocate_capacity_across_schemas
+#              sdx       sdx.Service: a priority-weighted split of the
+#                        service's pooled capacity, then excess moved to the
+#                        schemas short of it (reallocate_capacity_across_schemas)
+#              priority  sdx.Service.reallocate_capacity: the pooled capacity
+#                        in proportion to demand, apportioned in whole units
+#                        by largest remainder (sdx.share_capacity)
+#   resolvers  backprop  Pipeline.resolve_overloads: overload waves pushed
+#                        upstream until nothing is overloaded
+#              pushback  sdx.Pipeline.propagate_flow: while the sinks (Bungee
+#                        in sdx) are short of capacity for a schema, scale
+#                        that schema's traffic everywhere by the sinks' total
+#                        allocated / incoming; overloads elsewhere are left
+#
+# "crystal+backprop" is exactly Pipeline.run_cycle. sdx.Pipeline itself
+# cannot run (it calls pushback helpers it never defines and hardcodes its
+# graph), so "sdx+pushback" is its algorithm on the common model. Either way
+# the pipeline finishes with update_statuses and assess_service_status.
+#
+# compare() runs each strategy on a fresh Pipeline per scenario and reports,
+# summed over the scenarios, the throughput delivered (admitted flow leaving
+# the pipeline, as simulate.py counts it), the volume throttled (offered
+# minus admitted, admitted being min(incoming after resolution, allocated
+# capacity), as sweep.py counts it) and the time spent resolving.
+
+TOLERANCE = 1e-9
+
+
+def sdx_share(service):
+    capacity = sum(service.current_capacity.values())
+    total_priority = sum(schema.priority for schema in service.supported_schemas)
+    incoming = service.incoming_flow
+    allocated = {
+        schema: int(capacity * schema.priority / total_priority)
+        for schema in service.supported_schemas
+    }
+    service.allocated_capacity = allocated
+    if sum(incoming.values()) <= sum(allocated.values()):
+        return
+
+    sorted_schemas = sorted(
+        service.supported_schemas, key=lambda s: incoming[s], reverse=True
+    )
+    total_excess = sum(max(0, allocated[s] - incoming[s]) for s in sorted_schemas)
+    for schema in sorted_schemas:
+        if incoming[schema] > allocated[schema]:
+            reallocated = min(incoming[schema] - allocated[schema], total_excess)
+            allocated[schema] += reallocated
+            total_excess -= reallocated
+
+    if total_excess > 0:
+        total_deficit = sum(max(0, incoming[s] - allocated[s]) for s in sorted_schemas)
+        for schema in sorted_schemas:
+            if incoming[schema] > allocated[schema]:
+                deficit = incoming[schema] - allocated[schema]
+                share = deficit / total_deficit if total_deficit > 0 else 0
+                allocated[schema] += int(total_excess * share)
+
+
+def priority_share(service):
+    service.allocated_capacity = share_capacity(
+        sum(service.current_capacity.values()),
+        service.incoming_flow,
+        service.supported_schemas,
+    )
+
+
+POLICIES = {"crystal": None, "sdx": sdx_share, "priority": priority_share}
+
+
+def backprop(pipeline):
+    return pipeline.resolve_overloads()
+
+
+def pushback(pipeline):
+    services = pipeline.services.values()
+    sinks = [
+        service for name, service in pipeline.services.items() if not pipeline.graph.get(name)
+    ]
+    for service in services:
+        service.reallocate_capacity_across_schemas()
+
+    max_iterations = len(pipeline.services) * 2
+    pipeline.resolution_converged = False
+    for iteration in range(1, max_iterations + 1):
+        pipeline.resolution_iterations = iteration
+        factors = {}
+        for schema in pipeline.schemas.values():
+            incoming = 0
+            allocated = 0
+            for sink in sinks:
+                if schema in sink.incoming_flow:
+                    incoming += sink.incoming_flow[schema]
+                    allocated += sink.allocated_capacity[schema]
+            if incoming > allocated * (1 + TOLERANCE):
+                factors[schema] = max(0, allocated) / incoming
+        if not factors:
+            pipeline.resolution_converged = True
+            break
+        for service in services:
+            for schema, factor in factors.items():
+                if schema in service.incoming_flow:
+                    service.incoming_flow[schema] *= factor
+            service.reallocate_capacity_across_schemas()
+
+    pipeline.resolution_complete = True
+    pipeline.update_statuses()
+    return True
+
+
+RESOLVERS = {"backprop": backprop, "pushback": pushback}
+
+
+class Strategy:
+    def __init__(self, policy, resolver):
+        self.name = f"{policy}+{resolver}"
+        self.policy = POLICIES[policy]
+        self.resolver = RESOLVERS[resolver]
+
+    def __repr__(self):
+        return self.name
+
+    def install(self, pipeline):
+        # Per-instance override: every reallocation crystal makes (overload
+        # detection, the final pass) goes through the policy instead.
+        if self.policy is None:
+            return
+        for service in pipeline.services.values():
+            service.reallocate_capacity_across_schemas = partial(self.policy, service)
+
+    def set_flows(self, pipeline, service_flows):
+        for service_name, flows in service_flows.items():
+            service = pipeline.services[service_name]
+            for schema_name, (in_flow, out_flow) in flows.items():
+                schema = pipeline.schemas[schema_name]
+                service.incoming_flow[schema] = in_flow
+                service.outgoing_flow[schema] = out_flow
+
+    def resolve(self, pipeline):
+        complete = self.resolver(pipeline)
+        pipeline.assess_service_status()
+        return complete
+
+    def run_cycle(self, pipeline, service_flows):
+        self.set_flows(pipeline, service_flows)
+        return self.resolve(pipeline)
+
+
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (
+        Strategy(policy, resolver) for policy in POLICIES for resolver in RESOLVERS
+    )
+}
+
+
+def slot_values(pipeline, topology, values):
+    return [
+        getattr(pipeline.services[topology.services[k]], values)[
+            pipeline.schemas[topology.schemas[j]]
+        ]
+        for k, j in zip(topology.slot_service, topology.slot_schema)
+    ]
+
+
+def compare(definition, scenarios, strategies=None):
+    """Run every strategy on every scenario (run_cycle-style service_flows).
+
+    `definition` is the Pipeline constructor's (service_flows,
+    schema_capacities, graph, schema_priorities); each scenario starts from
+    a fresh Pipeline built from it.
+    """
+    strategies = list(STRATEGIES.values()) if strategies is None else strategies
+    topology = compile_topology(Pipeline(*definition, verbose=False))
+    exits = [1.0] * topology.slot_count
+    for from_slot, _, share in topology.slot_edges:
+        exits[from_slot] -= share
+
+    report = {"scenarios": len(scenarios), "strategies": {}}
+    for strategy in strategies:
+        totals = {
+            "offered": 0.0,
+            "delivered": 0.0,
+            "throttled": 0.0,
+            "overloaded": 0,
+            "unconverged": 0,
+            "seconds": 0.0,
+        }
+        for service_flows in scenarios:
+            pipeline = Pipeline(*definition, verbose=False)
+            strategy.install(pipeline)
+            strategy.set_flows(pipeline, service_flows)
+            offered = slot_values(pipeline, topology, "incoming_flow")
+            started = time.perf_counter()
+            strategy.resolve(pipeline)
+            totals["seconds"] += time.perf_counter() - started
+
+            incoming = slot_values(pipeline, topology, "incoming_flow")
+            allocated = slot_values(pipeline, topology, "allocated_capacity")
+            for slot, (raw, flow, capacity) in enumerate(zip(offered, incoming, allocated)):
+                admitted = max(0.0, min(flow, capacity))
+                totals["offered"] += raw
+                totals["delivered"] += admitted * exits[slot]
+                totals["throttled"] += max(0.0, raw - admitted)
+            totals["overloaded"] += sum(
+                service.status.value == "OVERLOADED" for service in pipeline.services.values()
+            )
+            totals["unconverged"] += not pipeline.resolution_converged
+        report["strategies"][strategy.name] = totals
+    return report
+
+
+def format_report(report):
+    lines = [
+        f"{report['scenarios']:,} scenarios",
+        f"{'strategy':<20}{'delivered':>12}{'throttled':>12}{'overloaded':>12}"
+        f"{'unconverged':>13}{'seconds':>10}",
+    ]
+    for name, totals in report["strategies"].items():
+        lines.append(
+            f"{name:<20}{totals['delivered']:>12.1f}{totals['throttled']:>12.1f}"
+            f"{totals['overloaded']:>12}{totals['unconverged']:>13}{totals['seconds']:>10.3f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import random
+
+    from loader import read_definition
+    from sweep import perturb
+
+    definition = read_definition(sys.argv[1])
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    rng = random.Random(0)
+    scenarios = [perturb(definition, rng, 0.3, 0.0)[0] for _ in range(samples)]
+    print(format_report(compare(definition, scenarios)))
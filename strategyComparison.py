@@ -0,0 +1,69 @@
+import sdx
+from crystal import Pipeline
+from loader import read_definition
+from strategies import STRATEGIES, Strategy, compare, priority_share
+from testSupport import BUNGEE, scaled, state
+
+
+def test_crystal_backprop_matches_run_cycle():
+    definition = read_definition(BUNGEE)
+    plain = Pipeline(*definition, verbose=False)
+    pipeline = Pipeline(*definition, verbose=False)
+    strategy = STRATEGIES["crystal+backprop"]
+    strategy.install(pipeline)
+    for flows in (definition[0], scaled(definition[0], 2)):
+        plain.run_cycle(flows)
+        strategy.run_cycle(pipeline, flows)
+        assert state(pipeline) == state(plain)
+
+
+def test_priority_share_matches_sdx_reallocate_capacity():
+    schemas = [sdx.Schema(f"S{i}", 8 - i) for i in range(1, 4)]
+    legacy = sdx.Service("B", schemas, initial_capacity=301)
+    pipeline = Pipeline(
+        {"B": {"S1": (0, 0), "S2": (0, 0), "S3": (0, 0)}},
+        {"B": {"S1": (0, 101), "S2": (0, 100), "S3": (0, 100)}},
+        {},
+        {"S1": 7, "S2": 6, "S3": 5},
+        verbose=False,
+    )
+    service = pipeline.services["B"]
+    for flows in [(50, 20, 10), (200, 150, 100), (90, 110, 100)]:
+        for schema, flow in zip(schemas, flows):
+            legacy.incoming_flow[schema] = flow
+        for schema, flow in zip(service.supported_schemas, flows):
+            service.incoming_flow[schema] = flow
+        legacy.reallocate_capacity()
+        priority_share(service)
+        assert list(service.allocated_capacity.values()) == list(
+            legacy.allocated_capacity.values()
+        )
+
+
+def test_pushback_fits_sink_traffic_to_sink_capacity():
+    definition = read_definition(BUNGEE)
+    pipeline = Pipeline(*definition, verbose=False)
+    strategy = Strategy("crystal", "pushback")
+    strategy.install(pipeline)
+    strategy.run_cycle(pipeline, scaled(definition[0], 2))
+    assert pipeline.resolution_converged
+    sinks = [service for name, service in pipeline.services.items() if not definition[2].get(name)]
+    for schema in pipeline.schemas.values():
+        incoming = sum(sink.incoming_flow.get(schema, 0) for sink in sinks)
+        allocated = sum(sink.allocated_capacity.get(schema, 0) for sink in sinks)
+        assert incoming <= allocated * (1 + 1e-6)
+
+
+def test_compare_reports_every_strategy():
+    definition = read_definition(BUNGEE)
+    scenarios = [definition[0], scaled(definition[0], 2)]
+    report = compare(definition, scenarios)
+    assert report["scenarios"] == 2
+    assert list(report["strategies"]) == list(STRATEGIES)
+    for totals in report["strategies"].values():
+        assert 0 <= totals["delivered"] <= totals["offered"]
+        assert totals["throttled"] >= 0
+        assert totals["seconds"] > 0
+    again = compare(definition, scenarios, [STRATEGIES["sdx+pushback"]])
+    for key in ("delivered", "throttled", "overloaded"):
+        assert again["strategies"]["sdx+pushback"][key] == report["strategies"]["sdx+pushback"][key]
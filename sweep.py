@@ -0,0 +1,192 @@
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from crystal import Pipeline
+
+# Monte Carlo what-if sweeps. Every sample perturbs the base definition's
+# flows and capacities and resolves one cycle on a fresh Pipeline:
+#
+#   flows       in and out rates of each (service, schema) scaled by one
+#               factor max(0, 1 + flow_noise * N(0, 1))
+#   capacities  the max bound scaled by max(0, 1 + capacity_noise * N(0, 1)),
+#               the min bound clipped to it
+#
+# Sample i draws from random.Random(f"{seed}:{i}"), so a sweep gives the same
+# numbers whatever the worker count or chunk size. Per (service, schema) it
+# reports how often the slot was a bottleneck (overloaded by a positive
+# percentage in the first overload map calculate_overloads returned, before
+# any backpressure; a fresh Pipeline lists every slot there, most at zero or
+# below once capacity is reallocated), the volume throttled
+# (offered minus admitted, admitted being min(incoming after backpressure,
+# allocated capacity)) and the distribution of admitted throughput.
+
+_worker = {}
+
+
+def _init_worker(definition):
+    # Runs once per pool process: the base definition is shipped here rather
+    # than with every task.
+    _worker["definition"] = definition
+
+
+def slot_order(service_flows):
+    return [(service, schema) for service, flows in service_flows.items() for schema in flows]
+
+
+def perturb(definition, rng, flow_noise, capacity_noise):
+    service_flows, schema_capacities, _, _ = definition
+    flows = {}
+    for service, schemas in service_flows.items():
+        flows[service] = {}
+        for schema, (in_flow, out_flow) in schemas.items():
+            factor = max(0.0, 1 + flow_noise * rng.gauss(0, 1))
+            flows[service][schema] = (in_flow * factor, out_flow * factor)
+    capacities = {}
+    for service, schemas in schema_capacities.items():
+        capacities[service] = {}
+        for schema, (low, high) in schemas.items():
+            high = high * max(0.0, 1 + capacity_noise * rng.gauss(0, 1))
+            capacities[service][schema] = (min(low, high), high)
+    return flows, capacities
+
+
+def run_sample(definition, seed, index, flow_noise, capacity_noise):
+    """Resolve one perturbed sample; returns (bottleneck, offered, admitted) per slot."""
+    rng = random.Random(f"{seed}:{index}")
+    flows, capacities = perturb(definition, rng, flow_noise, capacity_noise)
+    pipeline = Pipeline(flows, capacities, definition[2], definition[3], verbose=False)
+
+    first = []
+    calculate_overloads = pipeline.calculate_overloads
+
+    def first_overloads():
+        overloaded = calculate_overloads()
+        if not first:
+            first.append(overloaded)
+        return overloaded
+
+    pipeline.calculate_overloads = first_overloads
+    pipeline.run_cycle(flows)
+
+    overloaded = first[0] if first else {}
+    rows = []
+    for service_name, schema_name in slot_order(flows):
+        service = pipeline.services[service_name]
+        schema = pipeline.schemas[schema_name]
+        admitted = min(service.incoming_flow[schema], service.allocated_capacity[schema])
+        rows.append(
+            (
+                overloaded.get(service_name, {}).get(schema, 0) > 0,
+                flows[service_name][schema_name][0],
+                max(0.0, admitted),
+            )
+        )
+    return rows
+
+
+def run_chunk(start, count, seed, flow_noise, capacity_noise):
+    definition = _worker["definition"]
+    return [
+        run_sample(definition, seed, index, flow_noise, capacity_noise)
+        for index in range(start, start + count)
+    ]
+
+
+def quantile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = q * (len(ordered) - 1)
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def sweep(
+    definition,
+    samples,
+    seed=0,
+    flow_noise=0.2,
+    capacity_noise=0.1,
+    workers=None,
+    chunk_size=64,
+):
+    """Run `samples` perturbed scenarios of `definition` and aggregate them.
+
+    `definition` is the Pipeline constructor's (service_flows,
+    schema_capacities, graph, schema_priorities). workers=0 runs in this
+    process; otherwise a pool of `workers` processes (default: CPU count).
+    """
+    chunks = [
+        (start, min(chunk_size, samples - start), seed, flow_noise, capacity_noise)
+        for start in range(0, samples, chunk_size)
+    ]
+    if workers == 0:
+        _init_worker(definition)
+        results = (run_chunk(*chunk) for chunk in chunks)
+        return aggregate(definition, results, samples)
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(definition,),
+    ) as executor:
+        results = executor.map(run_chunk, *zip(*chunks))
+        return aggregate(definition, results, samples)
+
+
+def aggregate(definition, results, samples):
+    slots = slot_order(definition[0])
+    bottlenecks = [0] * len(slots)
+    throttled = [0.0] * len(slots)
+    admitted = [[] for _ in slots]
+    for chunk in results:
+        for rows in chunk:
+            for i, (bottleneck, offered, accepted) in enumerate(rows):
+                bottlenecks[i] += bottleneck
+                throttled[i] += max(0.0, offered - accepted)
+                admitted[i].append(accepted)
+
+    report = {"samples": samples, "slots": {}}
+    for i, slot in enumerate(slots):
+        values = admitted[i]
+        report["slots"][slot] = {
+            "bottleneck": bottlenecks[i] / samples if samples else 0,
+            "throttled": throttled[i] / samples if samples else 0,
+            "admitted": {
+                "mean": sum(values) / len(values) if values else 0,
+                "p05": quantile(values, 0.05),
+                "p50": quantile(values, 0.5),
+                "p95": quantile(values, 0.95),
+            },
+        }
+    return report
+
+
+def format_report(report, top=15):
+    ranked = sorted(
+        report["slots"].items(),
+        key=lambda item: (item[1]["bottleneck"], item[1]["throttled"]),
+        reverse=True,
+    )
+    lines = [
+        f"{report['samples']:,} samples",
+        f"{'service':<16}{'schema':<8}{'bottleneck':>11}{'throttled':>11}"
+        f"{'p05':>9}{'p50':>9}{'p95':>9}",
+    ]
+    for (service, schema), stats in ranked[:top]:
+        admitted = stats["admitted"]
+        lines.append(
+            f"{service:<16}{schema:<8}{stats['bottleneck']:>11.1%}{stats['throttled']:>11.1f}"
+            f"{admitted['p05']:>9.1f}{admitted['p50']:>9.1f}{admitted['p95']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from loader import read_definition
+
+    definition = read_definition(sys.argv[1])
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    print(format_report(sweep(definition, samples)))
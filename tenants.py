@@ -0,0 +1,81 @@
+import sys
+
+from crystal import Pipeline, Service
+
+# One pipeline per tenant over the same physical service graph. A
+# SharedTopology is built once from a definition and holds everything that
+# does not change from cycle to cycle:
+#
+#   schemas          the Schema objects, by name
+#   graph            service -> downstream services
+#   upstream index   Pipeline.index_upstreams, in graph order
+#   order            topological order with loops kept together
+#   per service      supported_schemas and the (min, max) capacity bounds
+#
+# tenant() builds a Pipeline that references all of it and owns only its
+# flow state: a Service object per service with the incoming/outgoing flow,
+# current/allocated capacity, visited and reduction dicts, seeded from the
+# definition. That is O(slots), with no graph walk. Nothing a cycle does
+# writes to the shared parts. A tenant that changes its own topology
+# (Pipeline.add_edge, set_capacity, ...) copies them first, so the other
+# tenants never see the change.
+
+
+class SharedTopology:
+    def __init__(self, service_flows, schema_capacities, graph, schema_priorities):
+        self.template = template = Pipeline(
+            service_flows, schema_capacities, graph, schema_priorities, verbose=False
+        )
+        template.index_upstreams()
+        template.topological_sort_with_loops()
+        self.schemas = template.schemas
+        self.graph = template.graph
+
+    def tenant(self, verbose=False, warm_start=False, allocation_cache=None):
+        template = self.template
+        pipeline = Pipeline({}, {}, self.graph, {}, verbose, warm_start)
+        pipeline.schemas = self.schemas
+        pipeline.upstream_index = template.upstream_index
+        pipeline.graph_order = template.graph_order
+        pipeline.graph_positions = template.graph_positions
+        pipeline.service_order = template.service_order
+        pipeline.shared_topology = self
+
+        services = pipeline.services
+        for name, shared in template.services.items():
+            # The schema list and bounds are shared, the state dicts are copies.
+            services[name] = Service.from_state(
+                name,
+                shared.supported_schemas,
+                shared.schema_capacities,
+                dict(shared.incoming_flow),
+                dict(shared.outgoing_flow),
+                dict(shared.current_capacity),
+                dict(shared.allocated_capacity),
+                shared.status,
+                shared.action,
+                dict(shared.visited),
+                dict(shared.reduction_factors),
+                verbose,
+            )
+        pipeline.set_allocation_cache(allocation_cache)
+        return pipeline
+
+
+if __name__ == "__main__":
+    import time
+
+    from loader import read_definition
+
+    definition = read_definition(sys.argv[1])
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    started = time.perf_counter()
+    topology = SharedTopology(*definition)
+    shared = time.perf_counter() - started
+    started = time.perf_counter()
+    tenants = [topology.tenant() for _ in range(count)]
+    created = time.perf_counter() - started
+    print(
+        f"{count} tenants over {len(topology.template.services):,} services: topology "
+        f"{shared * 1000:.1f}ms, {created / count * 1000:.2f}ms per tenant"
+    )
@@ -0,0 +1,48 @@
+"""Scenario paths and pipeline state shared by the test modules."""
+
+import glob
+import os
+
+from loader import read_definition
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+SCENARIOS = sorted(glob.glob(os.path.join(SCENARIO_DIR, "*.jsonl")))
+
+
+def scenario_path(name):
+    return os.path.join(SCENARIO_DIR, name)
+
+
+def scenario(name):
+    return read_definition(scenario_path(name))
+
+
+HOTH = scenario_path("hothSingle.jsonl")
+BUNGEE = scenario_path("bungeeMulti.jsonl")
+LINEAR = scenario_path("cases_simple_linear_overload.jsonl")
+
+# What two pipelines must agree on after a cycle, unless a test asks for more.
+STATE = ("incoming_flow", "allocated_capacity", "status", "action")
+
+
+def field_state(value):
+    if isinstance(value, dict):
+        return [(schema.name, v) for schema, v in value.items()]
+    if isinstance(value, list):
+        return [schema.name for schema in value]
+    return value
+
+
+def state(pipeline, fields=STATE):
+    """Each service's `fields` in service order, keyed by schema name."""
+    return [
+        (name, *(field_state(getattr(service, field)) for field in fields))
+        for name, service in pipeline.services.items()
+    ]
+
+
+def scaled(service_flows, factor):
+    return {
+        service: {schema: (in_flow * factor, out_flow) for schema, (in_flow, out_flow) in flows.items()}
+        for service, flows in service_flows.items()
+    }
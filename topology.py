@@ -0,0 +1,99 @@
+# A Pipeline's structure compiled to flat, index-based lists. Services are
+# numbered in pipeline order and every (service, schema) pair a service
+# supports gets a slot, numbered service by service:
+#
+#   slot_offsets[k] .. slot_offsets[k + 1]   slots of service k
+#   slot_service[i], slot_schema[i]          owner and schema index of slot i
+#   downstream[k], upstream[k]               service indices from the graph
+#   slot_edges                               (from slot, to slot, share): the
+#                                            share of slot i's output that
+#                                            propagate_to_downstream sends on,
+#                                            1 / len(downstream) per target
+#                                            that supports the schema
+#   order                                    service indices in the order of
+#                                            Pipeline.topological_sort_with_loops
+#
+# Nothing here refers back to Service or Schema objects, so a Topology can be
+# pickled to worker processes or shared between pipelines.
+
+
+class Topology:
+    def __init__(
+        self, services, schemas, priorities, service_schemas, capacities, graph, order
+    ):
+        self.services = list(services)
+        self.service_index = {name: k for k, name in enumerate(self.services)}
+        self.schemas = list(schemas)
+        self.schema_index = {name: j for j, name in enumerate(self.schemas)}
+        self.priorities = list(priorities)
+
+        self.slot_offsets = [0]
+        self.slot_service = []
+        self.slot_schema = []
+        self.slot_min = []
+        self.slot_max = []
+        for k, schema_names in enumerate(service_schemas):
+            for schema_name in schema_names:
+                low, high = capacities[k][schema_name]
+                self.slot_service.append(k)
+                self.slot_schema.append(self.schema_index[schema_name])
+                self.slot_min.append(low)
+                self.slot_max.append(high)
+            self.slot_offsets.append(len(self.slot_service))
+        self.slots = {
+            (self.services[k], self.schemas[j]): i
+            for i, (k, j) in enumerate(zip(self.slot_service, self.slot_schema))
+        }
+
+        self.downstream = [
+            [self.service_index[name] for name in graph.get(service, [])]
+            for service in self.services
+        ]
+        self.upstream = [[] for _ in self.services]
+        for k, targets in enumerate(self.downstream):
+            for target in targets:
+                self.upstream[target].append(k)
+
+        self.slot_edges = []
+        for i, (k, j) in enumerate(zip(self.slot_service, self.slot_schema)):
+            targets = self.downstream[k]
+            for target in targets:
+                to_slot = self.slots.get((self.services[target], self.schemas[j]))
+                if to_slot is not None:
+                    self.slot_edges.append((i, to_slot, 1 / len(targets)))
+        self.order = [self.service_index[name] for name in order]
+
+    @property
+    def slot_count(self):
+        return len(self.slot_service)
+
+    def service_slots(self, k):
+        return range(self.slot_offsets[k], self.slot_offsets[k + 1])
+
+    def sources(self):
+        return [k for k, upstream in enumerate(self.upstream) if not upstream]
+
+    def sinks(self):
+        return [k for k, downstream in enumerate(self.downstream) if not downstream]
+
+
+def compile_topology(pipeline):
+    services = list(pipeline.services)
+    return Topology(
+        services,
+        list(pipeline.schemas),
+        [schema.priority for schema in pipeline.schemas.values()],
+        [
+            [schema.name for schema in pipeline.services[name].supported_schemas]
+            for name in services
+        ],
+        [
+            {
+                schema.name: caps
+                for schema, caps in pipeline.services[name].schema_capacities.items()
+            }
+            for name in services
+        ],
+        pipeline.graph,
+        pipeline.topological_sort_with_loops(),
+    )
@@ -0,0 +1,101 @@
+import copy
+import random
+
+import pytest
+
+from crystal import Pipeline
+from loader import read_definition
+from testSupport import BUNGEE, scaled, state
+
+
+def test_mutations_match_a_pipeline_built_from_the_result():
+    definition = read_definition(BUNGEE)
+    flows, capacities, graph, priorities = copy.deepcopy(definition)
+    pipeline = Pipeline(*copy.deepcopy(definition), verbose=False)
+    pipeline.upstreams("AggStream")  # build the index, so it is kept up incrementally
+
+    pipeline.add_schema("S8", 0)
+    priorities["S8"] = 0
+    pipeline.add_service("Bungee10", {"S1": (30, 10), "S8": (5, 5)}, {"S1": (11, 20), "S8": (1, 10)})
+    flows["Bungee10"] = {"S1": (30, 10), "S8": (5, 5)}
+    capacities["Bungee10"] = {"S1": (11, 20), "S8": (1, 10)}
+    for upstream in ("CDIS3", "CDIS1"):
+        pipeline.add_edge(upstream, "Bungee10")
+        graph[upstream] = graph[upstream] + ["Bungee10"]
+    pipeline.set_capacity("CDIS1", "S8", 1, 10)
+    flows["CDIS1"]["S8"] = (5, 5)
+    capacities["CDIS1"]["S8"] = (1, 10)
+    pipeline.set_capacity("Hoth", "S1", 80, 200)
+    capacities["Hoth"]["S1"] = (80, 200)
+
+    upstream, targets = next(iter(graph.items()))
+    pipeline.remove_edge(upstream, targets[0])
+    graph[upstream] = [target for target in targets if target != targets[0]]
+    pipeline.remove_service("Bungee2")
+    del flows["Bungee2"], capacities["Bungee2"]
+    graph.pop("Bungee2", None)
+    for name, downstream in graph.items():
+        graph[name] = [target for target in downstream if target != "Bungee2"]
+    pipeline.remove_schema("S7")
+    del priorities["S7"]
+    for name in flows:
+        flows[name].pop("S7", None)
+        capacities[name].pop("S7", None)
+
+    assert pipeline.graph == graph
+    assert list(pipeline.graph) == list(graph)
+    index = pipeline.upstream_index
+    assert index == Pipeline({}, {}, graph, {}, verbose=False).index_upstreams()
+
+    fresh = Pipeline(flows, capacities, graph, priorities, verbose=False)
+    for cycle_flows in (flows, scaled(flows, 2)):
+        pipeline.run_cycle(cycle_flows)
+        fresh.run_cycle(cycle_flows)
+        assert state(pipeline) == state(fresh)
+
+
+def test_upstream_index_follows_random_edge_changes():
+    rng = random.Random(0)
+    names = [f"N{i}" for i in range(30)]
+    pipeline = Pipeline(
+        {name: {"S1": (0, 0)} for name in names},
+        {name: {"S1": (0, 10)} for name in names},
+        {},
+        {"S1": 1},
+        verbose=False,
+    )
+    for _ in range(500):
+        upstream, downstream = rng.sample(names, 2)
+        if downstream in pipeline.graph.get(upstream, ()):
+            pipeline.remove_edge(upstream, downstream)
+        else:
+            pipeline.add_edge(upstream, downstream)
+    index = pipeline.upstream_index
+    assert index == pipeline.index_upstreams()
+
+
+def test_mutation_keeps_other_services_converged_state():
+    definition = read_definition(BUNGEE)
+    pipeline = Pipeline(*copy.deepcopy(definition), verbose=False)
+    pipeline.run_cycle(definition[0])
+    before = {name: rest for name, *rest in state(pipeline)}
+    pipeline.add_service("Bungee10", {"S1": (5, 5)}, {"S1": (1, 20)})
+    pipeline.add_edge("CDIS1", "Bungee10")
+    pipeline.set_capacity("Bungee1", "S1", 11, 40)
+    after = {name: rest for name, *rest in state(pipeline)}
+    for name, service_state in before.items():
+        if name != "Bungee1":
+            assert after[name] == service_state
+    assert pipeline.warm_anchor is None
+
+
+def test_invalid_mutations_are_rejected():
+    pipeline = Pipeline(*read_definition(BUNGEE), verbose=False)
+    with pytest.raises(ValueError):
+        pipeline.add_service("C1", {"S1": (0, 0)}, {"S1": (0, 1)})
+    with pytest.raises(ValueError):
+        pipeline.add_edge("C1", "Nowhere")
+    with pytest.raises(ValueError):
+        pipeline.remove_edge("Bungee1", "C1")
+    with pytest.raises(ValueError):
+        pipeline.add_schema("S1", 9)
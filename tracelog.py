@@ -0,0 +1,488 @@
+import json
+import marshal
+import struct
+import sys
+from collections import OrderedDict
+
+from crystal import AllocationCache, Pipeline, ServiceAction, ServiceStatus
+
+# Append-only decision trace. Every record is framed as (kind, cycle, payload
+# length) followed by the payload:
+#
+#   TOPOLOGY    JSON: schema priorities, per-service schemas and capacities
+#               and the graph, enough to rebuild an identical Pipeline.
+#               Written each time a recorder is attached, so one file can hold
+#               many runs.
+#   SYNC        full state going into `cycle` (marshal, see capture_state)
+#               that replay adopts as is: written on attach and by
+#               TraceRecorder.sync(). Besides one tuple per service it holds
+#               the settings a cycle depends on (warm start and its
+#               tolerance, queue interval, drain time and latency SLOs, the
+#               allocation cache), the warm-start anchor and, for a quantized
+#               cache, its entries.
+#   CHECKPOINT  the same, but state replay must reproduce: written every
+#               `keyframe_interval` cycles and on close.
+#   CYCLE       marshal of (service_flows, queue_reports, overloads,
+#               reductions, budget):
+#                 service_flows  the run_cycle argument as given, itself
+#                                marshalled (bytes) when the cycle ran
+#                 queue_reports  the Pipeline.report_queue reports the cycle
+#                                consumed, {(service, schema): (depth, latency)}
+#                 overloads      (iteration, service, schema, percentage) from
+#                                every calculate_overloads call
+#                 reductions     (service, schema, percentage) for every
+#                                backpressure wave, in order (the recursion
+#                                upstream from each is not recorded)
+#                 budget         None, or (time_budget, work_budget, waves):
+#                                the budgets given and the backpressure waves
+#                                they allowed, which replay uses as its work
+#                                budget since a time budget can't be repeated
+#
+# Capturing the whole state every cycle costs more than the cycle on large
+# topologies, so state is only kept at keyframes: replay restores the nearest
+# one, re-executes the cycles after it and compares overload maps and
+# reductions cycle by cycle and the full state at every checkpoint.
+#
+# A cycle marshals its flows straight away, since callers may reuse one dict
+# and update it in place, and keeps the queue reports (a dict run_cycle has
+# let go of) and the overload and reduction tuples as they are; the rest of
+# the record is serialized when the recorder is flushed.
+FRAME = struct.Struct("<BQI")
+TOPOLOGY = 1
+SYNC = 2
+CHECKPOINT = 3
+CYCLE = 4
+STATUSES = list(ServiceStatus)
+ACTIONS = list(ServiceAction)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+WRAPPED = ["run_cycle", "calculate_overloads", "propagate_backpressure"]
+
+
+def installed(target, name):
+    """The wrapper already set on `target` for method `name`, if any.
+
+    Reading the instance __dict__ (vars(), __dict__) would turn the inline
+    attribute storage into a real dict and slow every later attribute access.
+    """
+    method = getattr(target, name)
+    if getattr(method, "__func__", None) is getattr(type(target), name):
+        return None
+    return method
+
+
+def describe_topology(pipeline):
+    return {
+        "schemas": {name: schema.priority for name, schema in pipeline.schemas.items()},
+        "services": [
+            {
+                "name": name,
+                "schemas": [schema.name for schema in service.supported_schemas],
+                "capacities": [
+                    [schema.name, list(caps)]
+                    for schema, caps in service.schema_capacities.items()
+                ],
+            }
+            for name, service in pipeline.services.items()
+        ],
+        "graph": list(pipeline.graph.items()),
+    }
+
+
+def build_pipeline(topology):
+    service_flows = {}
+    schema_capacities = {}
+    for service in topology["services"]:
+        service_flows[service["name"]] = {name: (0, 0) for name in service["schemas"]}
+        schema_capacities[service["name"]] = {
+            name: tuple(caps) for name, caps in service["capacities"]
+        }
+    graph = {name: downstream for name, downstream in topology["graph"]}
+    return Pipeline(
+        service_flows, schema_capacities, graph, topology["schemas"], verbose=False
+    )
+
+
+def capture_state(pipeline):
+    # Every per-schema dict on a Service is keyed in supported_schemas order,
+    # so the values can be taken a whole dict at a time.
+    cache = pipeline.allocation_cache
+    if cache is not None:
+        # An exact cache returns what a miss would compute, so only a
+        # quantized one's entries change results. (One shared with other
+        # pipelines also changes between keyframes, which replay can't see.)
+        entries = list(cache.entries.items()) if cache.quantum else None
+        cache = (cache.maxsize, cache.quantum, entries)
+    settings = (
+        pipeline.warm_start,
+        pipeline.warm_tolerance,
+        pipeline.queue_interval,
+        pipeline.queue_drain_seconds,
+        pipeline.latency_slos,
+        cache,
+    )
+    anchor = pipeline.warm_anchor
+    if anchor is not None:
+        anchor = (
+            {
+                service_name: {
+                    schema_name: (raw, admitted)
+                    for schema_name, (raw, admitted, _) in service_anchor.items()
+                }
+                for service_name, service_anchor in anchor[0].items()
+            },
+            anchor[1],
+        )
+    return marshal.dumps(
+        (
+            settings,
+            [
+                (
+                    tuple(service.incoming_flow.values()),
+                    tuple(service.outgoing_flow.values()),
+                    tuple(service.allocated_capacity.values()),
+                    tuple(service.current_capacity.values()),
+                    tuple(service.reduction_factors.values()),
+                    tuple(service.visited.values()),
+                    STATUS_CODES[service.status],
+                    ACTION_CODES[service.action],
+                    by_name(service.queue_depths),
+                    by_name(service.queue_limits),
+                )
+                for service in pipeline.services.values()
+            ],
+            anchor,
+        )
+    )
+
+
+def by_name(values):
+    if values is None:
+        return None
+    return {schema.name: value for schema, value in values.items()}
+
+
+def restore_state(pipeline, data):
+    settings, services, anchor = marshal.loads(data)
+    schemas = pipeline.schemas
+    (
+        pipeline.warm_start,
+        pipeline.warm_tolerance,
+        pipeline.queue_interval,
+        pipeline.queue_drain_seconds,
+        pipeline.latency_slos,
+        cache,
+    ) = settings
+    if cache is None:
+        pipeline.set_allocation_cache(None)
+    else:
+        maxsize, quantum, entries = cache
+        current = pipeline.allocation_cache
+        if current is None or (current.maxsize, current.quantum) != (maxsize, quantum):
+            current = AllocationCache(maxsize, quantum)
+            pipeline.set_allocation_cache(current)
+        if entries is not None:
+            current.entries = OrderedDict(entries)
+    if anchor is not None:
+        anchor = (
+            {
+                service_name: {
+                    schema_name: (raw, admitted, schemas[schema_name])
+                    for schema_name, (raw, admitted) in service_anchor.items()
+                }
+                for service_name, service_anchor in anchor[0].items()
+            },
+            anchor[1],
+        )
+    pipeline.warm_anchor = anchor
+
+    pipeline.queue_limited = []
+    for service, values in zip(pipeline.services.values(), services):
+        (
+            incoming,
+            outgoing,
+            allocated,
+            current,
+            reductions,
+            visited,
+            status,
+            action,
+            queue_depths,
+            queue_limits,
+        ) = values
+        supported = service.supported_schemas
+        service.incoming_flow = dict(zip(supported, incoming))
+        service.outgoing_flow = dict(zip(supported, outgoing))
+        service.allocated_capacity = dict(zip(supported, allocated))
+        service.current_capacity = dict(zip(supported, current))
+        service.reduction_factors = dict(zip(supported, reductions))
+        service.visited = dict(zip(supported, visited))
+        service.status = STATUSES[status]
+        service.action = ACTIONS[action]
+        service.queue_depths = by_schema(schemas, queue_depths)
+        service.queue_limits = by_schema(schemas, queue_limits)
+        if service.queue_limits:
+            pipeline.queue_limited.append(service.name)
+
+
+def by_schema(schemas, values):
+    if values is None:
+        return None
+    return {schemas[name]: value for name, value in values.items()}
+
+
+class TraceRecorder:
+    """Records every run_cycle of a pipeline until closed.
+
+    The recorder wraps run_cycle, calculate_overloads and
+    propagate_backpressure on the pipeline instance, so a pipeline that is
+    not being traced pays nothing. Replay assumes run_cycle is the only thing
+    changing the pipeline; after adjusting capacities, flows or settings from
+    outside (MetricsCollector.apply_capacities, a restore, set_latency_slo),
+    call sync().
+
+    A cycle marshals its flows and buffers the rest of what the pipeline
+    computed; records are serialized and written by flush(). Calling it
+    between cycles keeps that work off the cycle path; otherwise the
+    recorder flushes by itself once `buffer_cycles` cycles are waiting.
+    """
+
+    def __init__(
+        self, pipeline, output, cycle=0, keyframe_interval=64, buffer_cycles=1024
+    ):
+        self.pipeline = pipeline
+        self.output = output
+        self.cycle = cycle
+        self.keyframe_interval = keyframe_interval
+        self.buffer_cycles = buffer_cycles
+        self.buffer = []
+        self.flushed = cycle
+        self.overloads = []
+        self.reductions = []
+        self.iteration = 0
+        self.in_wave = False
+
+        # Whatever was installed on the instance before us (usually nothing)
+        # goes back on close, so recorders and other wrappers can nest.
+        self.replaced = {name: installed(pipeline, name) for name in WRAPPED}
+        self.run_cycle = pipeline.run_cycle
+        self.calculate_overloads = pipeline.calculate_overloads
+        self.propagate_backpressure = pipeline.propagate_backpressure
+        pipeline.run_cycle = self.traced_run_cycle
+        pipeline.calculate_overloads = self.traced_calculate_overloads
+        pipeline.propagate_backpressure = self.traced_propagate_backpressure
+
+        self.write(TOPOLOGY, json.dumps(describe_topology(pipeline)).encode())
+        self.sync()
+
+    @classmethod
+    def open(cls, path, pipeline, **kwargs):
+        return cls(pipeline, open(path, "ab"), **kwargs)
+
+    def write(self, kind, payload):
+        self.buffer.append((kind, self.cycle, payload))
+
+    def flush(self):
+        chunks = []
+        for kind, cycle, payload in self.buffer:
+            if kind == CYCLE:
+                payload = marshal.dumps(payload)
+            chunks.append(FRAME.pack(kind, cycle, len(payload)))
+            chunks.append(payload)
+        self.buffer = []
+        self.flushed = self.cycle
+        self.output.writelines(chunks)
+        self.output.flush()
+
+    def sync(self):
+        self.write(SYNC, capture_state(self.pipeline))
+        self.flush()
+
+    def checkpoint(self):
+        self.write(CHECKPOINT, capture_state(self.pipeline))
+
+    def traced_calculate_overloads(self):
+        overloaded = self.calculate_overloads()
+        # Kept until the next flush as tuples of names and numbers, which the
+        # garbage collector stops tracking; the overload dicts themselves
+        # (keyed by Schema) would be walked by every collection.
+        self.iteration += 1
+        for service_name, schema_overloads in overloaded.items():
+            for schema, percentage in schema_overloads.items():
+                self.overloads.append(
+                    (self.iteration, service_name, schema.name, percentage)
+                )
+        return overloaded
+
+    def traced_propagate_backpressure(self, service_name, schema, reduction_percentage):
+        # Only waves, the calls resolution makes, are recorded. When this is
+        # the outermost wrapper it steps out of the way while the wave
+        # recurses upstream; under another wrapper (Instrumentation) the
+        # recursion comes back through here and is passed straight on.
+        if self.in_wave:
+            return self.propagate_backpressure(service_name, schema, reduction_percentage)
+        self.reductions.append((service_name, schema.name, reduction_percentage))
+        pipeline = self.pipeline
+        entry = pipeline.propagate_backpressure
+        if entry == self.traced_propagate_backpressure:
+            pipeline.propagate_backpressure = self.propagate_backpressure
+        self.in_wave = True
+        try:
+            return self.propagate_backpressure(service_name, schema, reduction_percentage)
+        finally:
+            self.in_wave = False
+            pipeline.propagate_backpressure = entry
+
+    def traced_run_cycle(self, service_flows, time_budget=None, work_budget=None):
+        pipeline = self.pipeline
+        # run_cycle swaps in a fresh dict, so this one is left as consumed.
+        reports = pipeline.queue_reports
+        self.overloads = overloads = []
+        self.reductions = reductions = []
+        self.iteration = 0
+        complete = self.run_cycle(service_flows, time_budget, work_budget)
+        if time_budget is None and work_budget is None:
+            budget = None
+        else:
+            budget = (time_budget, work_budget, pipeline.resolution_waves)
+        self.buffer.append(
+            (
+                CYCLE,
+                self.cycle,
+                (marshal.dumps(service_flows), reports, overloads, reductions, budget),
+            )
+        )
+        self.cycle += 1
+        if self.cycle % self.keyframe_interval == 0:
+            self.checkpoint()
+        if self.cycle - self.flushed >= self.buffer_cycles:
+            self.flush()
+        return complete
+
+    def close(self):
+        if self.cycle % self.keyframe_interval:
+            self.checkpoint()
+        self.flush()
+        for name, method in self.replaced.items():
+            if method is None:
+                delattr(self.pipeline, name)
+            else:
+                setattr(self.pipeline, name, method)
+        self.output.close()
+
+
+def read_records(path):
+    with open(path, "rb") as f:
+        while True:
+            frame = f.read(FRAME.size)
+            if len(frame) < FRAME.size:
+                return
+            kind, cycle, length = FRAME.unpack(frame)
+            payload = f.read(length)
+            if len(payload) < length:
+                return  # torn tail from a crashed writer
+            yield kind, cycle, payload
+
+
+class ReplayMismatch:
+    def __init__(self, cycle, section, recorded, replayed):
+        self.cycle = cycle
+        self.section = section
+        self.recorded = recorded
+        self.replayed = replayed
+
+    def __repr__(self):
+        return f"cycle {self.cycle}: {self.section} differs"
+
+
+def identical(a, b):
+    # repr round-trips floats exactly and tells 0 from 0.0 and -0.0, which ==
+    # does not; marshal bytes can't be compared since they depend on sharing.
+    return repr(a) == repr(b)
+
+
+class _Discard:
+    def writelines(self, chunks):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def replay_session(records, start, end, mismatches):
+    """Replay one recorder session; returns the number of cycles compared."""
+    pipeline = build_pipeline(json.loads(records[0][2]))
+    recorder = TraceRecorder(
+        pipeline, _Discard(), keyframe_interval=sys.maxsize, buffer_cycles=sys.maxsize
+    )
+
+    # Begin from the last keyframe at or before `start`.
+    first = 1
+    for index, (kind, cycle, _) in enumerate(records):
+        if kind in (SYNC, CHECKPOINT) and cycle <= start:
+            first = index
+
+    replayed = 0
+    for index, (kind, cycle, payload) in enumerate(records[first:], first):
+        if end is not None and cycle > end:
+            break
+        if kind == CHECKPOINT and cycle > start and index != first:
+            recorded = marshal.loads(payload)
+            actual = marshal.loads(capture_state(pipeline))
+            if not identical(actual, recorded):
+                mismatches.append(ReplayMismatch(cycle - 1, "state", recorded, actual))
+        if kind in (SYNC, CHECKPOINT):
+            # Restoring a matching checkpoint changes nothing; restoring one
+            # that differs keeps a single divergence from cascading.
+            restore_state(pipeline, payload)
+            continue
+        if end is not None and cycle >= end:
+            break
+        service_flows, reports, overloads, reductions, budget = marshal.loads(payload)
+        service_flows = marshal.loads(service_flows)
+        pipeline.queue_reports = reports
+        if budget is None:
+            pipeline.run_cycle(service_flows)
+        else:
+            pipeline.run_cycle(service_flows, work_budget=budget[2])
+        recorder.buffer = []
+        if cycle < start:
+            continue
+        replayed += 1
+        for section, recorded, actual in [
+            ("overloads", overloads, recorder.overloads),
+            ("reductions", reductions, recorder.reductions),
+        ]:
+            if not identical(actual, recorded):
+                mismatches.append(ReplayMismatch(cycle, section, recorded, actual))
+    recorder.close()
+    return replayed
+
+
+def replay_trace(path, start=0, end=None):
+    """Re-execute recorded cycles [start, end) and diff them against the log.
+
+    Returns (cycles replayed, list of ReplayMismatch).
+    """
+    sessions = []
+    for record in read_records(path):
+        if record[0] == TOPOLOGY:
+            sessions.append([])
+        sessions[-1].append(record)
+    replayed = 0
+    mismatches = []
+    for records in sessions:
+        replayed += replay_session(records, start, end, mismatches)
+    return replayed, mismatches
+
+
+if __name__ == "__main__":
+    start = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    end = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    replayed, mismatches = replay_trace(sys.argv[1], start, end)
+    print(f"Replayed {replayed} cycles, {len(mismatches)} mismatches")
+    for mismatch in mismatches:
+        print(f"  {mismatch}")
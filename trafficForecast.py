@@ -0,0 +1,118 @@
+import io
+import json
+import os
+
+import pytest
+
+from forecast import Forecaster
+from loader import load, read_definition
+from replay import replay, scaled_ticks
+
+SCENARIO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scenarios", "cases_simple_linear_overload.jsonl"
+)
+BUNGEE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scenarios", "bungeeMulti.jsonl"
+)
+
+
+def ramp_profile(flat=10, ticks=20, low=0.3, high=0.8):
+    step = (high - low) / ticks
+    return [low] * flat + [low + step * tick for tick in range(ticks + 1)] + [high] * flat
+
+
+def test_holt_locks_onto_a_linear_ramp():
+    pipeline = load(SCENARIO, verbose=False)
+    forecaster = Forecaster(pipeline, alpha=0.5, beta=0.3)
+    for tick in range(60):
+        forecaster.observe({"Source": {"S1": (10 + 2 * tick, 0)}})
+    assert forecaster.forecast("Source", "S1") == pytest.approx(10 + 2 * 60)
+    assert forecaster.errors()["slots"]["Source"]["S1"]["mae"] < 0.5
+
+    # Without a trend the forecast trails a ramp by a constant.
+    ewma = Forecaster(pipeline, alpha=0.5, beta=0.0)
+    for tick in range(60):
+        ewma.observe({"Source": {"S1": (10 + 2 * tick, 0)}})
+    assert ewma.forecast("Source", "S1") == pytest.approx(10 + 2 * 59 - 2)
+    assert ewma.errors()["overall"]["bias"] == pytest.approx(-4)
+
+
+def test_errors_cover_only_the_last_history_ticks():
+    pipeline = load(SCENARIO, verbose=False)
+    forecaster = Forecaster(pipeline, alpha=1.0, beta=0.0, history=4)
+    assert len(forecaster.error_ring) == 3 * 4
+    for value in [100, 0, 0, 0, 0, 0, 10, 10, 10, 10]:
+        forecaster.observe({"Source": {"S1": (value, value)}})
+    # alpha 1 predicts the last value: only the final jump to 10 is missed.
+    assert forecaster.errors()["slots"]["Source"]["S1"] == {"mae": 2.5, "bias": -2.5, "wape": 0.25}
+    assert "Processor" not in forecaster.errors()["slots"]
+
+
+def test_planned_flows_never_drop_below_current_demand():
+    pipeline = load(SCENARIO, verbose=False)
+    forecaster = Forecaster(pipeline, alpha=1.0, beta=1.0)
+    for value in (40, 50, 60):
+        forecaster.observe({"Source": {"S1": (value, value / 2)}, "Processor": {"S1": (100 - value, 0)}})
+    planned = forecaster.planned({"Source": {"S1": (60, 30)}, "Processor": {"S1": (45, 40)}})
+    assert planned["Source"]["S1"] == (70, 35)
+    # Processor is forecast to fall to 30, below what it sees now.
+    assert forecaster.forecast("Processor", "S1") == 30
+    assert planned["Processor"]["S1"] == (45, 40)
+
+
+def test_forecasting_shortens_late_allocation_on_a_ramp():
+    service_flows = read_definition(SCENARIO)[0]
+    profile = ramp_profile()
+    results = {}
+    for label in ("reactive", "forecast"):
+        pipeline = load(SCENARIO, verbose=False)
+        forecaster = Forecaster(pipeline) if label == "forecast" else None
+        output = io.StringIO()
+        summary = replay(pipeline, scaled_ticks(service_flows, profile), output, forecaster)
+        late = [json.loads(line)["late"] for line in output.getvalue().splitlines()]
+        assert summary["late_ticks"] == sum(1 for count in late if count)
+        results[label] = summary["late_ticks"]
+    # Reactive planning is a tick behind for the whole ramp (and the first tick).
+    assert results["reactive"] == 21
+    assert results["forecast"] <= 12
+
+
+def test_sparse_ticks_are_planned_at_the_last_demand():
+    service_flows = read_definition(BUNGEE)[0]
+    surge = dict(scaled_ticks(service_flows, [3.0]))[0]
+    states = []
+    for second_tick in ({}, surge):
+        pipeline = load(BUNGEE, verbose=False)
+        forecaster = Forecaster(pipeline, alpha=1.0, beta=0.0)
+        forecaster.run_cycle(surge)
+        forecaster.run_cycle(second_tick)
+        states.append(
+            {
+                (name, schema.name): service.incoming_flow[schema]
+                for name, service in pipeline.services.items()
+                for schema in service.supported_schemas
+            }
+        )
+    assert states[0] == states[1]
+
+
+def test_topology_changes_recompile_the_slots():
+    pipeline = load(SCENARIO, verbose=False)
+    forecaster = Forecaster(pipeline, alpha=1.0, beta=1.0)
+    for value in (40, 50):
+        forecaster.run_cycle({"Source": {"S1": (value, value)}})
+    pipeline.add_schema("S2", 2)
+    pipeline.set_capacity("Processor", "S2", 0, 50)
+    pipeline.add_service("Audit", {"S1": (10, 10)}, {"S1": (0, 50)})
+    pipeline.add_edge("Processor", "Audit")
+    pipeline.remove_service("Destination")
+    assert forecaster.forecast("Audit", "S1") == 0
+
+    forecaster.run_cycle({"Processor": {"S2": (20, 20)}})
+    assert forecaster.forecast("Processor", "S2") == 20
+    assert forecaster.forecast("Audit", "S1") == 10
+    assert pipeline.services["Processor"].incoming_flow[pipeline.schemas["S2"]] == 20
+    errors = forecaster.errors()["slots"]
+    assert "Destination" not in errors and "Destination" not in forecaster.demand
+    # Source kept its history: 40 then 60 predicted for 50 and 50.
+    assert errors["Source"]["S1"] == {"mae": 10, "bias": 0, "wape": 0.2}
@@ -0,0 +1,71 @@
+from crystal import Pipeline
+from loader import read_definition
+from testSupport import BUNGEE, scaled, scenario, state
+
+
+def test_steady_traffic_converges_in_one_pass():
+    definition = read_definition(BUNGEE)
+    warm = Pipeline(*definition, verbose=False, warm_start=True)
+    cold = Pipeline(*definition, verbose=False)
+    for cycle in range(5):
+        warm.run_cycle(definition[0])
+        cold.run_cycle(definition[0])
+        if cycle:
+            assert warm.resolution_iterations == 1
+            assert state(warm) == state(cold)
+    assert cold.resolution_iterations > 1
+    assert warm.cold_cycles == 1
+    assert warm.warm_cycles == 4
+    assert warm.iterations_saved == 4 * (warm.warm_anchor[1] - 1)
+
+
+def test_drift_past_the_tolerance_solves_cold():
+    definition = read_definition(BUNGEE)
+    pipeline = Pipeline(*definition, verbose=False, warm_start=True)
+    pipeline.run_cycle(definition[0])
+    # Drift within the tolerance stays warm only where nothing was throttled.
+    service, schema = next(
+        (service, schema)
+        for service, slots in pipeline.warm_anchor[0].items()
+        for schema, (raw, admitted, _) in slots.items()
+        if raw > 0 and admitted == raw
+    )
+    in_flow, out_flow = definition[0][service][schema]
+    pipeline.run_cycle({service: {schema: (in_flow * 1.01, out_flow)}})
+    assert (pipeline.cold_cycles, pipeline.warm_cycles) == (1, 1)
+    pipeline.run_cycle({service: {schema: (in_flow * 2, out_flow)}})
+    assert (pipeline.cold_cycles, pipeline.warm_cycles) == (2, 1)
+    assert pipeline.warm_anchor[0][service][schema][0] == in_flow * 2
+
+
+def test_cut_short_resolution_drops_the_anchor():
+    definition = read_definition(BUNGEE)
+    pipeline = Pipeline(*definition, verbose=False, warm_start=True)
+    pipeline.run_cycle(definition[0])
+    assert pipeline.warm_anchor is not None
+    assert pipeline.run_cycle(scaled(definition[0], 2), work_budget=0) is False
+    assert pipeline.warm_anchor is None
+
+
+def test_warm_start_is_off_by_default():
+    definition = read_definition(BUNGEE)
+    pipeline = Pipeline(*definition, verbose=False)
+    pipeline.run_cycle(definition[0])
+    pipeline.run_cycle(definition[0])
+    assert pipeline.warm_anchor is None
+    assert pipeline.warm_cycles == 0
+    assert pipeline.resolution_iterations == 2
+
+
+def test_falling_traffic_admits_what_a_cold_solve_does():
+    for name in ("bungeeMulti.jsonl", "hothSingle.jsonl", "cases_simple_linear_overload.jsonl"):
+        definition = scenario(name)
+        warm = Pipeline(*definition, verbose=False, warm_start=True)
+        cold = Pipeline(*definition, verbose=False)
+        for factor in (1.0, 0.96, 0.96, 0.99, 0.98):
+            flows = scaled(definition[0], factor)
+            warm.run_cycle(flows)
+            cold.run_cycle(flows)
+            assert state(warm) == state(cold), (name, factor)
+        # At least the repeated 0.96 cycle ran warm.
+        assert warm.warm_cycles >= 1